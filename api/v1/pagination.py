@@ -0,0 +1,85 @@
+from django.conf import settings
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from finanzas.paginacion import CursorInvalido, paginar_keyset, paginar_keyset_union
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination keyed on (date, id), newest first, without COUNT(*)."""
+
+    date_field = "fecha"
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    max_page_size = 200
+    paginate = staticmethod(paginar_keyset)
+
+    def __init__(self):
+        self.request = None
+        self.next_cursor = None
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, ""))
+        except ValueError:
+            return settings.LIST_PAGE_SIZE
+        return max(1, min(page_size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            rows, self.next_cursor = self.paginate(
+                queryset,
+                cursor=request.query_params.get(self.cursor_query_param),
+                tamaño=self.get_page_size(request),
+                campo_fecha=self.date_field,
+            )
+        except CursorInvalido as exc:
+            raise NotFound("Cursor invalido.") from exc
+        return rows
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Opaque cursor taken from the previous page's `next` link.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": f"Rows per page (max {self.max_page_size}).",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+
+class TransferKeysetPagination(KeysetPagination):
+    """Takes the (sent, received) querysets and merges one keyset page of each."""
+
+    date_field = "fecha_creacion"
+    paginate = staticmethod(paginar_keyset_union)
@@ -2,7 +2,7 @@ from django.contrib.auth.models import User
 from rest_framework import serializers
 
 from chatbot.models import ConversationMessage
-from finanzas.models import Categoria, Transaccion, Transferencia
+from finanzas.models import Categoria, ImportacionTransacciones, Transaccion, Transferencia
 
 
 class TransactionSerializer(serializers.ModelSerializer):
@@ -95,9 +95,50 @@ class TransferCreateSerializer(serializers.Serializer):
         return value
 
 
+class ImportSerializer(serializers.ModelSerializer):
+    porcentaje = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = ImportacionTransacciones
+        fields = [
+            "uuid",
+            "nombre_archivo",
+            "formato",
+            "estado",
+            "porcentaje",
+            "filas_procesadas",
+            "filas_importadas",
+            "filas_con_error",
+            "errores",
+            "mensaje_error",
+            "fecha_creacion",
+            "fecha_inicio",
+            "fecha_fin",
+        ]
+        read_only_fields = fields
+
+
+class ImportCreateSerializer(serializers.Serializer):
+    archivo = serializers.FileField()
+    formato = serializers.ChoiceField(
+        choices=ImportacionTransacciones.FORMATO_CHOICES, required=False
+    )
+
+    def validate(self, attrs):
+        if "formato" not in attrs:
+            extension = attrs["archivo"].name.rsplit(".", 1)[-1].lower()
+            if extension not in dict(ImportacionTransacciones.FORMATO_CHOICES):
+                raise serializers.ValidationError(
+                    {"formato": "No se pudo deducir el formato; indica csv u ofx."}
+                )
+            attrs["formato"] = extension
+        return attrs
+
+
 class ChatSessionSerializer(serializers.Serializer):
     session_id = serializers.CharField(max_length=64)
-    updated_at = serializers.DateTimeField()
+    updated_at = serializers.DateTimeField(source="last_activity")
+    message_count = serializers.IntegerField()
 
 
 class ChatMessageSerializer(serializers.ModelSerializer):
@@ -106,7 +147,7 @@ class ChatMessageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ConversationMessage
-        fields = ["role", "content", "is_followup", "timestamp"]
+        fields = ["id", "role", "content", "is_followup", "timestamp"]
 
 
 class ChatSendSerializer(serializers.Serializer):
@@ -7,8 +7,12 @@ from api.v1.views import (
     ChatSendView,
     ChatSessionMessagesView,
     ChatSessionsView,
+    ChatStreamView,
     DashboardSummaryView,
+    ImportCreateView,
+    ImportDetailView,
     TransactionDetailView,
+    TransactionExportView,
     TransactionListCreateView,
     TransferCancelView,
     TransferDetailView,
@@ -21,12 +25,16 @@ urlpatterns = [
     path("auth/logout", AuthLogoutView.as_view(), name="api_v1_auth_logout"),
     path("dashboard/summary", DashboardSummaryView.as_view(), name="api_v1_dashboard_summary"),
     path("transactions", TransactionListCreateView.as_view(), name="api_v1_transactions"),
+    path("transactions/export", TransactionExportView.as_view(), name="api_v1_transactions_export"),
     path("transactions/<int:id>", TransactionDetailView.as_view(), name="api_v1_transaction_detail"),
+    path("imports", ImportCreateView.as_view(), name="api_v1_imports"),
+    path("imports/<uuid:uuid>", ImportDetailView.as_view(), name="api_v1_import_detail"),
     path("transfers", TransferListCreateView.as_view(), name="api_v1_transfers"),
     path("transfers/<uuid:uuid>", TransferDetailView.as_view(), name="api_v1_transfer_detail"),
     path("transfers/<uuid:uuid>/cancel", TransferCancelView.as_view(), name="api_v1_transfer_cancel"),
     path("chat/sessions", ChatSessionsView.as_view(), name="api_v1_chat_sessions"),
     path("chat/messages", ChatSendView.as_view(), name="api_v1_chat_messages"),
+    path("chat/messages/stream", ChatStreamView.as_view(), name="api_v1_chat_messages_stream"),
     path(
         "chat/sessions/<str:session_id>/messages",
         ChatSessionMessagesView.as_view(),
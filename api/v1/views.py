@@ -2,26 +2,43 @@ import uuid
 
 from django.contrib.auth.models import User
 from django.db import transaction
-from django.db.models import Max, Q, Sum
+from django.db.models import Q
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from drf_spectacular.types import OpenApiTypes
-from drf_spectacular.utils import OpenApiResponse, extend_schema
+from drf_spectacular.utils import OpenApiParameter, OpenApiResponse, extend_schema
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from api.v1.pagination import KeysetPagination, TransferKeysetPagination
 from api.v1.serializers import (
     ChatMessageSerializer,
     ChatSendSerializer,
     ChatSessionSerializer,
+    ImportCreateSerializer,
+    ImportSerializer,
     TransactionSerializer,
     TransferCreateSerializer,
     TransferSerializer,
 )
-from chatbot.models import ConversationMessage
+from chatbot.models import ChatSession
+from chatbot.services import history
+from chatbot.services.chat_stream import streaming_response
 from chatbot.services.rag_pipeline import process_message
-from finanzas.models import Categoria, Transaccion, Transferencia
-from finanzas.views import _build_dashboard_payload
+from finanzas.cache import etag_dashboard
+from finanzas.exportacion import FORMATOS, ExportacionNoDisponible, respuesta_exportacion
+from finanzas.importacion import encolar_importacion
+from finanzas.models import (
+    BalanceUsuario,
+    Categoria,
+    ImportacionTransacciones,
+    Transaccion,
+    Transferencia,
+)
+from finanzas.views import _get_dashboard_payload
 
 
 class AuthLoginView(TokenObtainPairView):
@@ -50,24 +67,59 @@ class DashboardSummaryView(APIView):
 
     @extend_schema(
         operation_id="v1_dashboard_summary",
-        responses={200: OpenApiTypes.OBJECT},
+        responses={200: OpenApiTypes.OBJECT, 304: OpenApiResponse(description="Not modified")},
     )
+    @method_decorator(condition(etag_func=etag_dashboard))
     def get(self, request):
-        return Response(_build_dashboard_payload(request.user))
+        return Response(_get_dashboard_payload(request.user))
 
 
 class TransactionListCreateView(generics.ListCreateAPIView):
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         return (
             Transaccion.objects.filter(usuario=self.request.user)
             .select_related("categoria")
-            .order_by("-fecha")
+            .order_by("-fecha", "-id")
         )
 
 
+class TransactionExportView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(
+        operation_id="v1_transactions_export",
+        parameters=[
+            OpenApiParameter(
+                "export_format", OpenApiTypes.STR, enum=list(FORMATOS), description="Default csv."
+            ),
+        ],
+        responses={
+            (200, "text/csv"): OpenApiTypes.BINARY,
+            (200, "application/vnd.apache.parquet"): OpenApiTypes.BINARY,
+            400: OpenApiTypes.OBJECT,
+        },
+    )
+    def get(self, request):
+        formato = request.query_params.get("export_format", "csv")
+        if formato not in FORMATOS:
+            return Response(
+                {"detail": f"Formato no soportado. Usa: {', '.join(FORMATOS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        queryset = Transaccion.objects.filter(usuario=request.user)
+        try:
+            return respuesta_exportacion(
+                queryset, formato, f"transacciones-{request.user.username}"
+            )
+        except ExportacionNoDisponible as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+
 class TransactionDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -77,20 +129,61 @@ class TransactionDetailView(generics.RetrieveUpdateDestroyAPIView):
         return Transaccion.objects.filter(usuario=self.request.user).select_related("categoria")
 
 
+class ImportCreateView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(
+        operation_id="v1_imports_create",
+        request={"multipart/form-data": ImportCreateSerializer},
+        responses={202: ImportSerializer, 400: OpenApiTypes.OBJECT},
+    )
+    def post(self, request):
+        serializer = ImportCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        archivo = serializer.validated_data["archivo"]
+
+        with transaction.atomic():
+            importacion = ImportacionTransacciones.objects.create(
+                usuario=request.user,
+                archivo=archivo,
+                nombre_archivo=archivo.name[:255],
+                formato=serializer.validated_data["formato"],
+                bytes_totales=archivo.size or 0,
+            )
+            encolar_importacion(importacion)
+
+        return Response(ImportSerializer(importacion).data, status=status.HTTP_202_ACCEPTED)
+
+
+class ImportDetailView(generics.RetrieveAPIView):
+    serializer_class = ImportSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_field = "uuid"
+
+    def get_queryset(self):
+        return ImportacionTransacciones.objects.filter(usuario=self.request.user)
+
+
 class TransferListCreateView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     @extend_schema(
         operation_id="v1_transfers_list",
-        responses={200: TransferSerializer(many=True)},
+        parameters=[
+            OpenApiParameter("cursor", OpenApiTypes.STR, description="Cursor from `next`."),
+            OpenApiParameter("page_size", OpenApiTypes.INT, description="Rows per page."),
+        ],
+        responses={200: OpenApiTypes.OBJECT},
     )
     def get(self, request):
-        queryset = (
-            Transferencia.objects.filter(Q(emisor=request.user) | Q(receptor=request.user))
-            .select_related("emisor", "receptor")
-            .order_by("-fecha_creacion")
+        transfers = Transferencia.objects.select_related("emisor", "receptor")
+        paginator = TransferKeysetPagination()
+        page = paginator.paginate_queryset(
+            (transfers.filter(emisor=request.user), transfers.filter(receptor=request.user)),
+            request,
+            view=self,
         )
-        return Response(TransferSerializer(queryset, many=True).data)
+        return paginator.get_paginated_response(TransferSerializer(page, many=True).data)
 
     @extend_schema(
         operation_id="v1_transfers_create",
@@ -117,17 +210,7 @@ class TransferListCreateView(APIView):
             emisor_locked = locked_users[emisor.id]
             receptor_locked = locked_users[receptor.id]
 
-            ingresos = (
-                Transaccion.objects.filter(usuario=emisor_locked, tipo="ingreso")
-                .aggregate(total=Sum("monto"))["total"]
-                or 0
-            )
-            gastos = (
-                Transaccion.objects.filter(usuario=emisor_locked, tipo="gasto")
-                .aggregate(total=Sum("monto"))["total"]
-                or 0
-            )
-            saldo_actual = ingresos - gastos
+            saldo_actual = BalanceUsuario.para_usuario(emisor_locked.id).balance
 
             if saldo_actual < monto:
                 return Response(
@@ -223,12 +306,7 @@ class ChatSessionsView(APIView):
         responses={200: ChatSessionSerializer(many=True)},
     )
     def get(self, request):
-        sessions = (
-            ConversationMessage.objects.filter(usuario=request.user)
-            .values("session_id")
-            .annotate(updated_at=Max("created_at"))
-            .order_by("-updated_at")
-        )
+        sessions = ChatSession.objects.filter(usuario=request.user).order_by("-last_activity")
         return Response(ChatSessionSerializer(sessions, many=True).data)
 
     @extend_schema(
@@ -261,21 +339,60 @@ class ChatSendView(APIView):
         return Response(result)
 
 
+class ChatStreamView(APIView):
+    """Streaming variant of ``ChatSendView``: ``token`` SSE events, then ``done``."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(
+        operation_id="v1_chat_messages_stream",
+        request=ChatSendSerializer,
+        responses={
+            (200, "text/event-stream"): OpenApiTypes.STR,
+            400: OpenApiTypes.OBJECT,
+        },
+    )
+    def post(self, request):
+        serializer = ChatSendSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        session_id = serializer.validated_data["session_id"]
+        message = serializer.validated_data["message"].strip()
+        if not message:
+            return Response({"detail": "Mensaje vacio."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return streaming_response(request._request, request.user, message, session_id)
+
+
 class ChatSessionMessagesView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     @extend_schema(
         operation_id="v1_chat_session_messages",
+        parameters=[
+            OpenApiParameter(
+                "before", OpenApiTypes.INT, description="Messages older than this message id."
+            ),
+            OpenApiParameter(
+                "after", OpenApiTypes.INT, description="Messages newer than this message id."
+            ),
+            OpenApiParameter(
+                "limit",
+                OpenApiTypes.INT,
+                description=f"Messages per page (max {history.MAX_PAGE_SIZE}).",
+            ),
+        ],
         responses={200: OpenApiTypes.OBJECT},
     )
     def get(self, request, session_id):
-        messages = ConversationMessage.objects.filter(
-            usuario=request.user,
-            session_id=session_id,
-        ).order_by("created_at")
+        try:
+            before, after, limit = history.page_params(request.query_params)
+        except ValueError as exc:
+            raise ValidationError({"detail": "Parametros de paginacion invalidos."}) from exc
+        messages, has_more = history.page(request.user, session_id, before, after, limit)
         return Response(
             {
                 "session_id": session_id,
                 "messages": ChatMessageSerializer(messages, many=True).data,
+                "has_more": has_more,
             }
         )
@@ -1,6 +1,6 @@
 ﻿from django.contrib import admin
 
-from chatbot.models import ConversationMessage
+from chatbot.models import ChatSession, ConversationMessage, ConversationSummary, EmbeddingOutbox
 
 
 @admin.register(ConversationMessage)
@@ -11,3 +11,33 @@ class ConversationMessageAdmin(admin.ModelAdmin):
     ordering = ("-created_at",)
     readonly_fields = ("created_at",)
 
+
+@admin.register(ChatSession)
+class ChatSessionAdmin(admin.ModelAdmin):
+    list_display = ("usuario", "session_id", "message_count", "last_activity")
+    search_fields = ("usuario__username", "session_id")
+    ordering = ("-last_activity",)
+    readonly_fields = ("message_count", "last_activity", "created_at")
+
+
+@admin.register(ConversationSummary)
+class ConversationSummaryAdmin(admin.ModelAdmin):
+    list_display = ("usuario", "session_id", "last_message_id", "updated_at")
+    search_fields = ("usuario__username", "session_id")
+    ordering = ("-updated_at",)
+    readonly_fields = ("updated_at",)
+
+
+@admin.register(EmbeddingOutbox)
+class EmbeddingOutboxAdmin(admin.ModelAdmin):
+    list_display = (
+        "transaction_id", "operation", "version", "attempts", "available_at", "failed_at"
+    )
+    list_filter = ("operation", ("failed_at", admin.EmptyFieldListFilter))
+    search_fields = ("transaction_id", "last_error")
+    ordering = ("available_at",)
+    readonly_fields = [field.name for field in EmbeddingOutbox._meta.fields]
+
+    def has_add_permission(self, request):
+        # Rows are written by the Transaccion signals.
+        return False
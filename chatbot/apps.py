@@ -9,6 +9,7 @@ class ChatbotConfig(AppConfig):
     def ready(self):
         # Register optional signals for transaction embeddings.
         try:
+            import chatbot.services.embedding_outbox  # noqa: F401  (queue metrics)
             import chatbot.signals  # noqa: F401
         except Exception:
             # Keep app boot resilient when optional integrations are unavailable.
@@ -0,0 +1,92 @@
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from django.core.management.base import BaseCommand
+
+from chatbot.services import http_client
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every POST like the embedding API, over HTTP/1.1 keep-alive."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY a
+    # kept-alive connection stalls on delayed ACKs (~40ms per request).
+    disable_nagle_algorithm = True
+    delay = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.delay:
+            time.sleep(self.delay)
+        body = json.dumps([0.0] * 384).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(delay=0.0):
+    """Stub API on a free localhost port; returns ``(server, url)``."""
+    handler = type("Handler", (StubHandler,), {"delay": delay})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/"
+
+
+def _percentile(samples, pct):
+    return statistics.quantiles(samples, n=100)[pct - 1] if len(samples) > 1 else samples[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures per-request latency against a local stub server with a fresh "
+        "connection per request (plain requests.post) and with the pooled keep-alive "
+        "session used by the chatbot services."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument(
+            "--delay-ms", type=float, default=0.0, help="Simulated server processing time"
+        )
+        parser.add_argument(
+            "--url",
+            help="Benchmark this endpoint instead of the stub (e.g. an https:// URL, to "
+                 "include the TLS handshake)",
+        )
+
+    def handle(self, *args, **options):
+        server = None
+        url = options["url"]
+        if not url:
+            server, url = start_stub_server(options["delay_ms"] / 1000)
+        payload = {"inputs": "benchmark", "options": {"wait_for_model": True}}
+        try:
+            http_client.reset()
+            session = http_client.get_session()
+            clients = (("fresh connection", requests.post), ("pooled session", session.post))
+            for name, post in clients:
+                latencies = []
+                for _ in range(options["requests"]):
+                    started = time.perf_counter()
+                    post(url, json=payload, timeout=15).raise_for_status()
+                    latencies.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(
+                    f"{name}: p50={_percentile(latencies, 50):.2f}ms "
+                    f"p95={_percentile(latencies, 95):.2f}ms "
+                    f"mean={statistics.fmean(latencies):.2f}ms"
+                )
+        finally:
+            http_client.reset()
+            if server is not None:
+                server.shutdown()
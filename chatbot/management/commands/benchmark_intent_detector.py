@@ -0,0 +1,146 @@
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.models import ConversationMessage
+from chatbot.services import followup_detector
+from chatbot.services.followup_detector import (
+    DETAIL_MARKERS,
+    INTENT_PATTERNS,
+    TIME_MARKERS,
+    detect_intent,
+)
+
+# Messages as users type them, in both languages, with and without accents.
+CORPUS = [
+    "¿Cuál es mi saldo?", "cuanto tengo en la cuenta", "¿Cuánto tengo disponible?",
+    "what's my balance?", "how much money do I have", "Dinero disponible para este mes",
+    "¿Cuánto gasté este mes?", "cuanto gaste el mes pasado", "Mis gastos de enero",
+    "gastos", "¿En qué gasté más en 2025?", "how much did i spend last month?",
+    "show my spending this week", "expenses for march", "gasté mucho hoy?",
+    "¿En qué gasto más?", "donde gasto mas dinero", "categoría con más gastos este año",
+    "what do i spend on the most?", "where do i spend my money", "my top category",
+    "¿Cómo va mi presupuesto?", "presupuesto de comida", "¿Excedí algún límite?",
+    "budget status", "am I over budget?", "límite de transporte este mes",
+    "buscar una compra de $150", "encontrar el pago del alquiler",
+    "find the payment to netflix", "search transactions by category",
+    "busca la transacción de 45,50", "una compra en el super", "transaction amount 300",
+    "¿Cuánto gané este mes?", "mis ingresos", "salario de febrero", "income this year",
+    "how much did i earn in 2025", "earnings last quarter", "ingresos totales",
+    "¿A quién le envié dinero?", "transferencias recibidas", "recibí una transferencia",
+    "transfer history", "money sent to ana", "received payments this week",
+    "hola", "gracias!", "¿Me puedes dar un consejo para ahorrar?", "hello there",
+    "¿Cómo puedo mejorar mis finanzas?", "tips to save money", "¿qué puedes hacer?",
+    "Este mes", "Último trimestre", "Todo", "Por monto", "Por categoría",
+    "Últimos 3 meses", "este año", "15/02", "last 6 months", "all of it",
+    "¿Cuánto gasté en comida los últimos 3 meses?", "total de gastos en octubre",
+    "my balance and my spending this month", "¿Por qué bajó mi saldo?",
+    "¿Me alcanza el saldo para un viaje en diciembre?", "gasto promedio por semana",
+    "subtotal de la compra de ayer", "presente mis gastos del 12/03",
+]
+
+
+def _legacy_detect_language(message):
+    spanish_markers = [
+        'mi', 'mis', 'el', 'la', 'los', 'las', 'de', 'en', 'que', 'qué',
+        'cuanto', 'cuánto', 'como', 'cómo', 'donde', 'dónde', 'por', 'para',
+    ]
+    spanish_content = [
+        'gasto', 'gastos', 'gaste', 'gasté', 'ingreso', 'ingresos',
+        'saldo', 'balance', 'presupuesto', 'categoría', 'categoria',
+        'transferencia', 'transaccion', 'transacción', 'salario',
+        'cuanto', 'cuánto', 'envié', 'recibí', 'buscar', 'encontrar',
+    ]
+    english_markers = [
+        'my', 'the', 'how', 'what', 'where', 'when', 'much', 'did',
+        'spend', 'spent', 'income', 'budget', 'search', 'find',
+    ]
+    words = message.lower().split()
+    es_score = sum(1 for w in words if w in spanish_markers or w in spanish_content)
+    en_score = sum(1 for w in words if w in english_markers)
+    if es_score > en_score:
+        return 'es'
+    if en_score > es_score:
+        return 'en'
+    return 'es'
+
+
+def _legacy_detect_intent(message):
+    """The substring/``re.search`` scan the compiled matcher replaced, kept as the reference."""
+    msg_lower = message.lower()
+    lang = _legacy_detect_language(message)
+    matched_intent = 'general'
+    for intent_key, pattern in INTENT_PATTERNS.items():
+        if intent_key == 'general':
+            continue
+        for keyword in pattern['keywords']:
+            if keyword in msg_lower:
+                matched_intent = intent_key
+                break
+        if matched_intent != 'general':
+            break
+
+    pattern = INTENT_PATTERNS[matched_intent]
+    requires = pattern.get('requires', [])
+    needs_followup = False
+    if 'time_period' in requires and not any(re.search(p, msg_lower) for p in TIME_MARKERS):
+        needs_followup = True
+    if 'search_detail' in requires and not any(re.search(p, msg_lower) for p in DETAIL_MARKERS):
+        needs_followup = True
+    if needs_followup:
+        followup_key = 'followup_es' if lang == 'es' else 'followup_en'
+        return (matched_intent, True, pattern.get(followup_key), pattern.get('options', []))
+    return (matched_intent, False, None, None)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures detect_intent throughput with the compiled matcher against the "
+        "previous per-keyword scan, and checks both classify every message alike."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=2000, help="Passes over the corpus")
+        parser.add_argument(
+            "--from-db",
+            action="store_true",
+            help="Use the users' stored chat messages instead of the built-in corpus",
+        )
+
+    def handle(self, *args, **options):
+        corpus = CORPUS
+        if options["from_db"]:
+            corpus = list(
+                ConversationMessage.objects.filter(role="user")
+                .values_list("content", flat=True)
+                .distinct()[:5000]
+            )
+            if not corpus:
+                raise CommandError("No hay mensajes de usuario guardados.")
+
+        differences = [
+            (message, legacy, compiled)
+            for message in corpus
+            if (legacy := _legacy_detect_intent(message)) != (compiled := detect_intent(message))
+        ]
+        for message, legacy, compiled in differences[:20]:
+            self.stdout.write(f"  {message!r}: {legacy[:2]} -> {compiled[:2]}")
+        self.stdout.write(
+            f"{len(corpus)} messages, {len(differences)} classified differently"
+        )
+
+        rounds = options["rounds"]
+        timings = {}
+        for name, detect in (("legacy scan", _legacy_detect_intent), ("compiled", detect_intent)):
+            started = time.perf_counter()
+            for _ in range(rounds):
+                for message in corpus:
+                    detect(message)
+            timings[name] = time.perf_counter() - started
+            rate = rounds * len(corpus) / timings[name]
+            self.stdout.write(f"{name}: {rate:,.0f} messages/s")
+        self.stdout.write(
+            f"speedup: {timings['legacy scan'] / timings['compiled']:.1f}x "
+            f"({len(followup_detector._KEYWORDS)} keywords in one pattern)"
+        )
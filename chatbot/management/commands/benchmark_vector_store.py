@@ -0,0 +1,179 @@
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from chatbot.services import qdrant_service
+from chatbot.services.local_vector_store import EMBEDDING_DIM, LocalVectorStore
+
+# Queries are filtered to this user, as in the chat pipeline.
+USER_ID = 1
+CHUNK = 10_000
+
+
+def _clustered_vectors(rng, centres, count):
+    """Unit vectors around random centres, closer to real embeddings than pure noise."""
+    vectors = centres[rng.integers(0, len(centres), count)]
+    vectors = vectors + 0.5 * rng.standard_normal((count, EMBEDDING_DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _chunks(rng, centres, points, users):
+    """
+    ``(transactions, vectors)`` chunks. Users own contiguous ID ranges, so a chunk
+    touches few users and 10M points never have to be in memory at once.
+    """
+    per_user = max(1, points // users)
+    fecha = datetime(2026, 1, 1, tzinfo=UTC)
+    for start in range(0, points, CHUNK):
+        ids = range(start + 1, min(start + CHUNK, points) + 1)
+        transactions = [
+            SimpleNamespace(
+                id=i, usuario_id=(i - 1) // per_user + 1, tipo="gasto", monto=1,
+                categoria=None, descripcion=f"bench {i}", fecha=fecha + timedelta(minutes=i),
+            )
+            for i in ids
+        ]
+        yield transactions, _clustered_vectors(rng, centres, len(transactions))
+
+
+def _percentile(samples, pct):
+    return statistics.quantiles(samples, n=100)[pct - 1] if len(samples) > 1 else samples[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the local NumPy vector index with Qdrant on synthetic vectors: "
+        "recall@k against exact search, and p50/p95 latency of user-filtered search."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--points", type=int, default=100_000, help="Vectors in total")
+        parser.add_argument(
+            "--users", type=int, default=1, help="Users the points are spread across"
+        )
+        parser.add_argument("--queries", type=int, default=200, help="Search queries to time")
+        parser.add_argument("--k", type=int, default=5, help="Results per query")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--qdrant", action="store_true",
+            help="Also load the vectors into a temporary Qdrant collection and measure it "
+                 "without and then with payload indexes",
+        )
+        parser.add_argument(
+            "--skip-local", action="store_true", help="Only measure Qdrant"
+        )
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        centres = rng.standard_normal((64, EMBEDDING_DIM)).astype(np.float32)
+        queries = _clustered_vectors(rng, centres, options["queries"])
+        k = options["k"]
+        self.stdout.write(
+            f"{options['points']} points across {options['users']} users, "
+            f"{options['queries']} queries, k={k}"
+        )
+
+        def load(write):
+            """Feed every chunk to ``write``; returns the ground truth per query."""
+            own = []
+            chunk_rng = np.random.default_rng(options["seed"] + 1)
+            for transactions, vectors in _chunks(
+                chunk_rng, centres, options["points"], options["users"]
+            ):
+                write(transactions, vectors)
+                mask = np.fromiter((tx.usuario_id == USER_ID for tx in transactions), bool)
+                own.append((np.array([tx.id for tx in transactions])[mask], vectors[mask]))
+            ids = np.concatenate([chunk_ids for chunk_ids, _ in own])
+            matrix = np.concatenate([chunk_vectors for _, chunk_vectors in own])
+            return [set(ids[np.argsort(-(matrix @ q))[:k]].tolist()) for q in queries]
+
+        if not options["skip_local"]:
+            with tempfile.TemporaryDirectory() as directory:
+                store = LocalVectorStore(directory)
+                started = time.perf_counter()
+                truth = load(
+                    lambda txs, vectors: store.upsert_transactions(
+                        list(zip(txs, vectors, strict=True))
+                    )
+                )
+                self.stdout.write(f"local: indexed in {time.perf_counter() - started:.2f}s")
+                self._report(
+                    "local", lambda q: store.search_similar(q, USER_ID, k), queries, truth
+                )
+
+        if options["qdrant"]:
+            self._benchmark_qdrant(load, queries, k)
+
+    def _benchmark_qdrant(self, load, queries, k):
+        from qdrant_client.models import (
+            Distance,
+            FieldCondition,
+            Filter,
+            MatchValue,
+            VectorParams,
+        )
+
+        client = qdrant_service.get_client()
+        if client is None:
+            self.stderr.write(self.style.ERROR("Qdrant is not configured; skipping"))
+            return
+
+        collection = f"bench_{uuid.uuid4().hex[:8]}"
+        client.create_collection(
+            collection_name=collection,
+            vectors_config=VectorParams(size=EMBEDDING_DIM, distance=Distance.COSINE),
+        )
+        try:
+            def write(transactions, vectors):
+                client.upsert(
+                    collection_name=collection,
+                    points=[
+                        qdrant_service._build_point(tx, vector.tolist())
+                        for tx, vector in zip(transactions, vectors, strict=True)
+                    ],
+                    wait=True,
+                )
+
+            started = time.perf_counter()
+            truth = load(write)
+            self.stdout.write(f"qdrant: indexed in {time.perf_counter() - started:.2f}s")
+
+            user_filter = Filter(
+                must=[FieldCondition(key="user_id", match=MatchValue(value=USER_ID))]
+            )
+
+            def search(q):
+                return client.search(
+                    collection_name=collection, query_vector=q.tolist(),
+                    query_filter=user_filter, limit=k,
+                )
+
+            self._report("qdrant, no payload index", search, queries, truth)
+            started = time.perf_counter()
+            qdrant_service.create_payload_indexes(client, collection)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"qdrant: payload indexes built in {elapsed:.2f}s")
+            self._report("qdrant, payload indexes", search, queries, truth)
+        finally:
+            client.delete_collection(collection_name=collection)
+
+    def _report(self, name, search, queries, truth):
+        latencies = []
+        found = 0
+        for query, expected in zip(queries, truth, strict=True):
+            started = time.perf_counter()
+            hits = search(query)
+            latencies.append((time.perf_counter() - started) * 1000)
+            found += len({hit.id for hit in hits} & expected)
+
+        recall = found / sum(len(expected) for expected in truth)
+        self.stdout.write(
+            f"{name}: recall@k={recall:.3f} "
+            f"p50={_percentile(latencies, 50):.2f}ms p95={_percentile(latencies, 95):.2f}ms"
+        )
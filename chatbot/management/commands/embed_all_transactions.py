@@ -1,13 +1,38 @@
-from django.core.management.base import BaseCommand
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
-from chatbot.services.embedding_service import get_embedding
-from chatbot.services.qdrant_service import ensure_collection, upsert_transaction
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from chatbot.services import vector_store
+from chatbot.services.embedding_service import get_embeddings
 from chatbot.signals import _generate_transaction_text
 from finanzas.models import Transaccion
 
+# The local vector store rewrites a user's file on every flush, so writes are
+# batched and the checkpoint only advances when they are durable. Rows whose
+# embedding or upsert failed are listed in the checkpoint and retried on resume.
+CHECKPOINT_SECONDS = 30
+
+
+def _embed_batch(batch, retries):
+    """Embed one batch in a worker thread; returns (batch, embeddings or None)."""
+    texts = [_generate_transaction_text(tx) for tx in batch]
+    for attempt in range(retries + 1):
+        embeddings = get_embeddings(texts)
+        if embeddings is not None:
+            return batch, embeddings
+        if attempt < retries:
+            time.sleep(2 ** attempt)
+    return batch, None
+
 
 class Command(BaseCommand):
-    help = "Generate embeddings for existing transactions and store them in Qdrant"
+    help = "Generate embeddings for existing transactions and store them in the vector store"
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -15,35 +40,183 @@ class Command(BaseCommand):
             type=int,
             help="Only process transactions for this user ID",
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.CHATBOT_EMBEDDING_BATCH_SIZE,
+            help="Texts per embedding request",
+        )
+        parser.add_argument(
+            "--upsert-size",
+            type=int,
+            default=512,
+            help="Points per vector-store upsert",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Concurrent embedding requests",
+        )
+        parser.add_argument(
+            "--retries",
+            type=int,
+            default=2,
+            help="Retries (with backoff) for a failed embedding request",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help=(
+                "File recording the last processed transaction ID and the IDs that failed; "
+                "resumes from it (retrying those) if present"
+            ),
+        )
 
     def handle(self, *args, **options):
-        if not ensure_collection():
+        if not vector_store.ensure_collection():
             self.stderr.write(
                 self.style.ERROR(
-                    "Could not ensure Qdrant collection. Check QDRANT_URL/QDRANT_API_KEY."
+                    f"Could not ensure the {vector_store.backend_name()} vector store. "
+                    "Check QDRANT_URL/QDRANT_API_KEY or CHATBOT_LOCAL_VECTOR_DIR."
                 )
             )
             return
 
-        queryset = Transaccion.objects.select_related("categoria", "usuario")
+        if options["workers"] > settings.CHATBOT_HTTP_POOL_MAXSIZE:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"--workers={options['workers']} exceeds CHATBOT_HTTP_POOL_MAXSIZE="
+                    f"{settings.CHATBOT_HTTP_POOL_MAXSIZE}; extra workers will wait for a "
+                    "pooled connection"
+                )
+            )
+
         user_id = options.get("user_id")
+        checkpoint = Path(options["checkpoint"]) if options["checkpoint"] else None
+        last_id, retry_ids = self._read_checkpoint(checkpoint, user_id)
+
+        queryset = (
+            Transaccion.objects.select_related("categoria")
+            .only(
+                "id", "usuario", "tipo", "monto", "fecha", "descripcion", "categoria__nombre"
+            )
+            .filter(Q(id__gt=last_id) | Q(id__in=retry_ids))
+            .order_by("id")
+        )
         if user_id:
             queryset = queryset.filter(usuario_id=user_id)
 
         total = queryset.count()
-        self.stdout.write(f"Embedding {total} transactions...")
-
-        success = 0
-        failed = 0
-        for tx in queryset.iterator():
-            embedding = get_embedding(_generate_transaction_text(tx))
-            if embedding and upsert_transaction(tx, embedding):
-                success += 1
-            else:
-                failed += 1
+        resumed = (
+            f" (resuming after ID {last_id}, retrying {len(retry_ids)} failed)" if last_id else ""
+        )
+        self.stdout.write(f"Embedding {total} transactions{resumed}...")
 
+        self.success = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+        self.synced_at = self.start
+        # Failed in this run, and failed before and not retried yet: both go to
+        # the checkpoint so a resume retries them.
+        self.failed_ids = set()
+        self.retry_ids = set(retry_ids)
+        self.last_id = last_id
+        pending_points = []
+
+        # Results are consumed in submission order so the checkpoint only ever
+        # covers a contiguous prefix of IDs; at most 2x workers batches are in
+        # flight, which bounds memory.
+        in_flight = deque()
+        batch_size = options["batch_size"]
+        executor = ThreadPoolExecutor(max_workers=options["workers"])
+        with vector_store.deferred(), executor:
+            for batch in self._batches(queryset, batch_size):
+                in_flight.append(executor.submit(_embed_batch, batch, options["retries"]))
+                if len(in_flight) < options["workers"] * 2:
+                    continue
+                self._collect(in_flight.popleft(), pending_points)
+                if len(pending_points) >= options["upsert_size"]:
+                    self._flush(pending_points, checkpoint, user_id)
+
+            while in_flight:
+                self._collect(in_flight.popleft(), pending_points)
+                if len(pending_points) >= options["upsert_size"]:
+                    self._flush(pending_points, checkpoint, user_id)
+            self._flush(pending_points, checkpoint, user_id, final=True)
+
+        elapsed = time.perf_counter() - self.start
         self.stdout.write(
             self.style.SUCCESS(
-                f"Done. Success: {success}, Failed: {failed}, Total: {total}"
+                f"Done. Success: {self.success}, Failed: {self.failed}, Total: {total} "
+                f"in {elapsed:.1f}s ({self._rate():.1f} rows/s)"
             )
         )
+
+    def _batches(self, queryset, size):
+        batch = []
+        for tx in queryset.iterator(chunk_size=size * 10):
+            batch.append(tx)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _collect(self, future, pending_points):
+        batch, embeddings = future.result()
+        if embeddings is None:
+            self._fail(tx.id for tx in batch)
+        else:
+            for tx, vector in zip(batch, embeddings, strict=True):
+                if vector:
+                    pending_points.append((tx, vector))
+                else:
+                    self._fail([tx.id])
+        self.retry_ids.difference_update(tx.id for tx in batch)
+        self.last_id = max(self.last_id, batch[-1].id)
+
+    def _fail(self, ids):
+        before = len(self.failed_ids)
+        self.failed_ids.update(ids)
+        self.failed += len(self.failed_ids) - before
+
+    def _flush(self, pending_points, checkpoint, user_id, final=False):
+        if pending_points:
+            if vector_store.upsert_transactions(pending_points, ensure=False):
+                self.success += len(pending_points)
+            else:
+                self._fail(tx.id for tx, _ in pending_points)
+            pending_points.clear()
+            self.stdout.write(
+                f"  {self.success + self.failed} processed, {self._rate():.1f} rows/s"
+            )
+        if not final and time.perf_counter() - self.synced_at < CHECKPOINT_SECONDS:
+            return
+        if not vector_store.flush():
+            raise CommandError("Could not write the vector store; checkpoint not advanced")
+        self.synced_at = time.perf_counter()
+        if checkpoint is not None:
+            checkpoint.write_text(
+                json.dumps(
+                    {
+                        "user_id": user_id,
+                        "last_id": self.last_id,
+                        "failed_ids": sorted(self.failed_ids | self.retry_ids),
+                    }
+                )
+            )
+
+    def _rate(self):
+        elapsed = time.perf_counter() - self.start
+        return (self.success + self.failed) / elapsed if elapsed else 0.0
+
+    def _read_checkpoint(self, checkpoint, user_id):
+        if checkpoint is None or not checkpoint.exists():
+            return 0, []
+        data = json.loads(checkpoint.read_text())
+        if data.get("user_id") != user_id:
+            raise CommandError(
+                f"Checkpoint {checkpoint} belongs to user_id={data.get('user_id')}; "
+                "use another file or delete it"
+            )
+        return data.get("last_id", 0), data.get("failed_ids", [])
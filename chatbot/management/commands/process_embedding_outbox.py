@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from chatbot.models import EmbeddingCacheEntry
+from chatbot.services.embedding_outbox import drain_once
+from chatbot.services.embedding_service import HF_EMBEDDING_URL
+
+
+class Command(BaseCommand):
+    help = "Apply queued transaction embeddings/deletions (EmbeddingOutbox) to Qdrant"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Outbox rows claimed per pass",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Seconds to sleep when the outbox is empty",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain what is currently due and exit instead of running forever",
+        )
+
+    def handle(self, *args, **options):
+        pruned = EmbeddingCacheEntry.prune_stale(HF_EMBEDDING_URL)
+        if pruned:
+            self.stdout.write(f"Pruned {pruned} cached embeddings from a previous model.")
+
+        total = 0
+        while True:
+            close_old_connections()
+            claimed = drain_once(options["batch_size"])
+            total += claimed
+            if claimed:
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["poll_interval"])
+
+        self.stdout.write(self.style.SUCCESS(f"Done. Claimed {total} outbox rows."))
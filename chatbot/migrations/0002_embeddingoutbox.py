@@ -0,0 +1,43 @@
+# Generated by Django 5.1.15 on 2026-10-18 08:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('chatbot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingOutbox',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name='ID'
+                    ),
+                ),
+                ('transaction_id', models.BigIntegerField(unique=True)),
+                (
+                    'operation',
+                    models.CharField(
+                        choices=[('upsert', 'Upsert'), ('delete', 'Delete')], max_length=6
+                    ),
+                ),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Embedding pendiente',
+                'verbose_name_plural': 'Embeddings pendientes',
+                'indexes': [
+                    models.Index(fields=['available_at'], name='embedding_outbox_avail_idx')
+                ],
+            },
+        ),
+    ]
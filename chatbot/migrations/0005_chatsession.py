@@ -0,0 +1,78 @@
+# Generated by Django 5.1.15 on 2026-10-18 08:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def backfill_sessions(apps, schema_editor):
+    ConversationMessage = apps.get_model("chatbot", "ConversationMessage")
+    ChatSession = apps.get_model("chatbot", "ChatSession")
+
+    rows = (
+        ConversationMessage.objects.values("usuario_id", "session_id")
+        .annotate(last_activity=Max("created_at"), message_count=Count("id"))
+        .order_by()
+    )
+    ChatSession.objects.bulk_create(
+        [ChatSession(**row) for row in rows.iterator()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('chatbot', '0004_conversationsummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatSession',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name='ID'
+                    ),
+                ),
+                ('session_id', models.CharField(max_length=64)),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('last_activity', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Sesión de Chat',
+                'verbose_name_plural': 'Sesiones de Chat',
+                'ordering': ['-last_activity'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='conversationmessage',
+            index=models.Index(
+                fields=['usuario', 'session_id', 'created_at'], name='chat_msg_session_idx'
+            ),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='usuario',
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='chat_sessions',
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(
+                fields=['usuario', '-last_activity'], name='chat_session_recent_idx'
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name='chatsession',
+            unique_together={('usuario', 'session_id')},
+        ),
+        migrations.RunPython(backfill_sessions, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('chatbot', '0005_chatsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='embeddingoutbox',
+            name='failed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,5 +1,8 @@
 ﻿from django.contrib.auth.models import User
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Subquery, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 
 class ConversationMessage(models.Model):
@@ -26,9 +29,236 @@ class ConversationMessage(models.Model):
 
     class Meta:
         ordering = ["created_at"]
+        indexes = [
+            # History reads: a session's messages in order.
+            models.Index(
+                fields=["usuario", "session_id", "created_at"], name="chat_msg_session_idx"
+            ),
+        ]
         verbose_name = "Mensaje de Chat"
         verbose_name_plural = "Mensajes de Chat"
 
     def __str__(self):
         return f"{self.role}: {self.content[:50]}..."
 
+    def save(self, *args, **kwargs):
+        """Save the message and count it in its ``ChatSession`` in the same DB transaction."""
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                ChatSession.record_message(self.usuario_id, self.session_id, self.created_at)
+
+
+class ChatSession(models.Model):
+    """
+    One row per conversation, kept up to date by ``ConversationMessage.save``
+    and, for deletes, a ``post_delete`` receiver (``chatbot.signals``), so
+    listing a user's sessions is an index range read instead of a GROUP BY
+    over all of their messages.
+    """
+
+    usuario = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="chat_sessions",
+    )
+    session_id = models.CharField(max_length=64)
+    message_count = models.PositiveIntegerField(default=0)
+    last_activity = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-last_activity"]
+        unique_together = ("usuario", "session_id")
+        indexes = [
+            models.Index(fields=["usuario", "-last_activity"], name="chat_session_recent_idx"),
+        ]
+        verbose_name = "Sesión de Chat"
+        verbose_name_plural = "Sesiones de Chat"
+
+    def __str__(self):
+        return f"{self.session_id} ({self.message_count} mensajes)"
+
+    @classmethod
+    def record_message(cls, usuario_id, session_id, created_at):
+        """Count one more message in the session, creating the row for its first one."""
+        values = {"message_count": F("message_count") + 1, "last_activity": created_at}
+        if cls.objects.filter(usuario_id=usuario_id, session_id=session_id).update(**values):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    usuario_id=usuario_id,
+                    session_id=session_id,
+                    message_count=1,
+                    last_activity=created_at,
+                )
+        except IntegrityError:
+            # A concurrent request of the same session created it first.
+            cls.objects.filter(usuario_id=usuario_id, session_id=session_id).update(**values)
+
+    @classmethod
+    def forget_message(cls, usuario_id, session_id, created_at):
+        """Uncount a deleted message; the session's row goes with its last message."""
+        session = cls.objects.filter(usuario_id=usuario_id, session_id=session_id)
+        if session.filter(message_count__lte=1).delete()[0]:
+            return
+        # Only the newest message moves last_activity back, to the newest one left.
+        newest_left = ConversationMessage.objects.filter(
+            usuario_id=usuario_id, session_id=session_id
+        ).order_by("-created_at").values("created_at")[:1]
+        session.update(
+            message_count=F("message_count") - 1,
+            last_activity=Case(
+                When(
+                    last_activity=created_at,
+                    then=Coalesce(Subquery(newest_left), F("last_activity")),
+                ),
+                default=F("last_activity"),
+            ),
+        )
+
+
+class ConversationSummary(models.Model):
+    """
+    Rolling summary of the turns of a session that no longer fit the prompt's
+    history budget (see ``chatbot.services.history``).
+
+    Turns are folded in once, oldest first, as they leave the window;
+    ``last_message_id`` is the newest folded message, so every request only
+    summarizes what it pushed out. The text is trimmed from the oldest line to
+    stay within its own token budget.
+    """
+
+    LABELS = {"user": "User", "assistant": "Assistant"}
+    LINE_CHARS = 200
+
+    usuario = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="chat_summaries",
+    )
+    session_id = models.CharField(max_length=64)
+    content = models.TextField(blank=True)
+    last_message_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("usuario", "session_id")
+        verbose_name = "Resumen de conversación"
+        verbose_name_plural = "Resúmenes de conversación"
+
+    def __str__(self):
+        return f"{self.session_id}: {self.content[:50]}..."
+
+    @classmethod
+    def _line(cls, message):
+        text = " ".join(message.content.split())
+        if len(text) > cls.LINE_CHARS:
+            text = text[: cls.LINE_CHARS].rsplit(" ", 1)[0] + "…"
+        return f"{cls.LABELS[message.role]}: {text}"
+
+    def fold(self, messages, max_tokens):
+        """Append ``messages`` (oldest first) and drop the oldest lines beyond ``max_tokens``."""
+        from chatbot.services.llm_service import estimate_tokens
+
+        lines = self.content.splitlines() if self.content else []
+        lines += [self._line(msg) for msg in messages if msg.role in self.LABELS]
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+            lines.pop(0)
+        self.content = "\n".join(lines)
+        self.last_message_id = max(self.last_message_id, *(msg.id for msg in messages))
+        self.save()
+
+
+class EmbeddingOutbox(models.Model):
+    """
+    Pending vector-store side effect for one transaction.
+
+    Rows are written in the same database transaction as the Transaccion change
+    and drained by ``process_embedding_outbox`` after commit. There is at most
+    one row per transaction: repeated edits bump ``version`` and overwrite the
+    operation, so the worker only embeds the latest state. A row that fails
+    ``CHATBOT_EMBEDDING_OUTBOX_MAX_ATTEMPTS`` times gets ``failed_at`` and is no
+    longer claimed; the next change to its transaction queues it again.
+    """
+
+    OPERATION_CHOICES = [
+        ("upsert", "Upsert"),
+        ("delete", "Delete"),
+    ]
+
+    # Not a FK: delete events must outlive the transaction row.
+    transaction_id = models.BigIntegerField(unique=True)
+    operation = models.CharField(max_length=6, choices=OPERATION_CHOICES)
+    version = models.PositiveIntegerField(default=1)
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["available_at"], name="embedding_outbox_avail_idx"),
+        ]
+        verbose_name = "Embedding pendiente"
+        verbose_name_plural = "Embeddings pendientes"
+
+    def __str__(self):
+        return f"{self.operation} transaccion {self.transaction_id} (v{self.version})"
+
+    @classmethod
+    def enqueue(cls, transaction_id, operation):
+        """Record the operation, coalescing it into any pending row for the same transaction."""
+        values = {
+            "operation": operation,
+            "version": F("version") + 1,
+            "attempts": 0,
+            "available_at": timezone.now(),
+            "last_error": "",
+            "failed_at": None,
+        }
+        if cls.objects.filter(transaction_id=transaction_id).update(**values):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(transaction_id=transaction_id, operation=operation)
+        except IntegrityError:
+            # A concurrent writer inserted it first.
+            cls.objects.filter(transaction_id=transaction_id).update(**values)
+
+    @classmethod
+    def enqueue_many(cls, transaction_ids, operation="upsert"):
+        """Bulk variant for freshly inserted rows (which cannot have pending entries yet)."""
+        cls.objects.bulk_create(
+            [cls(transaction_id=pk, operation=operation) for pk in transaction_ids],
+            ignore_conflicts=True,
+        )
+
+
+class EmbeddingCacheEntry(models.Model):
+    """
+    Persistent tier of the embedding cache (see ``chatbot.services.embedding_cache``).
+
+    ``key`` is a SHA-256 of the model endpoint and the normalized text, so a model
+    change never serves old vectors; ``prune_stale`` drops rows of other models.
+    """
+
+    key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=255)
+    vector = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Embedding cacheado"
+        verbose_name_plural = "Embeddings cacheados"
+
+    def __str__(self):
+        return f"{self.key[:12]}... ({self.model})"
+
+    @classmethod
+    def prune_stale(cls, model):
+        """Delete vectors computed by any model other than ``model``."""
+        return cls.objects.exclude(model=model).delete()[0]
@@ -13,8 +13,14 @@ RULES:
 8. When summarizing data, highlight the most important insights.
 
 USER'S FINANCIAL DATA:
-{financial_context}
+{financial_context}{rag_section}"""
+
+# Appended only when the intent uses the semantic search.
+RAG_SECTION = """
 
 RELEVANT TRANSACTIONS (semantic search):
 {rag_results}"""
 
+# System message with the turns that no longer fit the history budget.
+HISTORY_SUMMARY = """EARLIER IN THIS CONVERSATION (summary of older turns):
+{summary}"""
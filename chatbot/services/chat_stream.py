@@ -0,0 +1,180 @@
+"""Token-by-token chat answers as server-sent events.
+
+The stream is a series of ``token`` events (``{"text": delta}``) followed by
+one ``done`` event carrying the same payload as the non-streaming endpoint
+plus ``ttft_ms`` (time to first token) and ``total_ms``. Follow-up questions
+and failures produce only the ``done`` event.
+
+The answer is stored in ``ConversationMessage`` once the stream ends. If the
+client disconnects first, the upstream Groq request is closed and whatever
+text was already sent is stored, so the history matches what the user saw.
+A generator cannot be closed while another thread is inside ``next()``, so a
+disconnect during a read only flags the stream and the reading thread closes
+it when the read returns.
+
+Under ASGI the database work runs in the thread-sensitive executor and only
+the blocking reads of the Groq stream go to worker threads; under WSGI the
+same steps run in a plain generator.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+from chatbot.services import response_cache
+from chatbot.services.llm_service import stream_groq
+from chatbot.services.rag_pipeline import (
+    ERROR_RESPONSE,
+    prepare_message,
+    record_llm_answer,
+    save_response,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000)
+
+
+class _Upstream:
+    """Groq delta stream that is closed by whichever thread is free to close it."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    def next(self):
+        """Next delta, or None once the stream ended or was cancelled."""
+        with self._lock:
+            delta = None if self.cancelled.is_set() else next(self.tokens, None)
+        self._close_if_cancelled()
+        return delta
+
+    def close(self):
+        self.cancelled.set()
+        self._close_if_cancelled()
+
+    def _close_if_cancelled(self):
+        # A reader still inside next() holds the lock and closes on its way out.
+        if self.cancelled.is_set() and self._lock.acquire(blocking=False):
+            try:
+                self.tokens.close()
+            finally:
+                self._lock.release()
+
+
+class _Answer:
+    """Text streamed so far and its timings."""
+
+    def __init__(self, user, session_id):
+        self.user = user
+        self.session_id = session_id
+        self.llm_messages = None
+        self.ticket = None
+        self.start = time.monotonic()
+        self.parts = []
+        self.ttft = None
+
+    def add(self, delta):
+        if self.ttft is None:
+            self.ttft = time.monotonic() - self.start
+        self.parts.append(delta)
+        return _event("token", {"text": delta})
+
+    def done(self, result):
+        return _event(
+            "done",
+            {
+                **result,
+                "ttft_ms": _ms(self.ttft),
+                "total_ms": _ms(time.monotonic() - self.start),
+            },
+        )
+
+    def finish(self, upstream, completed):
+        """Close the upstream stream and store the answer; returns the result or None."""
+        upstream.close()
+
+        text = "".join(self.parts)
+        logger.info(
+            "Stream %s: user=%s session=%s ttft=%sms total=%sms chars_resp=%d",
+            "fin" if completed else "cancelado",
+            self.user.username,
+            self.session_id[:8],
+            _ms(self.ttft),
+            _ms(time.monotonic() - self.start),
+            len(text),
+        )
+        if completed:
+            elapsed = time.monotonic() - self.start
+            record_llm_answer(elapsed)
+            if text:
+                response_cache.store(self.ticket, self.llm_messages, text, elapsed)
+            return save_response(self.user, self.session_id, text or ERROR_RESPONSE)
+        if text:
+            save_response(self.user, self.session_id, text)
+        return None
+
+
+def stream_events(user, message, session_id):
+    answer = _Answer(user, session_id)
+    result, answer.llm_messages, answer.ticket = prepare_message(user, message, session_id)
+    if result is not None:
+        yield answer.done(result)
+        return
+
+    upstream = _Upstream(stream_groq(answer.llm_messages))
+    completed = False
+    try:
+        for delta in iter(upstream.next, None):
+            yield answer.add(delta)
+        completed = True
+    finally:
+        result = answer.finish(upstream, completed)
+    yield answer.done(result)
+
+
+async def astream_events(user, message, session_id):
+    answer = _Answer(user, session_id)
+    result, answer.llm_messages, answer.ticket = await sync_to_async(prepare_message)(
+        user, message, session_id
+    )
+    if result is not None:
+        yield answer.done(result)
+        return
+
+    upstream = _Upstream(stream_groq(answer.llm_messages))
+    next_token = sync_to_async(upstream.next, thread_sensitive=False)
+    completed = False
+    try:
+        while (delta := await next_token()) is not None:
+            yield answer.add(delta)
+        completed = True
+    finally:
+        # Shielded so a disconnect (task cancellation) cannot skip the save.
+        result = await asyncio.shield(sync_to_async(answer.finish)(upstream, completed))
+    yield answer.done(result)
+
+
+def streaming_response(request, user, message, session_id):
+    """``StreamingHttpResponse`` with the SSE answer; async under ASGI so nothing is buffered."""
+    if isinstance(request, ASGIRequest):
+        content = astream_events(user, message, session_id)
+    else:
+        content = stream_events(user, message, session_id)
+    response = StreamingHttpResponse(content, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
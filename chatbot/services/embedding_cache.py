@@ -0,0 +1,120 @@
+"""Two-tier, content-addressed cache for embedding vectors.
+
+Vectors are keyed by a SHA-256 of the embedding endpoint (which names the
+model) and the normalized text. Lookups go to a bounded in-process LRU first,
+then to the ``EmbeddingCacheEntry`` table shared by every process; only the
+remaining misses reach the HuggingFace API. Changing ``HF_EMBEDDING_URL``
+changes every key, so vectors from another model are never returned.
+"""
+
+import hashlib
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+
+from chatbot.models import EmbeddingCacheEntry
+from config.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+memory_hits = counter("embedding_cache.memory_hits")
+db_hits = counter("embedding_cache.db_hits")
+misses = counter("embedding_cache.misses")
+
+
+def normalize(text):
+    # all-MiniLM-L6-v2 is uncased, so case and spacing do not change the vector.
+    return " ".join(text.split()).lower()
+
+
+def cache_key(model, text):
+    return hashlib.sha256(f"{model}\n{normalize(text)}".encode()).hexdigest()
+
+
+def _encode(vector):
+    return array("f", vector).tobytes()
+
+
+def _decode(data):
+    return array("f", bytes(data)).tolist()
+
+
+class _LRU:
+    def __init__(self):
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            vector = self._items.get(key)
+            if vector is not None:
+                self._items.move_to_end(key)
+            return vector
+
+    def put(self, key, vector):
+        with self._lock:
+            self._items[key] = vector
+            self._items.move_to_end(key)
+            while len(self._items) > settings.CHATBOT_EMBEDDING_CACHE_SIZE:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_memory = _LRU()
+
+
+def lookup(model, texts):
+    """Return ``{key: vector}`` for the cached texts and the key of every text, in order."""
+    keys = [cache_key(model, text) for text in texts]
+    found = {}
+    for key in set(keys):
+        vector = _memory.get(key)
+        if vector is not None:
+            found[key] = vector
+    in_memory = len(found)
+
+    missing = set(keys) - found.keys()
+    if missing:
+        try:
+            rows = EmbeddingCacheEntry.objects.filter(key__in=missing).values_list("key", "vector")
+            for key, data in rows:
+                found[key] = _decode(data)
+                _memory.put(key, found[key])
+        except Exception as exc:
+            logger.warning("Embedding cache lookup failed: %s", exc)
+
+    # Counted per distinct text.
+    for metric, amount in (
+        (memory_hits, in_memory),
+        (db_hits, len(found) - in_memory),
+        (misses, len(set(keys)) - len(found)),
+    ):
+        if amount:
+            metric.incr(amount)
+    return found, keys
+
+
+def store(model, items):
+    """Save ``{key: vector}`` in both tiers."""
+    for key, vector in items.items():
+        _memory.put(key, vector)
+    try:
+        EmbeddingCacheEntry.objects.bulk_create(
+            [
+                EmbeddingCacheEntry(key=key, model=model, vector=_encode(vector))
+                for key, vector in items.items()
+            ],
+            ignore_conflicts=True,
+        )
+    except Exception as exc:
+        logger.warning("Embedding cache store failed: %s", exc)
+
+
+def clear_memory():
+    _memory.clear()
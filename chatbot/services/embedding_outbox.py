@@ -0,0 +1,153 @@
+"""Drains ``EmbeddingOutbox`` rows into the embedding API and the vector store.
+
+Each pass claims a batch of due rows (leasing them so concurrent workers skip
+them), embeds every pending upsert with batched HuggingFace calls, applies the
+vector-store writes in bulk and then deletes the rows whose ``version`` did not
+change meanwhile. Failed rows are rescheduled with exponential backoff until
+``CHATBOT_EMBEDDING_OUTBOX_MAX_ATTEMPTS``; then they are marked ``failed_at``
+and left for inspection.
+"""
+
+import logging
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Min, Q
+from django.utils import timezone
+
+from chatbot.models import EmbeddingOutbox
+from config.metrics import counter, gauge
+
+logger = logging.getLogger(__name__)
+
+# A claimed row becomes visible again after this long if its worker died.
+LEASE = timedelta(minutes=5)
+BACKOFF_BASE_SECONDS = 10
+BACKOFF_MAX_SECONDS = 3600
+
+processed = counter("embedding_outbox.processed")
+failed = counter("embedding_outbox.failed")
+
+
+def _pending():
+    return EmbeddingOutbox.objects.filter(failed_at__isnull=True)
+
+
+def _oldest_age_seconds():
+    oldest = _pending().aggregate(oldest=Min("created_at"))["oldest"]
+    return round((timezone.now() - oldest).total_seconds()) if oldest else 0
+
+
+gauge("embedding_outbox.depth", lambda: _pending().count())
+gauge("embedding_outbox.retrying", lambda: _pending().filter(attempts__gt=0).count())
+gauge("embedding_outbox.oldest_age_seconds", _oldest_age_seconds)
+gauge("embedding_outbox.dead", lambda: EmbeddingOutbox.objects.exclude(failed_at=None).count())
+
+
+def claim(limit):
+    """Lease up to ``limit`` due rows for this worker."""
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            EmbeddingOutbox.objects.select_for_update(skip_locked=True)
+            .filter(available_at__lte=now, failed_at__isnull=True)
+            .order_by("available_at")[:limit]
+        )
+        if rows:
+            EmbeddingOutbox.objects.filter(pk__in=[row.pk for row in rows]).update(
+                available_at=now + LEASE
+            )
+    return rows
+
+
+def _same_version(rows):
+    return reduce(or_, (Q(pk=row.pk, version=row.version) for row in rows))
+
+
+def _complete(rows):
+    if rows:
+        EmbeddingOutbox.objects.filter(_same_version(rows)).delete()
+        processed.incr(len(rows))
+
+
+def _fail(rows, error):
+    # Rows edited (or completed) since they were claimed are left alone.
+    rescheduled = dead = 0
+    for row in rows:
+        values = {"attempts": F("attempts") + 1, "last_error": error[:1000]}
+        if row.attempts + 1 >= settings.CHATBOT_EMBEDDING_OUTBOX_MAX_ATTEMPTS:
+            values["failed_at"] = timezone.now()
+        else:
+            delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** row.attempts)
+            values["available_at"] = timezone.now() + timedelta(seconds=delay)
+        updated = EmbeddingOutbox.objects.filter(pk=row.pk, version=row.version).update(**values)
+        if "failed_at" in values:
+            dead += updated
+        else:
+            rescheduled += updated
+    if rescheduled or dead:
+        failed.incr(rescheduled + dead)
+    if rescheduled:
+        logger.warning("Embedding outbox: %s rows rescheduled: %s", rescheduled, error)
+    if dead:
+        logger.error("Embedding outbox: %s rows out of attempts, marked failed: %s", dead, error)
+
+
+def _process_upserts(rows):
+    from chatbot.services.embedding_service import get_embeddings
+    from chatbot.services.vector_store import upsert_transactions
+    from chatbot.signals import _generate_transaction_text
+    from finanzas.models import Transaccion
+
+    transactions = Transaccion.objects.select_related("categoria").in_bulk(
+        [row.transaction_id for row in rows]
+    )
+    # Deleted since it was queued: its delete event supersedes this row.
+    _complete([row for row in rows if row.transaction_id not in transactions])
+    rows = [row for row in rows if row.transaction_id in transactions]
+
+    size = settings.CHATBOT_EMBEDDING_BATCH_SIZE
+    for start in range(0, len(rows), size):
+        chunk = rows[start:start + size]
+        texts = [_generate_transaction_text(transactions[row.transaction_id]) for row in chunk]
+        embeddings = get_embeddings(texts)
+        if embeddings is None:
+            _fail(chunk, "embedding request failed")
+            continue
+
+        vectors = list(zip(chunk, embeddings, strict=True))
+        ready = [(row, vector) for row, vector in vectors if vector]
+        _fail([row for row, vector in vectors if not vector], "missing vector")
+        pairs = [(transactions[row.transaction_id], vector) for row, vector in ready]
+        if pairs and upsert_transactions(pairs):
+            _complete([row for row, _ in ready])
+        else:
+            _fail([row for row, _ in ready], "vector upsert failed")
+
+
+def _process_deletes(rows):
+    from chatbot.services.vector_store import delete_points
+
+    if not rows:
+        return
+    if delete_points([row.transaction_id for row in rows]):
+        _complete(rows)
+    else:
+        _fail(rows, "vector delete failed")
+
+
+def drain_once(limit):
+    """Process one batch; returns how many rows were claimed."""
+    rows = claim(limit)
+    if not rows:
+        return 0
+    try:
+        _process_upserts([row for row in rows if row.operation == "upsert"])
+        _process_deletes([row for row in rows if row.operation == "delete"])
+    except Exception as exc:
+        logger.exception("Embedding outbox batch failed")
+        _fail(rows, str(exc))
+    return len(rows)
@@ -3,6 +3,9 @@ import logging
 import requests
 from django.conf import settings
 
+from chatbot.services import embedding_cache
+from chatbot.services.http_client import get_session
+
 logger = logging.getLogger(__name__)
 
 HF_EMBEDDING_URL = (
@@ -14,15 +17,52 @@ EMBEDDING_DIM = 384
 
 def get_embedding(text):
     """
-    Get a 384-dimensional embedding vector via HuggingFace Inference API.
-    Returns a list of floats, or None on failure.
+    Get a 384-dimensional embedding vector, from the embedding cache or the
+    HuggingFace Inference API. Returns a list of floats, or None on failure.
+    """
+    found, (key,) = embedding_cache.lookup(HF_EMBEDDING_URL, [text])
+    if key in found:
+        return found[key]
+
+    embedding = _request_embedding(text)
+    if embedding:
+        embedding_cache.store(HF_EMBEDDING_URL, {key: embedding})
+    return embedding
+
+
+def get_embeddings(texts):
+    """
+    Embed several texts, calling the API once for the ones not in the cache
+    (each distinct text once). Returns a list aligned with ``texts`` (None where
+    a vector is missing), or None if the API request failed.
     """
+    if not texts:
+        return []
+
+    found, keys = embedding_cache.lookup(HF_EMBEDDING_URL, texts)
+    pending = {}
+    for key, text in zip(keys, texts, strict=True):
+        if key not in found:
+            pending.setdefault(key, text)
+
+    if pending:
+        vectors = _request_embeddings(list(pending.values()))
+        if vectors is None:
+            return None
+        fresh = {key: vector for key, vector in zip(pending, vectors, strict=True) if vector}
+        embedding_cache.store(HF_EMBEDDING_URL, fresh)
+        found.update(fresh)
+
+    return [found.get(key) for key in keys]
+
+
+def _request_embedding(text):
     if not settings.HF_API_TOKEN:
         logger.warning("HF_API_TOKEN is not configured, skipping embedding")
         return None
 
     try:
-        response = requests.post(
+        response = get_session().post(
             HF_EMBEDDING_URL,
             headers={"Authorization": f"Bearer {settings.HF_API_TOKEN}"},
             json={"inputs": text, "options": {"wait_for_model": True}},
@@ -46,3 +86,38 @@ def get_embedding(text):
     except requests.exceptions.RequestException as e:
         logger.error(f"HuggingFace embedding API error: {e}")
         return None
+
+
+def _request_embeddings(texts):
+    """
+    Embed several texts in a single HuggingFace Inference API call.
+    Returns a list aligned with ``texts`` (None where a vector is missing),
+    or None if the whole request failed.
+    """
+    if not settings.HF_API_TOKEN:
+        logger.warning("HF_API_TOKEN is not configured, skipping embedding")
+        return None
+
+    try:
+        response = get_session().post(
+            HF_EMBEDDING_URL,
+            headers={"Authorization": f"Bearer {settings.HF_API_TOKEN}"},
+            json={"inputs": list(texts), "options": {"wait_for_model": True}},
+            timeout=60,
+        )
+        response.raise_for_status()
+        embeddings = response.json()
+
+        if not isinstance(embeddings, list) or len(embeddings) != len(texts):
+            logger.warning(f"Unexpected batch embedding shape: {type(embeddings)}")
+            return None
+        return [
+            vector if isinstance(vector, list) and len(vector) == EMBEDDING_DIM else None
+            for vector in embeddings
+        ]
+    except requests.exceptions.Timeout:
+        logger.error("HuggingFace embedding API timed out")
+        return None
+    except requests.exceptions.RequestException as e:
+        logger.error(f"HuggingFace embedding API error: {e}")
+        return None
@@ -0,0 +1,373 @@
+"""Exact, templated answers for structured questions, without calling the LLM.
+
+``balance_check``, ``income_query``, ``spending_query`` and ``budget_status``
+questions are answered from the ledger (``BalanceUsuario``), the monthly
+rollup (``ResumenMensualCategoria``) or, for periods shorter than a month, an
+aggregate over ``Transaccion``: one or two queries instead of a Groq round
+trip.
+
+The fast path only answers when it understood the whole message: the words
+left after removing the intent keywords, the time period, a category name and
+filler words must be none. Anything else ("¿por qué gasto tanto?", "¿me
+alcanza para un viaje?", an ambiguous period like "15/02" or a message that
+matches several intents) returns None and goes to the LLM.
+"""
+
+import calendar
+import re
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from chatbot.services.followup_detector import (
+    KEYWORD_INTENTS,
+    KEYWORD_PATTERN,
+    _detect_language,
+)
+from finanzas.models import (
+    BalanceUsuario,
+    Categoria,
+    Presupuesto,
+    ResumenMensualCategoria,
+    Transaccion,
+)
+
+INTENTS = ("balance_check", "income_query", "spending_query", "budget_status")
+
+# start/end are inclusive dates (None for all time); whole_months periods are
+# read from the monthly rollup, the others from Transaccion. es/en are the
+# period as an adverbial phrase ("en marzo de 2026", "today").
+Period = namedtuple("Period", "start end whole_months es en")
+ALL_TIME = Period(None, None, True, "en total", "in total")
+
+MONTHS_ES = (
+    "enero", "febrero", "marzo", "abril", "mayo", "junio",
+    "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre",
+)
+MONTHS_EN = (
+    "january", "february", "march", "april", "may", "june",
+    "july", "august", "september", "october", "november", "december",
+)
+
+# Words that carry no meaning for these questions. Anything outside this set,
+# the intent keywords, the period and the category names sends the message to
+# the LLM.
+FILLER_WORDS = frozenset(
+    """
+    a al actual actualmente ahora cual cuál cuales cuáles cuanto cuánto cuanta cuánta
+    cuantos cuántos como cómo de del dime dinero el en es esta está este estado estoy
+    favor fue gracias ha hasta hay he hola la las llevo lo los me mi mis mostrar
+    muestra muéstrame por quiero que qué saber son su sus tengo total tu tus un una
+    va vamos ver voy y
+    all am are at current currently did do does far have hello hi how i in is it
+    m me much my of on please s show so status tell the this total was what were
+    """.split()
+)
+
+_WORD = re.compile(r"\w+")
+
+
+def _month_end(year, month):
+    return date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _shift_month(year, month, delta):
+    index = year * 12 + month - 1 + delta
+    return index // 12, index % 12 + 1
+
+
+def _month(year, month):
+    return Period(
+        date(year, month, 1),
+        _month_end(year, month),
+        True,
+        f"en {MONTHS_ES[month - 1]} de {year}",
+        f"in {MONTHS_EN[month - 1].capitalize()} {year}",
+    )
+
+
+def _last_months(today, count):
+    year, month = _shift_month(today.year, today.month, 1 - count)
+    return Period(
+        date(year, month, 1),
+        today,
+        True,
+        f"en los últimos {count} meses",
+        f"in the last {count} months",
+    )
+
+
+def _named_month(today, match):
+    name = match.group("name")
+    month = (MONTHS_ES.index(name) if name in MONTHS_ES else MONTHS_EN.index(name)) + 1
+    if match.group("year"):
+        year = int(match.group("year"))
+    else:
+        # A bare month name means its latest occurrence.
+        year = today.year if month <= today.month else today.year - 1
+    return _month(year, month)
+
+
+def _year(year, today):
+    end = today if year == today.year else date(year, 12, 31)
+    return Period(date(year, 1, 1), end, True, f"en {year}", f"in {year}")
+
+
+_MONTH_NAMES = "|".join(MONTHS_ES + MONTHS_EN)
+
+# (pattern, builder(today, match)). A builder returning None marks a period
+# the fast path does not interpret.
+PERIOD_PATTERNS = (
+    (r"\b(este mes|mes actual|this month)\b", lambda t, m: _month(t.year, t.month)),
+    (
+        r"\b(mes pasado|[uú]ltimo mes|last month)\b",
+        lambda t, m: _month(*_shift_month(t.year, t.month, -1)),
+    ),
+    (
+        r"\b(esta semana|this week)\b",
+        lambda t, m: Period(t - timedelta(days=t.weekday()), t, False, "esta semana", "this week"),
+    ),
+    (r"\b(hoy|today)\b", lambda t, m: Period(t, t, False, "hoy", "today")),
+    (
+        r"\b(ayer|yesterday)\b",
+        lambda t, m: Period(
+            t - timedelta(days=1), t - timedelta(days=1), False, "ayer", "yesterday"
+        ),
+    ),
+    (
+        r"\b(?:[uú]ltimos|last) (\d{1,2}) (?:meses|months)\b",
+        lambda t, m: _last_months(t, int(m.group(1))) if 0 < int(m.group(1)) <= 60 else None,
+    ),
+    (r"\b([uú]ltimo trimestre|last quarter)\b", lambda t, m: _last_months(t, 3)),
+    (r"\btrimestre\b", lambda t, m: None),
+    (
+        rf"\b(?P<name>{_MONTH_NAMES})(?:(?: de| del| of)? (?P<year>(?:19|20)\d\d))?\b",
+        _named_month,
+    ),
+    (r"\b(este año|this year)\b", lambda t, m: _year(t.year, t)),
+    (r"\b(año pasado|last year)\b", lambda t, m: _year(t.year - 1, t)),
+    (r"\b((?:19|20)\d\d)\b", lambda t, m: _year(int(m.group(1)), t)),
+    (r"\b\d{1,2}/\d{1,2}\b", lambda t, m: None),
+    (r"\b(todo|siempre|all time|always|ever)\b", lambda t, m: ALL_TIME),
+)
+PERIOD_PATTERNS = tuple((re.compile(pattern), build) for pattern, build in PERIOD_PATTERNS)
+
+_UNPARSED = object()
+
+
+def parse_period(message, today=None):
+    """
+    ``(period, rest)`` for the time period named in ``message``, with the
+    period's words removed from ``rest``. ``period`` is None when there is
+    none and ``_UNPARSED`` when it is ambiguous or not supported.
+    """
+    today = today or timezone.localdate()
+    found = []
+    rest = message
+    for pattern, build in PERIOD_PATTERNS:
+        for match in pattern.finditer(rest):
+            found.append(build(today, match))
+        rest = pattern.sub(" ", rest)
+
+    if not found:
+        return None, rest
+    if any(period is None for period in found) or len(set(found)) > 1:
+        return _UNPARSED, rest
+    if found[0].start and found[0].start > today:
+        return _UNPARSED, rest
+    return found[0], rest
+
+
+def _strip_keywords(text):
+    """``(intents whose keywords appear, text without them)``."""
+    intents = set()
+
+    def strip(match):
+        intents.update(KEYWORD_INTENTS[match.group()])
+        return " "
+
+    return intents, KEYWORD_PATTERN.sub(strip, text)
+
+
+def _category(user, text, tipo):
+    """``(Categoria or None, text without its name)``; ``_UNPARSED`` if several match."""
+    found = []
+    for categoria in Categoria.objects.filter(usuario=user, tipo=tipo).only("id", "nombre"):
+        name = categoria.nombre.lower()
+        if re.search(rf"\b{re.escape(name)}\b", text):
+            found.append(categoria)
+            text = text.replace(name, " ")
+    if len(found) > 1:
+        return _UNPARSED, text
+    return (found[0] if found else None), text
+
+
+def _understood(text):
+    return all(word in FILLER_WORDS for word in _WORD.findall(text))
+
+
+def _totals(user, period, categoria=None):
+    """``{tipo: [(category name, total), ...]}`` for the period, largest first."""
+    if period.whole_months:
+        rows = ResumenMensualCategoria.objects.filter(usuario=user)
+        if period.start is not None:
+            rows = rows.annotate(indice=F("año") * 12 + F("mes")).filter(
+                indice__range=(
+                    period.start.year * 12 + period.start.month,
+                    period.end.year * 12 + period.end.month,
+                )
+            )
+        amount = "total"
+    else:
+        rows = Transaccion.objects.filter(
+            usuario=user, fecha__date__range=(period.start, period.end)
+        )
+        amount = "monto"
+    if categoria is not None:
+        rows = rows.filter(categoria=categoria)
+
+    totals = {"ingreso": [], "gasto": []}
+    for row in (
+        rows.values("tipo", "categoria__nombre")
+        .annotate(suma=Sum(amount))
+        .filter(suma__gt=0)
+        .order_by("-suma")
+    ):
+        totals[row["tipo"]].append((row["categoria__nombre"], row["suma"]))
+    return totals
+
+
+def _money(amount):
+    return f"${amount:,.2f}"
+
+
+def _when(period, lang):
+    """The period phrase, capitalized to open a sentence."""
+    phrase = getattr(period, lang)
+    return phrase[0].upper() + phrase[1:]
+
+
+def _breakdown(rows, lang, limit=3):
+    if len(rows) < 2:
+        return ""
+    none = "Sin categoría" if lang == "es" else "Uncategorized"
+    items = ", ".join(f"{name or none} {_money(total)}" for name, total in rows[:limit])
+    return f" ({'principales' if lang == 'es' else 'top'}: {items})"
+
+
+def _answer_balance(user, period, lang):
+    if period is None or period.start is None:
+        ledger = BalanceUsuario.para_usuario(user.id)
+        if lang == "es":
+            return (
+                f"Tu balance actual es {_money(ledger.balance)} "
+                f"(ingresos {_money(ledger.ingresos)}, gastos {_money(ledger.gastos)})."
+            )
+        return (
+            f"Your current balance is {_money(ledger.balance)} "
+            f"(income {_money(ledger.ingresos)}, expenses {_money(ledger.gastos)})."
+        )
+
+    totals = _totals(user, period)
+    ingresos = sum((total for _, total in totals["ingreso"]), Decimal("0"))
+    gastos = sum((total for _, total in totals["gasto"]), Decimal("0"))
+    if lang == "es":
+        return (
+            f"{_when(period, lang)} ingresaste {_money(ingresos)} y gastaste "
+            f"{_money(gastos)}: un balance de {_money(ingresos - gastos)}."
+        )
+    return (
+        f"{_when(period, lang)} you earned {_money(ingresos)} and spent "
+        f"{_money(gastos)}: a balance of {_money(ingresos - gastos)}."
+    )
+
+
+def _answer_flow(user, period, lang, tipo, categoria):
+    rows = _totals(user, period, categoria)[tipo]
+    total = sum((amount for _, amount in rows), Decimal("0"))
+    if lang == "es":
+        verb = "ingresaste" if tipo == "ingreso" else "gastaste"
+        where = f" en {categoria.nombre}" if categoria else ""
+    else:
+        verb = "you earned" if tipo == "ingreso" else "you spent"
+        where = f" on {categoria.nombre}" if categoria else ""
+    text = f"{_when(period, lang)} {verb} {_money(total)}{where}"
+    if categoria is None:
+        text += _breakdown(rows, lang)
+    return text + "."
+
+
+def _answer_budgets(user, period, lang):
+    today = timezone.localdate()
+    period = period or _month(today.year, today.month)
+    if period.start is None or (period.start.year, period.start.month) != (
+        period.end.year,
+        period.end.month,
+    ):
+        # Budgets are monthly; a longer period needs the LLM to summarize.
+        return None
+    period = _month(period.start.year, period.start.month)
+
+    budgets = list(
+        Presupuesto.objects.filter(usuario=user, año=period.start.year, mes=period.start.month)
+        .con_gasto_actual()
+        .select_related("categoria")
+        .order_by("categoria__nombre")
+    )
+    when = getattr(period, lang)
+    if not budgets:
+        if lang == "es":
+            return f"No tienes presupuestos {when}."
+        return f"You have no budgets {when}."
+
+    lines = []
+    for budget in budgets:
+        if budget.esta_excedido:
+            status = "EXCEDIDO" if lang == "es" else "OVER BUDGET"
+        else:
+            status = f"{budget.get_porcentaje_usado()}%"
+        lines.append(
+            f"- {budget.categoria.nombre}: {_money(budget.get_gasto_actual())} / "
+            f"{_money(budget.monto_maximo)} ({status})"
+        )
+    over = sum(1 for budget in budgets if budget.esta_excedido)
+    if lang == "es":
+        header = f"Presupuestos {when} ({over} excedido{'' if over == 1 else 's'}):"
+    else:
+        header = f"Budgets {when} ({over} over budget):"
+    return "\n".join([header, *lines])
+
+
+def answer(user, message, intent):
+    """The exact answer to ``message``, or None when the LLM should answer it."""
+    if intent not in INTENTS:
+        return None
+
+    text = message.lower()
+    period, text = parse_period(text)
+    if period is _UNPARSED:
+        return None
+
+    # Category names first: "Compras" must not read as the keyword "compra".
+    categoria = None
+    if intent in ("spending_query", "income_query"):
+        tipo = "gasto" if intent == "spending_query" else "ingreso"
+        categoria, text = _category(user, text, tipo)
+        if categoria is _UNPARSED:
+            return None
+    intents, text = _strip_keywords(text)
+    if intents != {intent} or not _understood(text):
+        return None
+
+    lang = _detect_language(message)
+    if intent == "balance_check":
+        return _answer_balance(user, period, lang)
+    if intent == "budget_status":
+        return _answer_budgets(user, period, lang)
+    if period is None and intent == "spending_query":
+        # detect_intent asks for the period first; never guess it.
+        return None
+    return _answer_flow(user, period or ALL_TIME, lang, tipo, categoria)
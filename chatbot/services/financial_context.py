@@ -1,91 +1,244 @@
 ﻿import logging
+import time
+from collections import namedtuple
+from contextlib import nullcontext
 from decimal import Decimal
+from functools import cached_property
 
-from django.db.models import Sum
+from django.db import OperationalError, connection, transaction
+from django.db.models import OuterRef, Subquery
 from django.utils import timezone
 
-from finanzas.models import Categoria, Presupuesto, Transaccion
+from finanzas.models import (
+    BalanceUsuario,
+    Categoria,
+    Presupuesto,
+    ResumenMensualCategoria,
+    Transaccion,
+)
 
 logger = logging.getLogger(__name__)
 
+CONTEXT_UNAVAILABLE = "Contexto financiero no disponible en este momento."
 
-def build_financial_context(user):
-    parts = []
-
-    totals = (
-        Transaccion.objects.filter(usuario=user)
-        .values("tipo")
-        .annotate(total=Sum("monto"))
-    )
 
-    ingresos = Decimal("0")
-    gastos = Decimal("0")
-    for item in totals:
-        if item["tipo"] == "ingreso":
-            ingresos = item["total"] or Decimal("0")
-        elif item["tipo"] == "gasto":
-            gastos = item["total"] or Decimal("0")
-
-    balance = ingresos - gastos
-    parts.append(
-        f"Balance actual: ${balance:.2f} (Ingresos totales: ${ingresos:.2f}, Gastos totales: ${gastos:.2f})"
+def _category_rows(user, year, month):
+    """
+    One row per category of the user with this month's spending and budget,
+    plus the ledger totals and the uncategorised spending repeated on every
+    row, so the whole summary comes from a single query.
+    """
+    month_rollup = ResumenMensualCategoria.objects.filter(
+        usuario_id=user.id, año=year, mes=month, tipo="gasto", num_transacciones__gt=0
     )
-
-    now = timezone.now()
-    category_spending = (
-        Transaccion.objects.filter(
-            usuario=user,
-            tipo="gasto",
-            fecha__year=now.year,
-            fecha__month=now.month,
+    ledger = BalanceUsuario.objects.filter(usuario_id=user.id)
+    return (
+        Categoria.objects.filter(usuario=user)
+        .annotate(
+            gastado=Subquery(month_rollup.filter(categoria=OuterRef("pk")).values("total")[:1]),
+            presupuesto=Subquery(
+                Presupuesto.objects.filter(
+                    usuario_id=user.id, categoria=OuterRef("pk"), año=year, mes=month
+                ).values("monto_maximo")[:1]
+            ),
+            sin_categoria=Subquery(
+                month_rollup.filter(categoria__isnull=True).values("total")[:1]
+            ),
+            ledger_ingresos=Subquery(ledger.values("ingresos")[:1]),
+            ledger_gastos=Subquery(ledger.values("gastos")[:1]),
         )
-        .values("categoria__nombre")
-        .annotate(total=Sum("monto"))
-        .order_by("-total")
+        .order_by("nombre")
     )
 
-    if category_spending:
-        lines = [f"Gastos de {now.strftime('%B %Y')} por categoría:"]
-        for item in category_spending:
-            categoria = item["categoria__nombre"] or "Sin categoría"
-            lines.append(f"  - {categoria}: ${item['total']:.2f}")
-        parts.append("\n".join(lines))
-
-    budgets = Presupuesto.objects.filter(usuario=user, mes=now.month, año=now.year).select_related("categoria")
-    if budgets.exists():
-        lines = ["Estado de presupuestos (mes actual):"]
-        for budget in budgets:
-            spent = budget.get_gasto_actual()
-            pct = budget.get_porcentaje_usado()
-            status = "EXCEDIDO" if budget.esta_excedido else f"{pct:.0f}%"
-            lines.append(
-                f"  - {budget.categoria.nombre}: ${spent:.2f} / ${budget.monto_maximo:.2f} ({status})"
-            )
-        parts.append("\n".join(lines))
 
-    recent = (
-        Transaccion.objects.filter(usuario=user)
-        .select_related("categoria")
-        .order_by("-fecha")[:10]
-    )
+class _Sources:
+    """The data behind the sections, each loaded on first use and shared."""
+
+    def __init__(self, user, names):
+        self.user = user
+        self.names = names
+        self.now = timezone.localdate()
+
+    @cached_property
+    def categorias(self):
+        return list(_category_rows(self.user, self.now.year, self.now.month))
+
+    @cached_property
+    def ledger(self):
+        # The category query carries the ledger totals; reuse them when it runs anyway.
+        if "categorias" in self.names and self.categorias:
+            first = self.categorias[0]
+            if first.ledger_ingresos is not None:
+                return first.ledger_ingresos, first.ledger_gastos
+        ledger = BalanceUsuario.para_usuario(self.user.id)
+        return ledger.ingresos, ledger.gastos
+
+    @cached_property
+    def recientes(self):
+        return list(
+            Transaccion.objects.filter(usuario=self.user)
+            .select_related("categoria")
+            .order_by("-fecha")[:10]
+        )
 
-    if recent:
-        lines = ["Últimas 10 transacciones:"]
-        for tx in recent:
-            sign = "+" if tx.tipo == "ingreso" else "-"
-            categoria = tx.categoria.nombre if tx.categoria else "Sin categoría"
-            desc = f" - {tx.descripcion}" if tx.descripcion else ""
-            lines.append(
-                f"  {sign}${tx.monto:.2f} | {categoria} | {tx.fecha.strftime('%d/%m/%Y')}{desc}"
+
+def _balance(sources):
+    ingresos, gastos = sources.ledger
+    balance = ingresos - gastos
+    return [
+        f"Balance actual: ${balance:.2f} (Ingresos totales: ${ingresos:.2f}, Gastos totales: ${gastos:.2f})"
+    ]
+
+
+def _month_spending(sources):
+    categories = sources.categorias
+    category_spending = [(cat.nombre, cat.gastado) for cat in categories if cat.gastado]
+    if categories and categories[0].sin_categoria:
+        category_spending.append(("Sin categoría", categories[0].sin_categoria))
+    category_spending.sort(key=lambda item: item[1], reverse=True)
+    if not category_spending:
+        return []
+
+    lines = [f"Gastos de {sources.now.strftime('%B %Y')} por categoría:"]
+    for categoria, gastado in category_spending:
+        lines.append(f"  - {categoria}: ${gastado:.2f}")
+    return ["\n".join(lines)]
+
+
+def _budgets(sources):
+    budgets = []
+    for cat in sources.categorias:
+        if cat.presupuesto is not None:
+            budget = Presupuesto(
+                usuario_id=sources.user.id,
+                categoria=cat,
+                monto_maximo=cat.presupuesto,
+                mes=sources.now.month,
+                año=sources.now.year,
             )
-        parts.append("\n".join(lines))
+            # Same annotation as Presupuesto.objects.con_gasto_actual().
+            budget.gasto_mes = cat.gastado or Decimal("0")
+            budgets.append(budget)
+    if not budgets:
+        return []
+
+    lines = ["Estado de presupuestos (mes actual):"]
+    for budget in budgets:
+        spent = budget.get_gasto_actual()
+        pct = budget.get_porcentaje_usado()
+        status = "EXCEDIDO" if budget.esta_excedido else f"{pct:.0f}%"
+        lines.append(
+            f"  - {budget.categoria.nombre}: ${spent:.2f} / ${budget.monto_maximo:.2f} ({status})"
+        )
+    return ["\n".join(lines)]
 
-    categories = Categoria.objects.filter(usuario=user).values_list("nombre", "tipo")
-    if categories:
-        income_cats = [name for name, ctype in categories if ctype == "ingreso"]
-        expense_cats = [name for name, ctype in categories if ctype == "gasto"]
-        parts.append(f"Categorías de ingreso: {', '.join(income_cats) if income_cats else 'Sin categorías'}")
-        parts.append(f"Categorías de gasto: {', '.join(expense_cats) if expense_cats else 'Sin categorías'}")
 
-    return "\n\n".join(parts)
+def _recent(sources):
+    if not sources.recientes:
+        return []
 
+    lines = ["Últimas 10 transacciones:"]
+    for tx in sources.recientes:
+        sign = "+" if tx.tipo == "ingreso" else "-"
+        categoria = tx.categoria.nombre if tx.categoria else "Sin categoría"
+        desc = f" - {tx.descripcion}" if tx.descripcion else ""
+        lines.append(
+            f"  {sign}${tx.monto:.2f} | {categoria} | {tx.fecha.strftime('%d/%m/%Y')}{desc}"
+        )
+    return ["\n".join(lines)]
+
+
+def _category_names(sources):
+    categories = sources.categorias
+    if not categories:
+        return []
+
+    income_cats = [cat.nombre for cat in categories if cat.tipo == "ingreso"]
+    expense_cats = [cat.nombre for cat in categories if cat.tipo == "gasto"]
+    return [
+        f"Categorías de ingreso: {', '.join(income_cats) if income_cats else 'Sin categorías'}",
+        f"Categorías de gasto: {', '.join(expense_cats) if expense_cats else 'Sin categorías'}",
+    ]
+
+
+# Cost of each data source. A source is loaded once however many sections
+# read it; "ledger" is free when "categorias" is loaded too.
+SOURCE_COST = {
+    "ledger": "1 query (BalanceUsuario)",
+    "categorias": "1 query (categories + month rollup + budgets + ledger)",
+    "recientes": "1 query (last 10 transactions)",
+}
+
+Section = namedtuple("Section", "name sources render")
+
+SECTIONS = (
+    Section("balance", ("ledger",), _balance),
+    Section("gastos_mes", ("categorias",), _month_spending),
+    Section("presupuestos", ("categorias",), _budgets),
+    Section("recientes", ("recientes",), _recent),
+    Section("categorias", ("categorias",), _category_names),
+)
+ALL_SECTIONS = tuple(section.name for section in SECTIONS)
+
+# Sections, and whether the semantic search is worth an embedding call, per
+# ``detect_intent`` intent. Anything else (``general``) gets everything.
+INTENT_PLANS = {
+    "balance_check": (("balance",), False),
+    "spending_query": (("balance", "gastos_mes", "presupuestos", "recientes"), True),
+    "category_query": (("gastos_mes", "categorias"), False),
+    "budget_status": (("gastos_mes", "presupuestos"), False),
+    "transaction_search": (("recientes", "categorias"), True),
+    "income_query": (("balance", "recientes"), True),
+    "transfer_query": (("balance", "recientes"), True),
+}
+
+
+def plan_for(intent):
+    """``(section names, use_rag)`` for an intent."""
+    return INTENT_PLANS.get(intent, (ALL_SECTIONS, True))
+
+
+def _set_statement_timeout(seconds):
+    value = "DEFAULT" if seconds is None else max(1, int(seconds * 1000))
+    with connection.cursor() as cursor:
+        cursor.execute(f"SET statement_timeout = {value}")
+
+
+def build_financial_context(user, sections=ALL_SECTIONS, deadline=None):
+    """
+    Render the named sections, in ``SECTIONS`` order; only their sources are queried.
+
+    With ``deadline`` (a ``time.monotonic()`` value) the whole build is bounded:
+    no section starts after it and, on PostgreSQL, each query is cancelled when
+    it runs past it. The sections left out are replaced by ``CONTEXT_UNAVAILABLE``.
+    """
+    selected = [section for section in SECTIONS if section.name in sections]
+    sources = _Sources(user, {name for section in selected for name in section.sources})
+    on_postgres = deadline is not None and connection.vendor == "postgresql"
+    parts = []
+    done = 0
+    try:
+        # The savepoint keeps a cancelled query from aborting the caller's transaction.
+        with transaction.atomic() if on_postgres else nullcontext():
+            for section in selected:
+                if deadline is not None:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        break
+                    if on_postgres:
+                        _set_statement_timeout(left)
+                parts.extend(section.render(sources))
+                done += 1
+    except OperationalError as exc:
+        logger.warning("Contexto financiero superó el plazo: %s", exc)
+    finally:
+        if on_postgres:
+            _set_statement_timeout(None)
+
+    if done < len(selected):
+        logger.warning(
+            "Contexto financiero sin las secciones: %s",
+            ",".join(section.name for section in selected[done:]),
+        )
+        parts.append(CONTEXT_UNAVAILABLE)
+    return "\n\n".join(parts)
@@ -94,27 +94,90 @@ DETAIL_MARKERS = [
 ]
 
 
+SPANISH_MARKERS = frozenset([
+    'mi', 'mis', 'el', 'la', 'los', 'las', 'de', 'en', 'que', 'qué',
+    'cuanto', 'cuánto', 'como', 'cómo', 'donde', 'dónde', 'por', 'para',
+])
+# Spanish financial keywords also count as Spanish content words
+SPANISH_CONTENT = frozenset([
+    'gasto', 'gastos', 'gaste', 'gasté', 'ingreso', 'ingresos',
+    'saldo', 'balance', 'presupuesto', 'categoría', 'categoria',
+    'transferencia', 'transaccion', 'transacción', 'salario',
+    'cuanto', 'cuánto', 'envié', 'recibí', 'buscar', 'encontrar',
+])
+ENGLISH_MARKERS = frozenset([
+    'my', 'the', 'how', 'what', 'where', 'when', 'much', 'did',
+    'spend', 'spent', 'income', 'budget', 'search', 'find',
+])
+SPANISH_WORDS = SPANISH_MARKERS | SPANISH_CONTENT
+
+
+# ── Compiled matchers ──────────────────────────────────────────────────────
+# Built once at import. Keywords and markers match at the start of a word
+# ("pago" matches "pagos" but "sent" no longer matches "presente"), and each
+# message is scanned once instead of once per keyword or pattern.
+
+INTENT_PRIORITY = {intent: rank for rank, intent in enumerate(INTENT_PATTERNS)}
+
+
+def _trie_pattern(words):
+    """
+    Regex source matching any of ``words``, factored by common prefix so the
+    engine follows one branch per character instead of trying every word.
+    Optional suffixes are greedy, so the longest word at a position wins.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            return '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+
+_KEYWORDS = sorted({kw for pattern in INTENT_PATTERNS.values() for kw in pattern['keywords']})
+KEYWORD_INTENTS = {
+    keyword: {
+        intent for intent, pattern in INTENT_PATTERNS.items() if keyword in pattern['keywords']
+    }
+    for keyword in _KEYWORDS
+}
+# A match of "how much did i spend" is also a match of "how much": each keyword
+# stands for the best-ranked intent among the keywords it starts with.
+_KEYWORD_RANK = {
+    keyword: min(
+        INTENT_PRIORITY[intent]
+        for other in _KEYWORDS
+        if keyword.startswith(other)
+        for intent in KEYWORD_INTENTS[other]
+    )
+    for keyword in _KEYWORDS
+}
+_INTENTS_BY_RANK = list(INTENT_PATTERNS)
+_KEYWORD_TRIE = _trie_pattern(_KEYWORDS)
+KEYWORD_PATTERN = re.compile(r'(?<!\w)' + _KEYWORD_TRIE)
+# Zero-width, so overlapping keywords starting at different words are all seen.
+_KEYWORD_SCAN = re.compile(r'(?<!\w)(?=(' + _KEYWORD_TRIE + '))')
+
+TIME_PATTERN = re.compile(r'(?<!\w)(?:' + '|'.join(TIME_MARKERS) + ')')
+DETAIL_PATTERN = re.compile(r'(?<!\w)(?:' + '|'.join(DETAIL_MARKERS) + ')')
+
+
 def _detect_language(message):
     """Simple language detection based on common words and Spanish content words."""
-    spanish_markers = [
-        'mi', 'mis', 'el', 'la', 'los', 'las', 'de', 'en', 'que', 'qué',
-        'cuanto', 'cuánto', 'como', 'cómo', 'donde', 'dónde', 'por', 'para',
-    ]
-    # Also detect Spanish from financial keywords in the message
-    spanish_content = [
-        'gasto', 'gastos', 'gaste', 'gasté', 'ingreso', 'ingresos',
-        'saldo', 'balance', 'presupuesto', 'categoría', 'categoria',
-        'transferencia', 'transaccion', 'transacción', 'salario',
-        'cuanto', 'cuánto', 'envié', 'recibí', 'buscar', 'encontrar',
-    ]
-    english_markers = [
-        'my', 'the', 'how', 'what', 'where', 'when', 'much', 'did',
-        'spend', 'spent', 'income', 'budget', 'search', 'find',
-    ]
-    msg_lower = message.lower()
-    words = msg_lower.split()
-    es_score = sum(1 for w in words if w in spanish_markers or w in spanish_content)
-    en_score = sum(1 for w in words if w in english_markers)
+    words = message.lower().split()
+    es_score = sum(1 for w in words if w in SPANISH_WORDS)
+    en_score = sum(1 for w in words if w in ENGLISH_MARKERS)
     if es_score > en_score:
         return 'es'
     if en_score > es_score:
@@ -125,14 +188,12 @@ def _detect_language(message):
 
 def _has_time_period(message):
     """Check if the message already contains a time period reference."""
-    msg_lower = message.lower()
-    return any(re.search(pattern, msg_lower) for pattern in TIME_MARKERS)
+    return TIME_PATTERN.search(message.lower()) is not None
 
 
 def _has_search_detail(message):
     """Check if the message contains enough detail for a search."""
-    msg_lower = message.lower()
-    return any(re.search(pattern, msg_lower) for pattern in DETAIL_MARKERS)
+    return DETAIL_PATTERN.search(message.lower()) is not None
 
 
 def detect_intent(message, last_bot_was_followup=False):
@@ -153,17 +214,9 @@ def detect_intent(message, last_bot_was_followup=False):
     msg_lower = message.lower()
     lang = _detect_language(message)
 
-    # Match against intent patterns
-    matched_intent = 'general'
-    for intent_key, pattern in INTENT_PATTERNS.items():
-        if intent_key == 'general':
-            continue
-        for keyword in pattern['keywords']:
-            if keyword in msg_lower:
-                matched_intent = intent_key
-                break
-        if matched_intent != 'general':
-            break
+    # The first intent, in INTENT_PATTERNS order, with a keyword in the message
+    ranks = [_KEYWORD_RANK[keyword] for keyword in _KEYWORD_SCAN.findall(msg_lower)]
+    matched_intent = _INTENTS_BY_RANK[min(ranks)] if ranks else 'general'
 
     pattern = INTENT_PATTERNS.get(matched_intent, INTENT_PATTERNS['general'])
     requires = pattern.get('requires', [])
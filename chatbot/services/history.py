@@ -0,0 +1,149 @@
+"""Conversation history for the LLM prompt, bounded by a token budget.
+
+The newest messages of the session go to the prompt verbatim while they fit
+``CHATBOT_HISTORY_TOKEN_BUDGET`` (and ``CHATBOT_MAX_HISTORY`` messages,
+counting the current one, which always goes). Older messages are folded,
+once and oldest first, into the session's ``ConversationSummary``, which is
+sent as a short system message and capped at ``CHATBOT_SUMMARY_TOKEN_BUDGET``.
+However long the session, the history part of the prompt stays within the sum
+of both budgets.
+
+Tokens are estimated with ``llm_service.estimate_tokens``.
+
+``page`` serves the same messages to the chat history endpoints, a bounded
+page at a time.
+"""
+
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from chatbot.models import ConversationMessage, ConversationSummary
+from chatbot.services.llm_service import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Unfolded messages read beyond the window. When even that does not reach the
+# summary (a session that predates the summaries), the oldest unfolded
+# messages are read separately and folded a batch at a time.
+FOLD_BATCH = 20
+
+# Upper bound of ``page``'s ``limit``, whatever the client asks for.
+MAX_PAGE_SIZE = 200
+
+
+def _window():
+    return settings.CHATBOT_MAX_HISTORY + 1 + FOLD_BATCH
+
+
+def load(user, session_id):
+    """
+    The newest of the session's messages not folded into its summary yet,
+    oldest first (one query). One more than the window is read so ``fit``
+    knows whether they reach back to the summary.
+    """
+    folded_until = ConversationSummary.objects.filter(
+        usuario=OuterRef("usuario"), session_id=OuterRef("session_id")
+    ).values("last_message_id")[:1]
+    recent = list(
+        ConversationMessage.objects.filter(usuario=user, session_id=session_id)
+        .alias(folded_until=Coalesce(Subquery(folded_until), Value(0)))
+        .filter(id__gt=F("folded_until"))
+        .order_by("-created_at", "-id")[: _window() + 1]
+    )
+    recent.reverse()
+    return recent
+
+
+def fit(user, session_id, recent):
+    """
+    The messages of ``recent`` that fit the budget (oldest first) and the
+    summary text, after folding the messages that did not fit into the summary
+    (up to ``FOLD_BATCH`` of the oldest ones if ``recent`` may not reach it).
+    """
+    summary = ConversationSummary.objects.filter(usuario=user, session_id=session_id).first()
+    complete = len(recent) <= _window()
+    if summary:
+        # Another request of the session may have folded some since ``load``.
+        recent = [msg for msg in recent if msg.id > summary.last_message_id]
+    budget = settings.CHATBOT_HISTORY_TOKEN_BUDGET
+    kept = []
+    used = 0
+    for msg in reversed([msg for msg in recent if msg.role in ("user", "assistant")]):
+        tokens = estimate_tokens(msg.content)
+        if kept and (used + tokens > budget or len(kept) >= settings.CHATBOT_MAX_HISTORY):
+            break
+        kept.append(msg)
+        used += tokens
+    kept.reverse()
+
+    folded = [msg for msg in recent if kept and msg.id < kept[0].id]
+    if folded and not complete:
+        # A full window may not reach back to the summary: fold the oldest first.
+        folded = list(
+            ConversationMessage.objects.filter(
+                usuario=user,
+                session_id=session_id,
+                id__gt=summary.last_message_id if summary else 0,
+                id__lt=kept[0].id,
+            ).order_by("created_at", "id")[:FOLD_BATCH]
+        )
+    if folded:
+        summary = summary or ConversationSummary(usuario=user, session_id=session_id)
+        try:
+            with transaction.atomic():
+                summary.fold(folded, settings.CHATBOT_SUMMARY_TOKEN_BUDGET)
+        except IntegrityError:
+            # A concurrent request of the same session created it; it folds next time.
+            logger.info("Resumen de sesión creado en paralelo: session=%s", session_id[:8])
+    return kept, summary.content if summary else ""
+
+
+def page_params(params):
+    """
+    ``(before, after, limit)`` from the query string of a history request.
+    Raises ``ValueError`` if they are not positive integers or both cursors are given.
+    """
+    before, after, limit = (
+        int(params[name]) if params.get(name) else None for name in ("before", "after", "limit")
+    )
+    if any(value is not None and value < 1 for value in (before, after, limit)):
+        raise ValueError("before, after y limit deben ser enteros positivos")
+    if before and after:
+        raise ValueError("before y after son excluyentes")
+    return before, after, limit
+
+
+def page(user, session_id, before=None, after=None, limit=None):
+    """
+    One page of the session's messages, oldest first, and whether there are more.
+
+    Without a cursor, the newest ``limit`` messages; with ``before`` (a message
+    id), the ones right before it, and ``has_more`` tells if older ones remain.
+    With ``after``, the ones right after it (the client's "what's new" poll),
+    and ``has_more`` tells if newer ones remain. A single range read on the
+    (usuario, session_id, created_at) index, whatever the length of the session.
+    """
+    limit = min(limit or settings.CHATBOT_HISTORY_PAGE_SIZE, MAX_PAGE_SIZE)
+    messages = ConversationMessage.objects.filter(usuario=user, session_id=session_id)
+    cursor = before or after
+    if cursor:
+        # The cursor's own timestamp, resolved inside the same query.
+        anchor = Subquery(messages.filter(id=cursor).values("created_at")[:1])
+        direction = "gt" if after else "lt"
+        messages = messages.filter(
+            Q(**{f"created_at__{direction}": anchor})
+            | Q(created_at=anchor, **{f"id__{direction}": cursor})
+        )
+
+    if after:
+        rows = list(messages.order_by("created_at", "id")[: limit + 1])
+        return rows[:limit], len(rows) > limit
+    rows = list(messages.order_by("-created_at", "-id")[: limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return rows, has_more
@@ -0,0 +1,97 @@
+"""Pooled, keep-alive HTTP sessions for the Groq and HuggingFace APIs.
+
+Every thread gets its own ``requests.Session`` (sessions keep mutable cookie
+state), but all of them mount one shared ``HTTPAdapter``, whose urllib3 pools
+are thread-safe. TCP and TLS connections are therefore reused across requests
+and threads: up to ``CHATBOT_HTTP_POOL_MAXSIZE`` per host, for up to
+``CHATBOT_HTTP_POOL_CONNECTIONS`` hosts.
+
+``http.requests`` and ``http.connections_opened`` count requests and new
+connections; ``http.connection_reuse_ratio`` is the share of requests that
+reused a connection.
+"""
+
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from config.metrics import counter, gauge
+
+requests_sent = counter("http.requests")
+connections_opened = counter("http.connections_opened")
+
+
+def _reuse_ratio():
+    sent = requests_sent.value()
+    return round(1 - connections_opened.value() / sent, 3) if sent else None
+
+
+gauge("http.connection_reuse_ratio", _reuse_ratio)
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        connections_opened.incr()
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        connections_opened.incr()
+        return super()._new_conn()
+
+
+class PooledAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        requests_sent.incr()
+        return super().send(request, **kwargs)
+
+
+_adapter = None
+_adapter_lock = threading.Lock()
+_local = threading.local()
+
+
+def _get_adapter():
+    global _adapter
+    with _adapter_lock:
+        if _adapter is None:
+            # pool_block: the per-host limit is a real cap; extra threads wait
+            # for a free connection instead of opening throwaway ones.
+            _adapter = PooledAdapter(
+                pool_connections=settings.CHATBOT_HTTP_POOL_CONNECTIONS,
+                pool_maxsize=settings.CHATBOT_HTTP_POOL_MAXSIZE,
+                pool_block=True,
+            )
+        return _adapter
+
+
+def get_session():
+    """This thread's session; its connections come from the shared pool."""
+    adapter = _get_adapter()
+    session = getattr(_local, "session", None)
+    if session is None or session.get_adapter("https://") is not adapter:
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _local.session = session
+    return session
+
+
+def reset():
+    """Close every pooled connection; sessions pick up a fresh pool on next use."""
+    global _adapter
+    with _adapter_lock:
+        if _adapter is not None:
+            _adapter.close()
+        _adapter = None
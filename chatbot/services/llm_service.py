@@ -1,9 +1,12 @@
+import json
 import logging
 import time
 
 import requests
 from django.conf import settings
 
+from chatbot.services.http_client import get_session
+
 logger = logging.getLogger(__name__)
 
 GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
@@ -11,6 +14,11 @@ MAX_RETRIES = 2
 RETRY_DELAY = 1.5  # seconds
 
 
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token) for accounting, not for limits."""
+    return max(1, len(text) // 4) if text else 0
+
+
 def call_groq(messages, temperature=0.3, max_tokens=None):
     """
     Call the Groq API with assembled messages.
@@ -30,7 +38,7 @@ def call_groq(messages, temperature=0.3, max_tokens=None):
     last_error = None
     for attempt in range(1, MAX_RETRIES + 1):
         try:
-            response = requests.post(
+            response = get_session().post(
                 GROQ_API_URL,
                 json={
                     "model": model,
@@ -71,3 +79,64 @@ def call_groq(messages, temperature=0.3, max_tokens=None):
 
     logger.error("Groq API failed after %d attempts. Last error: %s", MAX_RETRIES, last_error)
     return None
+
+
+def stream_groq(messages, temperature=0.3, max_tokens=None):
+    """
+    Stream the completion from Groq, yielding text deltas as they arrive.
+
+    Connection failures are retried like ``call_groq`` only until the first
+    delta; a failure after that ends the stream early. Yields nothing at all
+    if no completion could be obtained. Closing the generator closes the
+    upstream response, which stops the generation.
+    """
+    if not settings.GROQ_API_KEY:
+        logger.error("GROQ_API_KEY is not configured")
+        return
+
+    max_tokens = max_tokens or settings.CHATBOT_MAX_TOKENS
+    model = settings.GROQ_MODEL
+    logger.info("Streaming Groq API with model=%s, max_tokens=%d", model, max_tokens)
+
+    for attempt in range(1, MAX_RETRIES + 1):
+        streamed = False
+        try:
+            with get_session().post(
+                GROQ_API_URL,
+                json={
+                    "model": model,
+                    "messages": messages,
+                    "temperature": temperature,
+                    "max_tokens": max_tokens,
+                    "stream": True,
+                },
+                headers={
+                    "Authorization": f"Bearer {settings.GROQ_API_KEY}",
+                    "Content-Type": "application/json",
+                },
+                timeout=30,
+                stream=True,
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        return
+                    delta = json.loads(data)["choices"][0]["delta"].get("content")
+                    if delta:
+                        streamed = True
+                        yield delta
+            return
+        except requests.exceptions.RequestException as e:
+            if streamed:
+                logger.error("Groq stream interrupted: %s", e)
+                return
+            logger.warning("Groq stream error on attempt %d/%d: %s", attempt, MAX_RETRIES, e)
+        except (KeyError, IndexError, ValueError) as e:
+            logger.error("Unexpected Groq stream format: %s", e)
+            return
+
+        if attempt < MAX_RETRIES:
+            time.sleep(RETRY_DELAY)
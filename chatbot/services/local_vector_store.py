@@ -0,0 +1,278 @@
+"""In-process vector index used when Qdrant is not configured.
+
+Each user's vectors live in one structured ``.npy`` file (transaction id plus
+the L2-normalized float32 vector) that is memory-mapped on load, so startup
+only touches the pages a search actually reads. Search is an exact cosine
+top-k: one matrix-vector product and an ``argpartition``.
+
+Writes are staged in memory and applied by ``flush()`` under a per-user file
+lock: the file is re-read if another process changed it, the staged upserts
+and deletes are replayed on top and the result is atomically replaced. Readers
+notice the new file by its mtime and inode and re-map it. If a write fails, the
+operations not applied yet stay staged for the next flush.
+
+Deletes only get transaction ids, so the store keeps a transaction id -> user
+index of the files it has read; only files changed since they were indexed are
+read again, and only when an id is not in it.
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from chatbot.services.qdrant_service import EMBEDDING_DIM, build_payload
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only.
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+RECORD = np.dtype([("id", "<i8"), ("vector", "<f4", (EMBEDDING_DIM,))])
+
+Hit = namedtuple("Hit", "id score payload")
+_UserIndex = namedtuple("_UserIndex", "version records payloads")
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class LocalVectorStore:
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._indexes = {}
+        self._owner_of = {}
+        self._indexed_versions = {}
+        self._staged = {}
+        self._deferred = 0
+        self._lock = threading.RLock()
+
+    # ── files ──
+
+    def _vectors_path(self, user_id):
+        return self.directory / f"user_{user_id}.npy"
+
+    def _payloads_path(self, user_id):
+        return self.directory / f"user_{user_id}.payloads.json"
+
+    @contextmanager
+    def _file_lock(self, user_id):
+        if fcntl is None:
+            yield
+            return
+        with open(self.directory / f"user_{user_id}.lock", "a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _load(self, user_id):
+        """Current index for the user, re-mapped if the file changed on disk."""
+        path = self._vectors_path(user_id)
+        try:
+            version = self._file_version(path)
+        except FileNotFoundError:
+            self._indexes.pop(user_id, None)
+            return None
+
+        index = self._indexes.get(user_id)
+        if index is None or index.version != version:
+            try:
+                payloads = json.loads(self._payloads_path(user_id).read_text())
+            except FileNotFoundError:
+                payloads = {}
+            try:
+                records = np.load(path, mmap_mode="r")
+            except ValueError:  # an empty array cannot be mapped
+                records = np.load(path)
+            index = _UserIndex(version, records, payloads)
+            self._indexes[user_id] = index
+            self._index_owners(user_id, version, records["id"].tolist())
+        return index
+
+    def _index_owners(self, user_id, version, transaction_ids):
+        self._owner_of.update(dict.fromkeys(transaction_ids, user_id))
+        self._indexed_versions[user_id] = version
+
+    def _file_version(self, path):
+        stat = path.stat()
+        # os.replace gives the new file a new inode even within one mtime tick.
+        return (stat.st_mtime_ns, stat.st_ino)
+
+    def _save(self, user_id, records, payloads):
+        # Payloads first: a reader may briefly see extra payloads, never missing ones.
+        for path, write in (
+            (self._payloads_path(user_id), lambda f: f.write(json.dumps(payloads).encode())),
+            (self._vectors_path(user_id), lambda f: np.save(f, records, allow_pickle=False)),
+        ):
+            tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            with open(tmp, "wb") as handle:
+                write(handle)
+            os.replace(tmp, path)
+
+    def _owners(self, transaction_ids):
+        """``{user_id: ids}`` for the ``transaction_ids`` stored (or staged) in some user file."""
+        missing = [tid for tid in transaction_ids if tid not in self._owner_of]
+        if missing:
+            # Files written since they were indexed (e.g. by another process).
+            for path in self.directory.glob("user_*.npy"):
+                user_id = int(path.stem.split("_", 1)[1])
+                try:
+                    if self._indexed_versions.get(user_id) != self._file_version(path):
+                        self._load(user_id)
+                except FileNotFoundError:
+                    continue
+        owners = {}
+        for transaction_id in transaction_ids:
+            user_id = self._owner_of.get(transaction_id)
+            if user_id is not None:
+                owners.setdefault(user_id, set()).add(transaction_id)
+        return owners
+
+    def _stage(self, user_id):
+        return self._staged.setdefault(user_id, {"upserts": {}, "deletes": set()})
+
+    # ── vector-store interface ──
+
+    def ensure_collection(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return True
+
+    def upsert_transactions(self, pairs, ensure=True):
+        if not pairs:
+            return False
+        with self._lock:
+            for transaction, embedding in pairs:
+                staged = self._stage(transaction.usuario_id)
+                staged["upserts"][transaction.id] = (
+                    _normalize(embedding), build_payload(transaction)
+                )
+                staged["deletes"].discard(transaction.id)
+                self._owner_of[transaction.id] = transaction.usuario_id
+        return self._maybe_flush()
+
+    def upsert_transaction(self, transaction, embedding):
+        return self.upsert_transactions([(transaction, embedding)])
+
+    def delete_points(self, transaction_ids):
+        if not transaction_ids:
+            return False
+        self.ensure_collection()
+        with self._lock:
+            for user_id, ids in self._owners(transaction_ids).items():
+                staged = self._stage(user_id)
+                staged["deletes"].update(ids)
+                for transaction_id in ids:
+                    staged["upserts"].pop(transaction_id, None)
+        return self._maybe_flush()
+
+    def delete_point(self, transaction_id):
+        return self.delete_points([transaction_id])
+
+    def search_similar(self, query_embedding, user_id, limit=5):
+        index = self._load(user_id)
+        if index is None or not len(index.records):
+            return []
+
+        scores = index.records["vector"] @ _normalize(query_embedding)
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        ids = index.records["id"]
+        return [
+            Hit(int(ids[i]), float(scores[i]), index.payloads.get(str(int(ids[i])), {}))
+            for i in top
+        ]
+
+    # ── batching ──
+
+    @contextmanager
+    def deferred(self):
+        """Stage writes until the block exits (or ``flush()``), e.g. for bulk indexing."""
+        with self._lock:
+            self._deferred += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._deferred -= 1
+            self._maybe_flush()
+
+    def _maybe_flush(self):
+        if self._deferred:
+            return True
+        return self.flush()
+
+    def flush(self):
+        with self._lock:
+            staged, self._staged = self._staged, {}
+        if not staged:
+            return True
+
+        self.ensure_collection()
+        pending = dict(staged)
+        try:
+            for user_id, ops in staged.items():
+                with self._file_lock(user_id):
+                    self._apply(user_id, ops)
+                del pending[user_id]
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write local vector index: {e}")
+            with self._lock:
+                self._restage(pending)
+            return False
+
+    def _restage(self, pending):
+        """Put back operations a failed flush did not apply, under any staged since."""
+        for user_id, ops in pending.items():
+            newer = self._staged.get(user_id)
+            if newer is None:
+                self._staged[user_id] = ops
+                continue
+            upserts = {
+                transaction_id: value
+                for transaction_id, value in ops["upserts"].items()
+                if transaction_id not in newer["deletes"]
+            }
+            upserts.update(newer["upserts"])
+            self._staged[user_id] = {
+                "upserts": upserts,
+                "deletes": (ops["deletes"] - newer["upserts"].keys()) | newer["deletes"],
+            }
+
+    def _apply(self, user_id, ops):
+        index = self._load(user_id)
+        if index is None:
+            records, payloads = np.empty(0, dtype=RECORD), {}
+        else:
+            records, payloads = index.records, dict(index.payloads)
+
+        replaced = np.fromiter(ops["deletes"] | ops["upserts"].keys(), dtype=np.int64)
+        kept = records[~np.isin(records["id"], replaced)]
+        added = np.empty(len(ops["upserts"]), dtype=RECORD)
+        for row, (transaction_id, (vector, payload)) in enumerate(ops["upserts"].items()):
+            added[row] = (transaction_id, vector)
+            payloads[str(transaction_id)] = payload
+        for transaction_id in ops["deletes"]:
+            payloads.pop(str(transaction_id), None)
+
+        self._save(user_id, np.concatenate([kept, added]), payloads)
+        self._indexes.pop(user_id, None)
+        # Still under the file lock: the new file holds exactly these ids.
+        for transaction_id in ops["deletes"]:
+            self._owner_of.pop(transaction_id, None)
+        self._index_owners(
+            user_id, self._file_version(self._vectors_path(user_id)), ops["upserts"].keys()
+        )
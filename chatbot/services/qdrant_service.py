@@ -1,4 +1,5 @@
 import logging
+import threading
 
 from django.conf import settings
 
@@ -7,7 +8,18 @@ logger = logging.getLogger(__name__)
 COLLECTION_NAME = "financial_data"
 EMBEDDING_DIM = 384
 
+# Payload fields filtered on, with their Qdrant index type: ``user_id`` on
+# every search, the rest for filtered queries by type, category or date range.
+PAYLOAD_INDEXES = {
+    "user_id": "INTEGER",
+    "tipo": "KEYWORD",
+    "categoria": "KEYWORD",
+    "fecha": "DATETIME",
+}
+
 _client = None
+_collection_ready = False
+_collection_lock = threading.Lock()
 
 
 def get_client():
@@ -33,31 +45,89 @@ def get_client():
         return None
 
 
+def create_payload_indexes(client, collection_name, existing=()):
+    """Index the payload fields used in filters; fields in ``existing`` are skipped."""
+    from qdrant_client.models import PayloadSchemaType
+
+    for field, schema in PAYLOAD_INDEXES.items():
+        if field not in existing:
+            client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field,
+                field_schema=getattr(PayloadSchemaType, schema),
+                wait=True,
+            )
+            logger.info(f"Created Qdrant payload index: {collection_name}.{field}")
+
+
 def ensure_collection():
-    """Create the collection if it doesn't exist."""
+    """
+    Create the collection and its payload indexes if missing.
+
+    The result is remembered for the life of the process; a failed Qdrant call
+    resets it (see ``_invalidate``) so the next call checks again.
+    """
+    global _collection_ready
+    if _collection_ready:
+        return True
+
     client = get_client()
     if client is None:
         return False
 
-    try:
-        from qdrant_client.models import Distance, VectorParams
-
-        collections = client.get_collections().collections
-        existing = [c.name for c in collections]
-
-        if COLLECTION_NAME not in existing:
-            client.create_collection(
-                collection_name=COLLECTION_NAME,
-                vectors_config=VectorParams(
-                    size=EMBEDDING_DIM,
-                    distance=Distance.COSINE,
-                ),
-            )
-            logger.info(f"Created Qdrant collection: {COLLECTION_NAME}")
-        return True
-    except Exception as e:
-        logger.error(f"Failed to ensure Qdrant collection: {e}")
-        return False
+    with _collection_lock:
+        if _collection_ready:
+            return True
+        try:
+            from qdrant_client.models import Distance, VectorParams
+
+            collections = client.get_collections().collections
+            existing = [c.name for c in collections]
+
+            if COLLECTION_NAME not in existing:
+                client.create_collection(
+                    collection_name=COLLECTION_NAME,
+                    vectors_config=VectorParams(
+                        size=EMBEDDING_DIM,
+                        distance=Distance.COSINE,
+                    ),
+                )
+                logger.info(f"Created Qdrant collection: {COLLECTION_NAME}")
+                indexed = {}
+            else:
+                indexed = client.get_collection(COLLECTION_NAME).payload_schema or {}
+            create_payload_indexes(client, COLLECTION_NAME, existing=indexed)
+            _collection_ready = True
+            return True
+        except Exception as e:
+            logger.error(f"Failed to ensure Qdrant collection: {e}")
+            return False
+
+
+def _invalidate():
+    """Forget the bootstrap result, e.g. after the collection was dropped."""
+    global _collection_ready
+    _collection_ready = False
+
+
+def build_payload(transaction):
+    """Payload stored with each vector (shared with the local vector store)."""
+    return {
+        "user_id": transaction.usuario_id,
+        "tipo": transaction.tipo,
+        "monto": float(transaction.monto),
+        "categoria": (
+            transaction.categoria.nombre if transaction.categoria else None
+        ),
+        "descripcion": transaction.descripcion or "",
+        "fecha": transaction.fecha.isoformat(),
+    }
+
+
+def _build_point(transaction, embedding):
+    from qdrant_client.models import PointStruct
+
+    return PointStruct(id=transaction.id, vector=embedding, payload=build_payload(transaction))
 
 
 def upsert_transaction(transaction, embedding):
@@ -67,31 +137,40 @@ def upsert_transaction(transaction, embedding):
         return False
 
     try:
-        from qdrant_client.models import PointStruct
-
         ensure_collection()
-
-        point = PointStruct(
-            id=transaction.id,
-            vector=embedding,
-            payload={
-                "user_id": transaction.usuario_id,
-                "tipo": transaction.tipo,
-                "monto": float(transaction.monto),
-                "categoria": (
-                    transaction.categoria.nombre if transaction.categoria else None
-                ),
-                "descripcion": transaction.descripcion or "",
-                "fecha": transaction.fecha.isoformat(),
-            },
+        client.upsert(
+            collection_name=COLLECTION_NAME, points=[_build_point(transaction, embedding)]
         )
-        client.upsert(collection_name=COLLECTION_NAME, points=[point])
         return True
     except Exception as e:
+        _invalidate()
         logger.error(f"Failed to upsert transaction {transaction.id}: {e}")
         return False
 
 
+def upsert_transactions(pairs, ensure=True):
+    """
+    Insert or update several ``(transaction, embedding)`` pairs in one request.
+    Pass ``ensure=False`` when the caller already ensured the collection.
+    """
+    client = get_client()
+    if client is None or not pairs:
+        return False
+
+    try:
+        if ensure:
+            ensure_collection()
+        client.upsert(
+            collection_name=COLLECTION_NAME,
+            points=[_build_point(transaction, embedding) for transaction, embedding in pairs],
+        )
+        return True
+    except Exception as e:
+        _invalidate()
+        logger.error(f"Failed to upsert {len(pairs)} transactions: {e}")
+        return False
+
+
 def delete_point(transaction_id):
     """Remove a transaction vector from Qdrant."""
     client = get_client()
@@ -109,6 +188,23 @@ def delete_point(transaction_id):
         return False
 
 
+def delete_points(transaction_ids):
+    """Remove several transaction vectors from Qdrant in one request."""
+    client = get_client()
+    if client is None or not transaction_ids:
+        return False
+
+    try:
+        client.delete(
+            collection_name=COLLECTION_NAME,
+            points_selector=list(transaction_ids),
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Failed to delete {len(transaction_ids)} points: {e}")
+        return False
+
+
 def search_similar(query_embedding, user_id, limit=5):
     """Semantic search for similar transactions, filtered by user."""
     client = get_client()
@@ -116,7 +212,7 @@ def search_similar(query_embedding, user_id, limit=5):
         return []
 
     try:
-        from qdrant_client.models import Filter, FieldCondition, MatchValue
+        from qdrant_client.models import FieldCondition, Filter, MatchValue
 
         ensure_collection()
 
@@ -135,5 +231,6 @@ def search_similar(query_embedding, user_id, limit=5):
         )
         return results
     except Exception as e:
+        _invalidate()
         logger.error(f"Qdrant search failed: {e}")
         return []
@@ -1,22 +1,48 @@
 ﻿import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
 
 from django.conf import settings
+from django.db import close_old_connections
 
 from chatbot.models import ConversationMessage
-from chatbot.prompts import FINANCIAL_ASSISTANT_PROMPT
+from chatbot.prompts import FINANCIAL_ASSISTANT_PROMPT, HISTORY_SUMMARY, RAG_SECTION
+from chatbot.services import fast_path, history, response_cache
 from chatbot.services.embedding_service import get_embedding
-from chatbot.services.financial_context import build_financial_context
+from chatbot.services.financial_context import build_financial_context, plan_for
 from chatbot.services.followup_detector import detect_intent
-from chatbot.services.llm_service import call_groq
-from chatbot.services.qdrant_service import search_similar
+from chatbot.services.llm_service import call_groq, estimate_tokens
+from chatbot.services.vector_store import search_similar
+from config.metrics import counter, gauge
 
 logger = logging.getLogger(__name__)
 
+# Fast-path and LLM answers are counted apart; the *.ms counters sum the
+# answer times, so the mean_ms gauges give the average latency of each route.
+fast_path_answers = counter("chat.fast_path.answers")
+fast_path_ms = counter("chat.fast_path.ms")
+fast_path_fallbacks = counter("chat.fast_path.fallbacks")
+llm_answers = counter("chat.llm.answers")
+llm_ms = counter("chat.llm.ms")
+prompt_requests = counter("chat.prompt.requests")
+prompt_tokens = counter("chat.prompt.tokens")
+
+
+def _mean(total, count):
+    count = count.value()
+    return round(total.value() / count) if count else None
+
+
+gauge("chat.fast_path.mean_ms", lambda: _mean(fast_path_ms, fast_path_answers))
+gauge("chat.llm.mean_ms", lambda: _mean(llm_ms, llm_answers))
+gauge("chat.prompt.mean_tokens", lambda: _mean(prompt_tokens, prompt_requests))
+
 
 def _format_rag_results(results):
     if not results:
-        return "No se encontraron transacciones relevantes."
+        return NO_RAG_RESULTS
 
     lines = []
     for hit in results:
@@ -34,15 +60,185 @@ def _format_rag_results(results):
     return "\n".join(lines)
 
 
-def process_message(user, message, session_id):
-    start = time.monotonic()
+NO_RAG_RESULTS = "No se encontraron transacciones relevantes."
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.CHATBOT_RAG_WORKERS, thread_name_prefix="rag"
+            )
+        return _executor
+
+
+def _ms_since(started):
+    return round((time.monotonic() - started) * 1000)
+
+
+def _embed(message):
+    try:
+        return get_embedding(message)
+    finally:
+        # The embedding cache lookup opened this thread's own connection.
+        close_old_connections()
+
+
+class _Embedding:
+    """
+    The message's embedding, requested at most once and computed in the RAG
+    pool: the response cache and the semantic search share it.
+    """
+
+    def __init__(self, message):
+        self.message = message
+        self._future = None
+
+    def start(self):
+        """The future of the embedding, submitting it on the first call."""
+        if self._future is None:
+            self._future = _get_executor().submit(_embed, self.message)
+        return self._future
+
+    def wait(self):
+        """The vector, or None if it fails or misses ``CHATBOT_RAG_DEADLINE_SECONDS``."""
+        try:
+            return self.start().result(timeout=settings.CHATBOT_RAG_DEADLINE_SECONDS)
+        except FutureTimeout:
+            logger.warning("Embedding superó %.1fs", settings.CHATBOT_RAG_DEADLINE_SECONDS)
+        except Exception as exc:
+            logger.error("Embedding falló: %s", exc)
+        return None
+
+    def peek(self):
+        """The vector if it is already computed, else None; never waits."""
+        future = self._future
+        if future is None or not future.done() or future.exception() is not None:
+            return None
+        return future.result()
+
+
+def _search_rag(embedding_future, user_id, timings):
+    """Vector search; runs in the RAG pool, off the request thread."""
+    started = time.monotonic()
+    # Submitted before this task, so a pool worker already has it.
+    embedding = embedding_future.result()
+    timings["embedding"] = _ms_since(started)
+    if not embedding:
+        return NO_RAG_RESULTS
+
+    started = time.monotonic()
+    results = search_similar(embedding, user_id, limit=5)
+    timings["busqueda"] = _ms_since(started)
+    return _format_rag_results(results)
+
+
+def _build_context(user, sections, timings):
+    """The sections that fit ``CHATBOT_CONTEXT_DEADLINE_SECONDS``, placeholders for the rest."""
+    started = time.monotonic()
+    try:
+        return build_financial_context(
+            user, sections, deadline=started + settings.CHATBOT_CONTEXT_DEADLINE_SECONDS
+        )
+    finally:
+        timings["contexto"] = _ms_since(started)
+
+
+def _gather_context(user, embedding, session_id, intent):
+    """
+    Build the context sections the intent needs (on this thread: they need the
+    request's DB connection) while, if the intent uses it, the RAG pool embeds
+    the message (``embedding``, an ``_Embedding``) and searches the vector
+    store. Each stage has its own deadline; a stage that misses it is replaced
+    by a placeholder instead of delaying the answer.
+
+    Returns ``(financial_context, rag_text)``; ``rag_text`` is None when the
+    intent skips the semantic search.
+    """
+    sections, use_rag = plan_for(intent)
+    timings = {}
+    started = time.monotonic()
+    rag_future = None
+    if use_rag:
+        rag_future = _get_executor().submit(_search_rag, embedding.start(), user.id, timings)
+        rag_submitted = time.monotonic()
+
+    financial_context = _build_context(user, sections, timings)
+
+    rag_text = None
+    try:
+        if rag_future is not None:
+            remaining = settings.CHATBOT_RAG_DEADLINE_SECONDS - (time.monotonic() - rag_submitted)
+            rag_text = rag_future.result(timeout=max(0, remaining))
+    except FutureTimeout:
+        logger.warning(
+            "Búsqueda RAG superó %.1fs: session=%s",
+            settings.CHATBOT_RAG_DEADLINE_SECONDS,
+            session_id[:8],
+        )
+        rag_text = NO_RAG_RESULTS
+    except Exception as exc:
+        logger.error("Búsqueda RAG falló: %s", exc)
+        rag_text = NO_RAG_RESULTS
+
+    timings["total"] = _ms_since(started)
     logger.info(
-        "Pipeline inicio: user=%s session=%s msg_len=%d",
-        user.username,
+        "Pipeline etapas: session=%s intent=%s secciones=%s rag=%s %s",
         session_id[:8],
-        len(message),
+        intent,
+        ",".join(sections),
+        "sí" if use_rag else "no",
+        " ".join(f"{stage}={ms}ms" for stage, ms in dict(timings).items()),
     )
+    return financial_context, rag_text
+
+
+ERROR_RESPONSE = (
+    "Lo siento, hubo un problema al procesar tu consulta. "
+    "Por favor, intenta de nuevo en unos momentos."
+)
+
+
+def _try_fast_path(user, message, intent, session_id, started):
+    """Answer exactly from SQL aggregates when possible; returns the stored result or None."""
+    if not settings.CHATBOT_FAST_PATH or intent not in fast_path.INTENTS:
+        return None
+    try:
+        text = fast_path.answer(user, message, intent)
+    except Exception as exc:
+        logger.error("Fast path falló: %s", exc)
+        text = None
+    if text is None:
+        fast_path_fallbacks.incr()
+        return None
+
+    result = save_response(user, session_id, text)
+    elapsed = _ms_since(started)
+    fast_path_answers.incr()
+    fast_path_ms.incr(elapsed)
+    logger.info("Fast path: intent=%s session=%s elapsed=%sms", intent, session_id[:8], elapsed)
+    return result
+
 
+def record_llm_answer(seconds):
+    llm_answers.incr()
+    llm_ms.incr(round(seconds * 1000))
+
+
+def prepare_message(user, message, session_id):
+    """
+    Store the user's message and build what the LLM needs to answer it.
+
+    Returns ``(result, None, None)`` when the answer is a follow-up question,
+    an exact fast-path answer or a cached earlier answer (already stored, no
+    LLM call needed), or ``(None, llm_messages, ticket)`` otherwise; hand the
+    ticket and the answer to ``response_cache.store`` so it can be reused.
+    """
+    started = time.monotonic()
     ConversationMessage.objects.create(
         usuario=user,
         session_id=session_id,
@@ -50,17 +246,16 @@ def process_message(user, message, session_id):
         content=message,
     )
 
-    max_history = settings.CHATBOT_MAX_HISTORY
-    history = list(
-        ConversationMessage.objects.filter(usuario=user, session_id=session_id)
-        .order_by("-created_at")[: max_history + 1]
-    )
-    history.reverse()
+    recent = history.load(user, session_id)
 
     last_bot_was_followup = False
-    for msg in reversed(history[:-1]):
-        if msg.role == "assistant":
-            last_bot_was_followup = msg.is_followup_question
+    asked = None
+    earlier = recent[:-1]
+    for index in range(len(earlier) - 1, -1, -1):
+        if earlier[index].role == "assistant":
+            last_bot_was_followup = earlier[index].is_followup_question
+            if last_bot_was_followup and index and earlier[index - 1].role == "user":
+                asked = earlier[index - 1].content
             break
 
     intent, needs_followup, followup_msg, followup_options = detect_intent(
@@ -82,33 +277,66 @@ def process_message(user, message, session_id):
             "is_followup": True,
             "followup_options": followup_options,
             "session_id": session_id,
-        }
+        }, None, None
+
+    # An answer to a follow-up ("Este mes") completes the question that prompted it.
+    question = f"{asked} {message}" if asked else message
+    fast_intent = detect_intent(question)[0] if asked else intent
+    result = _try_fast_path(user, question, fast_intent, session_id, started)
+    if result is not None:
+        return result, None, None
 
-    financial_context = build_financial_context(user)
+    # Only standalone questions: the answer to a follow-up depends on the conversation.
+    embedding = _Embedding(message)
+    ticket = None
+    if (
+        settings.CHATBOT_RESPONSE_CACHE
+        and settings.SHARED_CACHE
+        and intent != "general"
+        and not last_bot_was_followup
+    ):
+        cached, ticket = response_cache.lookup(user, message, intent, embedding)
+        if cached is not None:
+            return save_response(user, session_id, cached), None, None
 
-    rag_text = "No se encontraron transacciones relevantes."
-    embedding = get_embedding(message)
-    if embedding:
-        results = search_similar(embedding, user.id, limit=5)
-        rag_text = _format_rag_results(results)
+    financial_context, rag_text = _gather_context(user, embedding, session_id, intent)
 
     system_prompt = FINANCIAL_ASSISTANT_PROMPT.format(
         financial_context=financial_context,
-        rag_results=rag_text,
+        rag_section="" if rag_text is None else RAG_SECTION.format(rag_results=rag_text),
     )
 
+    turns, summary_text = history.fit(user, session_id, recent)
+    if len(turns) > 1 or summary_text:
+        # The answer may lean on earlier turns; a later lookup would not have them.
+        ticket = None
     llm_messages = [{"role": "system", "content": system_prompt}]
-    for msg in history:
-        if msg.role in ("user", "assistant"):
-            llm_messages.append({"role": msg.role, "content": msg.content})
-
-    response_text = call_groq(llm_messages)
-    if response_text is None:
-        response_text = (
-            "Lo siento, hubo un problema al procesar tu consulta. "
-            "Por favor, intenta de nuevo en unos momentos."
+    if summary_text:
+        llm_messages.append(
+            {"role": "system", "content": HISTORY_SUMMARY.format(summary=summary_text)}
         )
+    llm_messages += [{"role": msg.role, "content": msg.content} for msg in turns]
+    _report_prompt(llm_messages, bool(summary_text), len(turns), session_id)
+    return None, llm_messages, ticket
+
 
+def _report_prompt(llm_messages, with_summary, turns, session_id):
+    sizes = [estimate_tokens(msg["content"]) for msg in llm_messages]
+    summary = sizes[1] if with_summary else 0
+    prompt_requests.incr()
+    prompt_tokens.incr(sum(sizes))
+    logger.info(
+        "Prompt: session=%s tokens=%d sistema=%d resumen=%d historial=%d mensajes=%d",
+        session_id[:8],
+        sum(sizes),
+        sizes[0],
+        summary,
+        sum(sizes) - sizes[0] - summary,
+        turns,
+    )
+
+
+def save_response(user, session_id, response_text):
     ConversationMessage.objects.create(
         usuario=user,
         session_id=session_id,
@@ -116,8 +344,35 @@ def process_message(user, message, session_id):
         content=response_text,
         is_followup_question=False,
     )
+    return {
+        "response": response_text,
+        "is_followup": False,
+        "followup_options": None,
+        "session_id": session_id,
+    }
+
 
+def process_message(user, message, session_id):
+    start = time.monotonic()
+    logger.info(
+        "Pipeline inicio: user=%s session=%s msg_len=%d",
+        user.username,
+        session_id[:8],
+        len(message),
+    )
+
+    result, llm_messages, ticket = prepare_message(user, message, session_id)
+    if result is not None:
+        return result
+
+    response_text = call_groq(llm_messages)
     elapsed = time.monotonic() - start
+    if response_text is None:
+        response_text = ERROR_RESPONSE
+    else:
+        response_cache.store(ticket, llm_messages, response_text, elapsed)
+    result = save_response(user, session_id, response_text)
+    record_llm_answer(elapsed)
     logger.info(
         "Pipeline fin: user=%s session=%s elapsed=%.2fs chars_resp=%d",
         user.username,
@@ -125,11 +380,4 @@ def process_message(user, message, session_id):
         elapsed,
         len(response_text),
     )
-
-    return {
-        "response": response_text,
-        "is_followup": False,
-        "followup_options": None,
-        "session_id": session_id,
-    }
-
+    return result
@@ -0,0 +1,166 @@
+"""Reuse of earlier LLM answers to the same question from the same user.
+
+Entries live in the default cache under a key that includes the user's
+financial data version (``finanzas.cache.obtener_version``) and the local
+date, so any write to the user's transactions, categories, budgets or
+transfers, and the turn of the day ("este mes" changes meaning), make every
+earlier answer unreachable without deleting anything.
+
+A lookup first tries an exact match on the normalized question, which needs
+no embedding. Only if there are earlier questions of the same intent,
+language, period and category (read with the fast path's ``parse_period`` and
+``_category``) is the question embedded, in the RAG pool and within
+``CHATBOT_RAG_DEADLINE_SECONDS``, and the best one is reused if its cosine
+similarity reaches ``CHATBOT_RESPONSE_CACHE_SIMILARITY``. The semantic search
+of the same request reuses that embedding, and an answer is stored with
+whatever embedding the request computed (none: exact matches only).
+"¿Por qué gasté tanto en comida?" and "... en transporte?" embed almost alike
+but never share an answer; a question with an ambiguous period or several
+categories is only reused on an exact match.
+
+Versions are only bumped in the cache of the worker that saw the write, so
+the caller only uses this module with a shared cache (``SHARED_CACHE``).
+
+``chat.response_cache.*`` counts exact and semantic hits, misses, and the
+LLM tokens (estimated) and milliseconds the hits saved.
+"""
+
+import hashlib
+import logging
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from chatbot.services import fast_path
+from chatbot.services.embedding_cache import normalize
+from chatbot.services.followup_detector import _detect_language
+from chatbot.services.llm_service import estimate_tokens
+from config.metrics import counter, gauge
+from finanzas.cache import obtener_version
+
+logger = logging.getLogger(__name__)
+
+exact_hits = counter("chat.response_cache.exact_hits")
+semantic_hits = counter("chat.response_cache.semantic_hits")
+misses = counter("chat.response_cache.misses")
+saved_tokens = counter("chat.response_cache.saved_tokens")
+saved_ms = counter("chat.response_cache.saved_ms")
+
+
+def _hit_rate():
+    hits = exact_hits.value() + semantic_hits.value()
+    total = hits + misses.value()
+    return round(hits / total, 3) if total else None
+
+
+gauge("chat.response_cache.hit_rate", _hit_rate)
+
+# What a miss hands to ``store`` once the answer is ready. ``cache_key`` is
+# fixed at lookup time: an answer built while the data changed is stored
+# under the old version and never served.
+Ticket = namedtuple("Ticket", "cache_key question intent lang entities embedding")
+
+
+def _question_key(message):
+    return hashlib.sha256(normalize(message).encode()).hexdigest()
+
+
+def _entities(user, message, intent):
+    """``((start, end) or None, category id or None)`` named in ``message``; None if ambiguous."""
+    period, text = fast_path.parse_period(message.lower())
+    if period is fast_path._UNPARSED:
+        return None
+    tipo = "ingreso" if intent == "income_query" else "gasto"
+    categoria, _ = fast_path._category(user, text, tipo)
+    if categoria is fast_path._UNPARSED:
+        return None
+    dates = None if period is None else (period.start, period.end)
+    return dates, categoria and categoria.id
+
+
+def _similarity(a, b):
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    norms = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(a @ b) / norms if norms else 0.0
+
+
+def _hit(entry, hits):
+    hits.incr()
+    saved_tokens.incr(entry["tokens"])
+    saved_ms.incr(entry["ms"])
+    return entry["answer"]
+
+
+def lookup(user, message, intent, embedding):
+    """
+    ``(answer, None)`` on a hit, ``(None, ticket)`` on a miss (``ticket`` goes
+    to ``store``). ``embedding`` is the request's ``rag_pipeline._Embedding``.
+    """
+    cache_key = (
+        f"chatbot:answers:{user.id}:{obtener_version(user.id)}:{timezone.localdate().isoformat()}"
+    )
+    entries = cache.get(cache_key) or []
+    question = _question_key(message)
+    lang = _detect_language(message)
+    entities = _entities(user, message, intent)
+
+    for entry in entries:
+        if entry["question"] == question and entry["intent"] == intent:
+            return _hit(entry, exact_hits), None
+
+    candidates = [
+        entry for entry in entries
+        if entry["intent"] == intent
+        and entry["lang"] == lang
+        and entities is not None
+        and entry["entities"] == entities
+    ]
+    # Embedded only when there is something to compare with; also stored with the answer.
+    vector = embedding.wait() if candidates else None
+    scored = [
+        (_similarity(vector, entry["vector"]), entry)
+        for entry in candidates
+        if vector and entry["vector"]
+    ]
+    if scored:
+        score, best = max(scored, key=lambda item: item[0])
+        if score >= settings.CHATBOT_RESPONSE_CACHE_SIMILARITY:
+            logger.info("Respuesta reutilizada: intent=%s similitud=%.3f", intent, score)
+            return _hit(best, semantic_hits), None
+
+    misses.incr()
+    return None, Ticket(cache_key, question, intent, lang, entities, embedding)
+
+
+def store(ticket, llm_messages, answer, seconds):
+    """Remember ``answer`` (produced in ``seconds`` from ``llm_messages``) for later lookups."""
+    if ticket is None:
+        return
+    tokens = sum(estimate_tokens(msg["content"]) for msg in llm_messages)
+    entry = {
+        "question": ticket.question,
+        "intent": ticket.intent,
+        "lang": ticket.lang,
+        "entities": ticket.entities,
+        "vector": ticket.embedding.peek(),
+        "answer": answer,
+        "tokens": tokens + estimate_tokens(answer),
+        "ms": round(seconds * 1000),
+    }
+    try:
+        entries = [
+            e for e in cache.get(ticket.cache_key) or [] if e["question"] != ticket.question
+        ]
+        keep = settings.CHATBOT_RESPONSE_CACHE_SIZE - 1
+        entries = entries[-keep:] if keep > 0 else []
+        cache.set(
+            ticket.cache_key,
+            [*entries, entry],
+            timeout=settings.CHATBOT_RESPONSE_CACHE_TIMEOUT,
+        )
+    except Exception as exc:
+        logger.warning("No se pudo guardar la respuesta en caché: %s", exc)
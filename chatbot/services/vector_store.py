@@ -0,0 +1,72 @@
+"""Vector-store backend selection.
+
+``CHATBOT_VECTOR_STORE`` picks the backend: ``qdrant``, ``local`` (the NumPy
+index in ``local_vector_store``) or ``auto`` (Qdrant when ``QDRANT_URL`` and
+``QDRANT_API_KEY`` are set, local otherwise). Callers use the functions below
+instead of importing a backend directly.
+"""
+
+from contextlib import nullcontext
+
+from django.conf import settings
+
+_local = None
+
+
+def get_local_store():
+    global _local
+    if _local is None:
+        from chatbot.services.local_vector_store import LocalVectorStore
+
+        _local = LocalVectorStore(settings.CHATBOT_LOCAL_VECTOR_DIR)
+    return _local
+
+
+def backend_name():
+    choice = settings.CHATBOT_VECTOR_STORE
+    if choice == "auto":
+        return "qdrant" if settings.QDRANT_URL and settings.QDRANT_API_KEY else "local"
+    return choice
+
+
+def get_backend():
+    if backend_name() == "local":
+        return get_local_store()
+    from chatbot.services import qdrant_service
+
+    return qdrant_service
+
+
+def ensure_collection():
+    return get_backend().ensure_collection()
+
+
+def upsert_transaction(transaction, embedding):
+    return get_backend().upsert_transaction(transaction, embedding)
+
+
+def upsert_transactions(pairs, ensure=True):
+    return get_backend().upsert_transactions(pairs, ensure=ensure)
+
+
+def delete_point(transaction_id):
+    return get_backend().delete_point(transaction_id)
+
+
+def delete_points(transaction_ids):
+    return get_backend().delete_points(transaction_ids)
+
+
+def search_similar(query_embedding, user_id, limit=5):
+    return get_backend().search_similar(query_embedding, user_id, limit=limit)
+
+
+def deferred():
+    """Batch writes until the block exits; a no-op for Qdrant, which writes per request."""
+    backend = get_backend()
+    return backend.deferred() if hasattr(backend, "deferred") else nullcontext()
+
+
+def flush():
+    backend = get_backend()
+    return backend.flush() if hasattr(backend, "flush") else True
@@ -1,12 +1,10 @@
-import logging
-
 from django.conf import settings
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
+from chatbot.models import ChatSession, ConversationMessage, EmbeddingOutbox
 from finanzas.models import Transaccion
-
-logger = logging.getLogger(__name__)
+from finanzas.signals import transacciones_importadas
 
 
 def _generate_transaction_text(transaction):
@@ -19,21 +17,26 @@ def _generate_transaction_text(transaction):
     )
 
 
+# Vector-store side effects go through the outbox: one INSERT/UPDATE in the
+# caller's transaction, no network calls. `process_embedding_outbox` applies them.
+
+
 @receiver(post_save, sender=Transaccion)
 def embed_transaction_on_save(sender, instance, **kwargs):
     if not settings.CHATBOT_EMBEDDINGS_ENABLED:
         return
 
-    try:
-        from chatbot.services.embedding_service import get_embedding
-        from chatbot.services.qdrant_service import upsert_transaction
+    EmbeddingOutbox.enqueue(instance.id, "upsert")
 
-        text = _generate_transaction_text(instance)
-        embedding = get_embedding(text)
-        if embedding:
-            upsert_transaction(instance, embedding)
-    except Exception as exc:
-        logger.warning("Failed to embed transaction %s: %s", instance.id, exc)
+
+@receiver(transacciones_importadas)
+def embed_imported_transactions(sender, transacciones, **kwargs):
+    if not settings.CHATBOT_EMBEDDINGS_ENABLED:
+        return
+
+    # bulk_create only returns primary keys on some backends (not MySQL);
+    # rows without one are left for embed_all_transactions.
+    EmbeddingOutbox.enqueue_many([tx.pk for tx in transacciones if tx.pk is not None])
 
 
 @receiver(post_delete, sender=Transaccion)
@@ -41,9 +44,10 @@ def remove_transaction_embedding(sender, instance, **kwargs):
     if not settings.CHATBOT_EMBEDDINGS_ENABLED:
         return
 
-    try:
-        from chatbot.services.qdrant_service import delete_point
+    EmbeddingOutbox.enqueue(instance.id, "delete")
+
 
-        delete_point(instance.id)
-    except Exception as exc:
-        logger.warning("Failed to remove embedding for transaction %s: %s", instance.id, exc)
+@receiver(post_delete, sender=ConversationMessage)
+def uncount_session_message(sender, instance, **kwargs):
+    """Keep ``ChatSession`` in step; runs inside the Collector's atomic() block."""
+    ChatSession.forget_message(instance.usuario_id, instance.session_id, instance.created_at)
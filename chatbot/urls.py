@@ -3,6 +3,7 @@
 from chatbot.views import (
     get_conversation_history,
     send_message,
+    send_message_stream,
     start_new_conversation,
 )
 
@@ -10,6 +11,7 @@ app_name = "chatbot"
 
 urlpatterns = [
     path("api/chat/send/", send_message, name="send_message"),
+    path("api/chat/stream/", send_message_stream, name="send_message_stream"),
     path("api/chat/history/", get_conversation_history, name="history"),
     path("api/chat/new/", start_new_conversation, name="new_conversation"),
 ]
@@ -5,28 +5,38 @@ from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.views.decorators.http import require_GET, require_POST
 
-from chatbot.models import ConversationMessage
+from chatbot.services import history
+from chatbot.services.chat_stream import streaming_response
 from chatbot.services.rag_pipeline import process_message
 
 logger = logging.getLogger(__name__)
 
 
-@login_required
-@require_POST
-def send_message(request):
+def _read_message(request):
+    """``(message, session_id, None)``, or ``(None, None, error_response)``."""
     try:
         body = json.loads(request.body)
     except json.JSONDecodeError:
-        return JsonResponse({"error": "JSON invÃ¡lido"}, status=400)
+        return None, None, JsonResponse({"error": "JSON invÃ¡lido"}, status=400)
 
     user_message = body.get("message", "").strip()
     session_id = body.get("session_id", "").strip()
 
     if not user_message:
-        return JsonResponse({"error": "Mensaje vacÃ­o"}, status=400)
+        return None, None, JsonResponse({"error": "Mensaje vacÃ­o"}, status=400)
 
     if not session_id:
-        return JsonResponse({"error": "session_id requerido"}, status=400)
+        return None, None, JsonResponse({"error": "session_id requerido"}, status=400)
+
+    return user_message, session_id, None
+
+
+@login_required
+@require_POST
+def send_message(request):
+    user_message, session_id, error = _read_message(request)
+    if error:
+        return error
 
     try:
         logger.debug(
@@ -49,6 +59,16 @@ def send_message(request):
         )
 
 
+@login_required
+@require_POST
+def send_message_stream(request):
+    """Same as ``send_message``, but the answer arrives token by token as SSE."""
+    user_message, session_id, error = _read_message(request)
+    if error:
+        return error
+    return streaming_response(request, request.user, user_message, session_id)
+
+
 @login_required
 @require_GET
 def get_conversation_history(request):
@@ -57,15 +77,17 @@ def get_conversation_history(request):
     if not session_id:
         return JsonResponse({"error": "session_id requerido"}, status=400)
 
-    messages = ConversationMessage.objects.filter(
-        usuario=request.user,
-        session_id=session_id,
-    ).order_by("created_at")
+    try:
+        before, after, limit = history.page_params(request.GET)
+    except ValueError:
+        return JsonResponse({"error": "Parametros de paginacion invalidos"}, status=400)
 
+    messages, has_more = history.page(request.user, session_id, before, after, limit)
     return JsonResponse(
         {
             "messages": [
                 {
+                    "id": message.id,
                     "role": message.role,
                     "content": message.content,
                     "is_followup": message.is_followup_question,
@@ -73,6 +95,7 @@ def get_conversation_history(request):
                 }
                 for message in messages
             ],
+            "has_more": has_more,
             "session_id": session_id,
         }
     )
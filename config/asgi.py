@@ -1,5 +1,7 @@
 import os
 from django.core.asgi import get_asgi_application
 
+# Serve with an ASGI worker (e.g. `gunicorn -k uvicorn.workers.UvicornWorker
+# config.asgi:application`) so the dashboard SSE stream does not pin a worker.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 application = get_asgi_application()
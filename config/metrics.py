@@ -0,0 +1,70 @@
+"""Lightweight counters shared across workers through the default cache.
+
+Modules declare their counters at import time with ``counter("name")`` and
+bump them with ``.incr()``. Values that are cheaper to read than to track
+(e.g. a queue depth) are declared with ``gauge("name", fn)`` and computed when
+read. ``snapshot()`` returns every declared counter and gauge and is served to
+staff users at ``/health/metrics/``. With the default LocMemCache the counters
+are per process; point ``CACHES`` at Redis to aggregate them.
+"""
+
+import logging
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "metrics:"
+
+_counters = {}
+_gauges = {}
+
+
+class Counter:
+    def __init__(self, name):
+        self.name = name
+        self.key = f"{KEY_PREFIX}{name}"
+
+    def incr(self, amount=1):
+        try:
+            try:
+                cache.incr(self.key, amount)
+            except ValueError:
+                if not cache.add(self.key, amount, timeout=None):
+                    cache.incr(self.key, amount)
+        except Exception as exc:
+            # Metrics must never break the request path.
+            logger.debug("Could not increment metric %s: %s", self.name, exc)
+
+    def value(self):
+        try:
+            return cache.get(self.key, 0)
+        except Exception:
+            return 0
+
+
+def counter(name):
+    """Return the process-wide counter called ``name``, declaring it if needed."""
+    if name not in _counters:
+        _counters[name] = Counter(name)
+    return _counters[name]
+
+
+def gauge(name, fn):
+    """Declare a gauge whose value is ``fn()`` at snapshot time."""
+    _gauges[name] = fn
+
+
+def _read_gauge(name):
+    try:
+        return _gauges[name]()
+    except Exception as exc:
+        logger.debug("Could not read gauge %s: %s", name, exc)
+        return None
+
+
+def snapshot():
+    """Current value of every declared counter and gauge."""
+    values = {name: _counters[name].value() for name in _counters}
+    values.update({name: _read_gauge(name) for name in _gauges})
+    return dict(sorted(values.items()))
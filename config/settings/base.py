@@ -110,7 +110,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    "django.middleware.gzip.GZipMiddleware",
+    "finanzas.middleware.GZipMiddleware",
     "finanzas.middleware.CachingMiddleware",
     "finanzas.middleware.AdminAutoLoginMiddleware",
 ]
@@ -169,6 +169,32 @@ CACHES = {
         "LOCATION": "money-manager-cache",
     }
 }
+if os.environ.get("REDIS_URL"):
+    # Shared cache so per-user data versions and metrics are seen by every worker.
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["REDIS_URL"],
+    }
+# Whether the default cache is seen by every worker. The per-user data version
+# lives there, so with the per-process LocMemCache a write would only be noticed
+# by the worker that handled it: features keyed on that version (dashboard
+# cache) are bypassed unless this is true. Set it by hand only for a shared
+# backend other than REDIS_URL, or a single-process deployment.
+SHARED_CACHE = (
+    os.environ.get("SHARED_CACHE", str(bool(os.environ.get("REDIS_URL")))).lower() == "true"
+)
+
+# Seconds a cached dashboard payload may live; entries are also invalidated
+# by the per-user data version on every financial write.
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get("DASHBOARD_CACHE_TIMEOUT", "300"))
+
+# Server-sent dashboard updates (ASGI only): how often each open stream checks
+# the user's data version, how often an idle stream sends a keep-alive comment,
+# and how long a stream lives before the browser is told to reconnect.
+DASHBOARD_SSE_POLL_SECONDS = float(os.environ.get("DASHBOARD_SSE_POLL_SECONDS", "2"))
+DASHBOARD_SSE_KEEPALIVE_SECONDS = float(os.environ.get("DASHBOARD_SSE_KEEPALIVE_SECONDS", "15"))
+DASHBOARD_SSE_MAX_SECONDS = float(os.environ.get("DASHBOARD_SSE_MAX_SECONDS", "300"))
+DASHBOARD_SSE_RETRY_MS = int(os.environ.get("DASHBOARD_SSE_RETRY_MS", "3000"))
 
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "")
 GROQ_MODEL = os.environ.get("GROQ_MODEL", "openai/gpt-oss-120")
@@ -176,16 +202,71 @@ QDRANT_URL = os.environ.get("QDRANT_URL", "")
 QDRANT_API_KEY = os.environ.get("QDRANT_API_KEY", "")
 HF_API_TOKEN = os.environ.get("HUGGINGFACE_API_KEY", os.environ.get("HF_API_TOKEN", ""))
 CHATBOT_MAX_HISTORY = int(os.environ.get("CHATBOT_MAX_HISTORY", "10"))
+# Estimated tokens of verbatim history per prompt; older turns are folded into
+# a per-session summary capped at CHATBOT_SUMMARY_TOKEN_BUDGET.
+CHATBOT_HISTORY_TOKEN_BUDGET = int(os.environ.get("CHATBOT_HISTORY_TOKEN_BUDGET", "1500"))
+CHATBOT_SUMMARY_TOKEN_BUDGET = int(os.environ.get("CHATBOT_SUMMARY_TOKEN_BUDGET", "300"))
+# Messages per page of the chat history endpoints (clients may ask for up to 200).
+CHATBOT_HISTORY_PAGE_SIZE = int(os.environ.get("CHATBOT_HISTORY_PAGE_SIZE", "50"))
 CHATBOT_MAX_TOKENS = int(os.environ.get("CHATBOT_MAX_TOKENS", "1024"))
 CHATBOT_EMBEDDINGS_ENABLED = (
     os.environ.get("CHATBOT_EMBEDDINGS_ENABLED", "true").lower() == "true"
 )
+CHATBOT_EMBEDDING_BATCH_SIZE = int(os.environ.get("CHATBOT_EMBEDDING_BATCH_SIZE", "32"))
+# Failed attempts after which an outbox row is parked as failed instead of retried.
+CHATBOT_EMBEDDING_OUTBOX_MAX_ATTEMPTS = int(
+    os.environ.get("CHATBOT_EMBEDDING_OUTBOX_MAX_ATTEMPTS", "8")
+)
+# Vectors kept in each process's in-memory LRU (the DB tier is unbounded).
+CHATBOT_EMBEDDING_CACHE_SIZE = int(os.environ.get("CHATBOT_EMBEDDING_CACHE_SIZE", "4096"))
+# Chat context assembly: the financial context (DB) and embedding + vector
+# search (HTTP, in a thread pool) run concurrently, each with its own deadline.
+CHATBOT_CONTEXT_DEADLINE_SECONDS = float(os.environ.get("CHATBOT_CONTEXT_DEADLINE_SECONDS", "2"))
+CHATBOT_RAG_DEADLINE_SECONDS = float(os.environ.get("CHATBOT_RAG_DEADLINE_SECONDS", "3"))
+CHATBOT_RAG_WORKERS = int(os.environ.get("CHATBOT_RAG_WORKERS", "8"))
+# Answer balance/income/spending/budget questions from SQL aggregates, without
+# the LLM, when the whole message is understood (chatbot/services/fast_path.py).
+CHATBOT_FAST_PATH = os.environ.get("CHATBOT_FAST_PATH", "true").lower() == "true"
+# Reuse an earlier LLM answer of the same user to the same (exact or, by
+# embedding cosine similarity, near-identical) question with the same intent,
+# while the user's financial data is unchanged (chatbot/services/response_cache.py).
+CHATBOT_RESPONSE_CACHE = os.environ.get("CHATBOT_RESPONSE_CACHE", "true").lower() == "true"
+CHATBOT_RESPONSE_CACHE_SIMILARITY = float(
+    os.environ.get("CHATBOT_RESPONSE_CACHE_SIMILARITY", "0.92")
+)
+CHATBOT_RESPONSE_CACHE_SIZE = int(os.environ.get("CHATBOT_RESPONSE_CACHE_SIZE", "50"))
+CHATBOT_RESPONSE_CACHE_TIMEOUT = int(os.environ.get("CHATBOT_RESPONSE_CACHE_TIMEOUT", "3600"))
+# Keep-alive pools for the Groq/HuggingFace clients: hosts kept pooled and
+# connections per host (a hard cap; extra threads wait for a free one).
+CHATBOT_HTTP_POOL_CONNECTIONS = int(os.environ.get("CHATBOT_HTTP_POOL_CONNECTIONS", "4"))
+CHATBOT_HTTP_POOL_MAXSIZE = int(os.environ.get("CHATBOT_HTTP_POOL_MAXSIZE", "8"))
+# Vector store: "qdrant", "local" (in-process NumPy index persisted under
+# CHATBOT_LOCAL_VECTOR_DIR) or "auto" (Qdrant when configured, else local).
+CHATBOT_VECTOR_STORE = os.environ.get("CHATBOT_VECTOR_STORE", "auto").lower()
+CHATBOT_LOCAL_VECTOR_DIR = Path(
+    os.environ.get("CHATBOT_LOCAL_VECTOR_DIR", BASE_DIR / "vector_store")
+)
 
 ENABLE_DEV_SEED_DATA = os.environ.get("ENABLE_DEV_SEED_DATA", "false").lower() == "true"
 SEED_INITIAL_BALANCE = int(os.environ.get("SEED_INITIAL_BALANCE", "0"))
 
 AUTO_LOGIN_USERNAME = os.environ.get("AUTO_LOGIN_USERNAME")
 
+# Rows per page for keyset-paginated listings (HTML and API).
+LIST_PAGE_SIZE = int(os.environ.get("LIST_PAGE_SIZE", "50"))
+
+# Bulk statement imports: rows per bulk_create batch, and whether uploads are
+# processed in a background thread after the request commits.
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_RUN_ASYNC = os.environ.get("IMPORT_RUN_ASYNC", "true").lower() == "true"
+# Minutes without a saved batch after which `importar_transacciones --pendientes`
+# treats a 'procesando' import as abandoned and resumes it.
+IMPORT_STALE_MINUTES = int(os.environ.get("IMPORT_STALE_MINUTES", "30"))
+
+# Rows fetched per database round trip (and per Parquet row group) when
+# streaming transaction exports.
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "20000"))
+
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_AUTHENTICATION_CLASSES": [
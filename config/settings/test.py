@@ -8,6 +8,10 @@ if not SECRET_KEY:
 PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
 EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
 CHATBOT_EMBEDDINGS_ENABLED = False
+IMPORT_RUN_ASYNC = False
+# TestCase never commits, so on_commit cache invalidation would not fire;
+# tests that exercise caching opt in with override_settings(CACHES=...).
+CACHES = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
 STATICFILES_STORAGE = "django.contrib.staticfiles.storage.StaticFilesStorage"
 STATIC_ROOT = BASE_DIR / "staticfiles-test"
 STATIC_ROOT.mkdir(parents=True, exist_ok=True)
@@ -7,6 +7,8 @@ from django.http import JsonResponse
 from django.urls import include, path
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+from config import metrics
+
 
 def health_live(request):
     """Liveness endpoint: process is up."""
@@ -24,6 +26,13 @@ def health_ready(request):
         return JsonResponse({"status": "unavailable"}, status=503)
 
 
+def health_metrics(request):
+    """Staff-only snapshot of the in-app counters (cache hit rates, queues...)."""
+    if not (request.user.is_authenticated and request.user.is_staff):
+        return JsonResponse({"detail": "forbidden"}, status=403)
+    return JsonResponse({"metrics": metrics.snapshot()})
+
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/schema/", SpectacularAPIView.as_view(), name="api_schema"),
@@ -33,6 +42,7 @@ urlpatterns = [
     path("", include("finanzas.urls")),
     path("health/live/", health_live, name="health_live"),
     path("health/ready/", health_ready, name="health_ready"),
+    path("health/metrics/", health_metrics, name="health_metrics"),
 ]
 
 if settings.DEBUG:
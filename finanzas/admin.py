@@ -1,9 +1,13 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth import get_user_model
 from django.db.models import Sum
 from django.utils.html import format_html
 
-from finanzas.models import Categoria, Transaccion, Transferencia, PerfilUsuario, Presupuesto
+from finanzas.exportacion import ExportacionNoDisponible, respuesta_exportacion
+from finanzas.models import (
+    BalanceUsuario, Categoria, ImportacionTransacciones, Transaccion, Transferencia,
+    PerfilUsuario, Presupuesto, ResumenMensualCategoria,
+)
 
 Usuario = get_user_model()
 
@@ -38,10 +42,11 @@ class CategoriaAdmin(admin.ModelAdmin):
 @admin.register(Transaccion)
 class TransaccionAdmin(admin.ModelAdmin):
     list_display = ('fecha', 'usuario', 'descripcion', 'monto_display', 'tipo', 'categoria')
-    list_filter = ('tipo', 'fecha', 'categoria', 'usuario')
+    list_filter = ('tipo', 'es_demo', 'fecha', 'categoria', 'usuario')
     search_fields = ('descripcion',)
     date_hierarchy = 'fecha'
     readonly_fields = ('fecha_creacion', 'fecha_actualizacion')
+    actions = ('exportar_csv', 'exportar_parquet')
 
     fieldsets = (
         ('Información básica', {
@@ -67,6 +72,17 @@ class TransaccionAdmin(admin.ModelAdmin):
                           color, prefix, obj.monto)
     monto_display.short_description = 'Monto'
 
+    @admin.action(description='Exportar seleccionadas a CSV')
+    def exportar_csv(self, request, queryset):
+        return respuesta_exportacion(queryset, 'csv', 'transacciones')
+
+    @admin.action(description='Exportar seleccionadas a Parquet')
+    def exportar_parquet(self, request, queryset):
+        try:
+            return respuesta_exportacion(queryset, 'parquet', 'transacciones')
+        except ExportacionNoDisponible as exc:
+            self.message_user(request, str(exc), level=messages.ERROR)
+
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         if request.user.is_superuser:
@@ -92,6 +108,71 @@ class TransaccionAdmin(admin.ModelAdmin):
         return response
 
 
+# ── BalanceUsuario ──────────────────────────────────────────────────────────
+
+@admin.register(BalanceUsuario)
+class BalanceUsuarioAdmin(admin.ModelAdmin):
+    list_display = (
+        'usuario', 'ingresos', 'gastos', 'balance', 'num_transacciones', 'fecha_actualizacion'
+    )
+    search_fields = ('usuario__username',)
+    readonly_fields = (
+        'usuario', 'ingresos', 'gastos', 'balance', 'num_transacciones', 'fecha_actualizacion'
+    )
+
+    def has_add_permission(self, request):
+        # El ledger solo se mantiene desde Transaccion o con `reconstruir_balances`.
+        return False
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(usuario=request.user)
+
+
+# ── ResumenMensualCategoria ─────────────────────────────────────────────────
+
+@admin.register(ResumenMensualCategoria)
+class ResumenMensualCategoriaAdmin(admin.ModelAdmin):
+    list_display = ('usuario', 'año', 'mes', 'categoria', 'tipo', 'total', 'num_transacciones')
+    list_filter = ('año', 'mes', 'tipo')
+    search_fields = ('usuario__username', 'categoria__nombre')
+    readonly_fields = ('usuario', 'año', 'mes', 'categoria', 'tipo', 'total', 'num_transacciones')
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(usuario=request.user)
+
+
+# ── ImportacionTransacciones ────────────────────────────────────────────────
+
+@admin.register(ImportacionTransacciones)
+class ImportacionTransaccionesAdmin(admin.ModelAdmin):
+    list_display = (
+        'nombre_archivo', 'usuario', 'formato', 'estado', 'filas_importadas',
+        'filas_con_error', 'fecha_creacion',
+    )
+    list_filter = ('estado', 'formato')
+    search_fields = ('usuario__username', 'nombre_archivo')
+    readonly_fields = [field.name for field in ImportacionTransacciones._meta.fields]
+
+    def has_add_permission(self, request):
+        # Se crean desde /api/v1/imports o con `importar_transacciones`.
+        return False
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(usuario=request.user)
+
+
 # ── Transferencia ───────────────────────────────────────────────────────────
 
 @admin.register(Transferencia)
@@ -160,7 +241,7 @@ class PresupuestoAdmin(admin.ModelAdmin):
     porcentaje_usado_display.short_description = 'Usado'
 
     def get_queryset(self, request):
-        qs = super().get_queryset(request)
+        qs = super().get_queryset(request).select_related('categoria').con_gasto_actual()
         if request.user.is_superuser:
             return qs
         return qs.filter(usuario=request.user)
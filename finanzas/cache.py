@@ -0,0 +1,85 @@
+"""Caché por usuario versionada por los datos financieros del usuario.
+
+Cada usuario tiene un número de versión que se incrementa (al hacer commit)
+con cualquier escritura de Transaccion, Categoria, Presupuesto o
+Transferencia. Las claves
+cacheadas incluyen la versión, así que nunca hace falta borrarlas: al cambiar
+la versión las entradas viejas dejan de consultarse y expiran solas.
+
+La versión solo sirve si todos los workers leen la misma caché (Redis): con la
+LocMemCache de cada proceso, una escritura solo la vería el worker que la
+atendió. Por eso, sin ``settings.SHARED_CACHE``, el payload del dashboard se
+calcula siempre y no se emiten ETags.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from config.metrics import counter
+
+dashboard_hits = counter("dashboard_cache.hits")
+dashboard_misses = counter("dashboard_cache.misses")
+
+# Cambiar si cambia la forma del payload del dashboard, para invalidar los ETags.
+DASHBOARD_PAYLOAD_REVISION = 1
+
+
+def _clave_version(usuario_id):
+    return f"finanzas:data_version:{usuario_id}"
+
+
+def obtener_version(usuario_id):
+    """Versión actual de los datos del usuario."""
+    clave = _clave_version(usuario_id)
+    version = cache.get(clave)
+    if version is None:
+        # Semilla basada en el reloj: si la clave se desaloja, la nueva versión
+        # no coincide con ninguna de las que ya se usaron.
+        cache.add(clave, time.time_ns(), timeout=None)
+        version = cache.get(clave, 0)
+    return version
+
+
+def incrementar_version(*usuario_ids):
+    """Invalida las cachés de los usuarios indicados al confirmar la transacción."""
+
+    def _incrementar():
+        for usuario_id in set(usuario_ids):
+            clave = _clave_version(usuario_id)
+            try:
+                cache.incr(clave)
+            except ValueError:
+                cache.set(clave, time.time_ns(), timeout=None)
+
+    transaction.on_commit(_incrementar)
+
+
+def payload_dashboard_cacheado(usuario, construir):
+    """Devuelve el payload del dashboard, calculándolo con ``construir`` solo si cambió."""
+    if not settings.SHARED_CACHE:
+        return construir(usuario)
+    clave = f"finanzas:dashboard:{usuario.id}:{obtener_version(usuario.id)}"
+    payload = cache.get(clave)
+    if payload is not None:
+        dashboard_hits.incr()
+        return payload
+
+    dashboard_misses.incr()
+    payload = construir(usuario)
+    cache.set(clave, payload, timeout=settings.DASHBOARD_CACHE_TIMEOUT)
+    return payload
+
+
+def etag_dashboard(request, *args, **kwargs):
+    """
+    ETag del payload del dashboard del usuario autenticado (para ``@condition``).
+    None (sin ETag ni 304) si la versión no es compartida: otro worker podría
+    responder 304 a datos que ya cambiaron, y el cliente se quedaría con ellos.
+    """
+    if not settings.SHARED_CACHE:
+        return None
+    usuario_id = request.user.id
+    return f"dash-{DASHBOARD_PAYLOAD_REVISION}-{usuario_id}-{obtener_version(usuario_id)}"
@@ -0,0 +1,327 @@
+"""Importación masiva de extractos bancarios (CSV y OFX).
+
+Los archivos se leen en streaming, fila a fila, sin cargarlos en memoria. Las
+transacciones se insertan con ``bulk_create`` en lotes de ``IMPORT_BATCH_SIZE``;
+cada lote actualiza los agregados una sola vez y avisa con la señal
+``transacciones_importadas`` para que los embeddings se generen en bloque.
+"""
+
+import csv
+import io
+import logging
+import re
+import threading
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from finanzas.models import Categoria, ImportacionTransacciones, Transaccion
+from finanzas.signals import transacciones_importadas
+
+logger = logging.getLogger(__name__)
+
+
+class FilaInvalida(ValueError):
+    """Una fila del extracto no se puede convertir en transacción."""
+
+
+# ── Lectores ────────────────────────────────────────────────────────────────
+
+# Nombres de columna aceptados en el CSV, normalizados a los campos internos.
+COLUMNAS_CSV = {
+    'fecha': 'fecha', 'date': 'fecha',
+    'monto': 'monto', 'importe': 'monto', 'amount': 'monto',
+    'tipo': 'tipo', 'type': 'tipo',
+    'descripcion': 'descripcion', 'descripción': 'descripcion', 'concepto': 'descripcion',
+    'description': 'descripcion',
+    'categoria': 'categoria', 'categoría': 'categoria', 'category': 'categoria',
+}
+
+
+def leer_csv(archivo):
+    """Genera las filas de un CSV (binario) como dicts con los campos internos."""
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', errors='replace', newline='')
+    cabecera = texto.readline()
+    delimitador = ';' if cabecera.count(';') > cabecera.count(',') else ','
+    columnas = [
+        COLUMNAS_CSV.get(nombre.strip().lower(), nombre.strip().lower())
+        for nombre in next(csv.reader([cabecera], delimiter=delimitador), [])
+    ]
+    faltantes = {'fecha', 'monto'} - set(columnas)
+    if faltantes:
+        raise ValueError(f"Faltan columnas obligatorias en el CSV: {', '.join(sorted(faltantes))}")
+
+    try:
+        for valores in csv.reader(texto, delimiter=delimitador):
+            if not any(valor.strip() for valor in valores):
+                continue
+            # Filas cortas o con columnas de más: lo que falte se valida campo a campo.
+            yield dict(zip(columnas, valores, strict=False))
+    finally:
+        # Sin detach el wrapper cerraría el archivo del llamador al liberarse.
+        texto.detach()
+
+
+_TOKEN_OFX = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+def _tokens_ofx(texto, tamaño_bloque=64 * 1024):
+    """Genera ``(cierre, etiqueta, valor)`` de un OFX (SGML 1.x o XML 2.x) por bloques."""
+    pendiente = ''
+    while True:
+        bloque = texto.read(tamaño_bloque)
+        pendiente += bloque
+        # La última etiqueta del bloque puede estar cortada: se procesa en la siguiente vuelta.
+        corte = pendiente.rfind('<') if bloque else len(pendiente)
+        if corte > 0:
+            for match in _TOKEN_OFX.finditer(pendiente, 0, corte):
+                yield match.group(1) == '/', match.group(2).upper(), match.group(3).strip()
+            pendiente = pendiente[corte:]
+        if not bloque:
+            return
+
+
+def leer_ofx(archivo):
+    """Genera los ``<STMTTRN>`` de un OFX (binario) como dicts con los campos internos."""
+    texto = io.TextIOWrapper(archivo, encoding='utf-8', errors='replace')
+    actual = None
+    try:
+        for cierre, etiqueta, valor in _tokens_ofx(texto):
+            if etiqueta == 'STMTTRN':
+                if cierre and actual is not None:
+                    descripcion = ' - '.join(
+                        parte for parte in (actual.get('NAME'), actual.get('MEMO')) if parte
+                    )
+                    yield {
+                        'fecha': actual.get('DTPOSTED', ''),
+                        'monto': actual.get('TRNAMT', ''),
+                        'descripcion': descripcion,
+                    }
+                actual = None if cierre else {}
+            elif actual is not None and not cierre and valor:
+                actual[etiqueta] = valor
+    finally:
+        texto.detach()
+
+
+LECTORES = {
+    'csv': leer_csv,
+    'ofx': leer_ofx,
+}
+
+
+# ── Conversión de filas ─────────────────────────────────────────────────────
+
+FORMATOS_FECHA = (
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+    '%d/%m/%Y %H:%M', '%d/%m/%Y', '%d-%m-%Y',
+    '%Y%m%d%H%M%S', '%Y%m%d',
+)
+
+
+def parsear_fecha(valor):
+    # OFX añade milisegundos y zona: 20240131120000.000[-3:ART]
+    valor = re.sub(r'(\.\d+)?(\[.*\])?$', '', (valor or '').strip())
+    for formato in FORMATOS_FECHA:
+        try:
+            fecha = datetime.strptime(valor, formato)
+        except ValueError:
+            continue
+        return timezone.make_aware(fecha) if settings.USE_TZ else fecha
+    raise FilaInvalida(f"Fecha no reconocida: {valor!r}")
+
+
+def parsear_monto(valor):
+    """
+    Convierte ``1.234,56``, ``1,234.56``, ``-45.10`` o ``$ 300`` en Decimal con signo.
+
+    Un único separador seguido de tres dígitos (``1.234``, ``1,234``) puede ser de
+    miles o decimal según el banco: se rechaza en lugar de adivinar, igual que
+    cualquier monto con más de dos decimales.
+    """
+    limpio = re.sub(r'[^\d,.\-]', '', (valor or '').strip())
+    if ',' in limpio and '.' in limpio:
+        # El separador que aparece último es el decimal.
+        miles = '.' if limpio.rfind(',') > limpio.rfind('.') else ','
+        limpio = limpio.replace(miles, '').replace(',', '.')
+    elif limpio.count(',') > 1 or limpio.count('.') > 1:
+        # Repetido solo puede ser de miles: 1.234.567
+        if not re.fullmatch(r'-?\d{1,3}([.,]\d{3})+', limpio):
+            raise FilaInvalida(f"Monto no reconocido: {valor!r}")
+        limpio = limpio.replace(',', '').replace('.', '')
+    else:
+        limpio = limpio.replace(',', '.')
+    try:
+        monto = Decimal(limpio)
+    except InvalidOperation:
+        raise FilaInvalida(f"Monto no reconocido: {valor!r}") from None
+    if monto.as_tuple().exponent < -2:
+        raise FilaInvalida(f"Monto ambiguo o con más de dos decimales: {valor!r}")
+    return monto.quantize(Decimal('0.01'))
+
+
+# Transaccion.monto es DecimalField(max_digits=10, decimal_places=2).
+MONTO_MAXIMO = Decimal('100000000')
+
+TIPOS = {
+    'ingreso': 'ingreso', 'income': 'ingreso', 'credit': 'ingreso', 'credito': 'ingreso',
+    'gasto': 'gasto', 'expense': 'gasto', 'debit': 'gasto', 'debito': 'gasto',
+}
+
+
+class CategoriasUsuario:
+    """Lookup en memoria de las categorías del usuario; crea las que falten una sola vez."""
+
+    def __init__(self, usuario):
+        self.usuario = usuario
+        self._por_nombre = {
+            categoria.nombre.casefold(): categoria
+            for categoria in Categoria.objects.filter(usuario=usuario)
+        }
+
+    def resolver(self, nombre, tipo):
+        nombre = (nombre or '').strip()
+        if not nombre:
+            return None
+        categoria = self._por_nombre.get(nombre.casefold())
+        if categoria is None:
+            categoria, _ = Categoria.objects.get_or_create(
+                usuario=self.usuario, nombre=nombre[:100], defaults={'tipo': tipo}
+            )
+            self._por_nombre[nombre.casefold()] = categoria
+        # Misma regla que los formularios: la categoría debe ser del tipo de la transacción.
+        return categoria if categoria.tipo == tipo else None
+
+
+def construir_transaccion(fila, usuario, categorias):
+    """Convierte una fila leída en una ``Transaccion`` sin guardar."""
+    monto = parsear_monto(fila.get('monto'))
+    tipo_declarado = (fila.get('tipo') or '').strip().lower()
+    if tipo_declarado:
+        tipo = TIPOS.get(tipo_declarado)
+        if tipo is None:
+            raise FilaInvalida(f"Tipo no reconocido: {tipo_declarado!r}")
+    else:
+        tipo = 'gasto' if monto < 0 else 'ingreso'
+    monto = abs(monto)
+    if monto == 0:
+        raise FilaInvalida("El monto debe ser mayor que cero.")
+    if monto >= MONTO_MAXIMO:
+        raise FilaInvalida(f"Monto fuera de rango: {monto}")
+
+    return Transaccion(
+        usuario=usuario,
+        fecha=parsear_fecha(fila.get('fecha')),
+        monto=monto,
+        tipo=tipo,
+        categoria=categorias.resolver(fila.get('categoria'), tipo),
+        descripcion=(fila.get('descripcion') or '').strip(),
+    )
+
+
+# ── Importación ─────────────────────────────────────────────────────────────
+
+def _guardar_lote(importacion, lote, bytes_procesados):
+    with transaction.atomic():
+        if lote:
+            creadas = Transaccion.objects.bulk_create(lote)
+            Transaccion.ajustar_agregados_lote(creadas)
+            transacciones_importadas.send(sender=Transaccion, transacciones=creadas)
+        importacion.filas_importadas += len(lote)
+        importacion.bytes_procesados = bytes_procesados
+        importacion.save(update_fields=[
+            'filas_procesadas', 'filas_importadas', 'filas_con_error', 'errores',
+            'bytes_procesados', 'fecha_actualizacion',
+        ])
+
+
+def importar(importacion, archivo=None, tamaño_lote=None, progreso=None):
+    """
+    Procesa la importación leyendo ``archivo`` (o el archivo subido) en streaming.
+
+    Cada lote se confirma por separado, así que el progreso es visible mientras
+    avanza; si algo falla a mitad, los lotes ya confirmados se conservan y la
+    importación queda ``fallida`` con el mensaje de error. Una importación
+    interrumpida se retoma tras la última fila confirmada (``filas_procesadas``).
+    """
+    tamaño_lote = tamaño_lote or settings.IMPORT_BATCH_SIZE
+    ya_procesadas = importacion.filas_procesadas
+    importacion.estado = 'procesando'
+    importacion.fecha_inicio = importacion.fecha_inicio or timezone.now()
+    importacion.save(update_fields=['estado', 'fecha_inicio', 'fecha_actualizacion'])
+
+    categorias = CategoriasUsuario(importacion.usuario)
+    propio = archivo is None
+    try:
+        if propio:
+            archivo = importacion.archivo.open('rb')
+        lote = []
+        for numero, fila in enumerate(LECTORES[importacion.formato](archivo), start=1):
+            if numero <= ya_procesadas:
+                # Ya confirmada en un lote antes de la interrupción.
+                continue
+            importacion.filas_procesadas = numero
+            try:
+                lote.append(construir_transaccion(fila, importacion.usuario, categorias))
+            except FilaInvalida as exc:
+                importacion.registrar_error(numero, str(exc))
+            if len(lote) >= tamaño_lote:
+                _guardar_lote(importacion, lote, archivo.tell())
+                lote = []
+                if progreso:
+                    progreso(importacion)
+        _guardar_lote(importacion, lote, importacion.bytes_totales or archivo.tell())
+    except Exception as exc:
+        logger.exception("Importación %s fallida", importacion.uuid)
+        importacion.estado = 'fallida'
+        importacion.mensaje_error = str(exc)
+    else:
+        importacion.estado = 'completada'
+    finally:
+        if propio and archivo is not None:
+            archivo.close()
+
+    importacion.fecha_fin = timezone.now()
+    importacion.save(update_fields=[
+        'estado', 'mensaje_error', 'fecha_fin', 'filas_procesadas', 'filas_con_error', 'errores',
+        'fecha_actualizacion',
+    ])
+    logger.info(
+        "Importación %s %s: %s filas importadas, %s con error",
+        importacion.uuid, importacion.estado, importacion.filas_importadas,
+        importacion.filas_con_error,
+    )
+    return importacion
+
+
+def _importar_en_hilo(importacion_id):
+    close_old_connections()
+    try:
+        importar(ImportacionTransacciones.objects.select_related('usuario').get(pk=importacion_id))
+    finally:
+        close_old_connections()
+
+
+def encolar_importacion(importacion):
+    """
+    Lanza la importación fuera del request (hilo en segundo plano tras el commit).
+
+    Con ``IMPORT_RUN_ASYNC = False`` se procesa en línea. Si el proceso se
+    reinicia antes de empezar, ``importar_transacciones --pendientes`` la retoma.
+    """
+    if not settings.IMPORT_RUN_ASYNC:
+        importar(importacion)
+        return
+
+    def lanzar():
+        threading.Thread(
+            target=_importar_en_hilo,
+            args=(importacion.pk,),
+            name=f"importacion-{importacion.pk}",
+            daemon=True,
+        ).start()
+
+    transaction.on_commit(lanzar)
@@ -0,0 +1,165 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from finanzas.models import Categoria, Transaccion
+
+BENCH_PREFIX = 'bench_user_'
+LOTE = 10000
+
+
+def _tiene_es_demo():
+    """Si la tabla ya tiene la columna es_demo (migración 0007 aplicada)."""
+    with connection.cursor() as cursor:
+        columnas = connection.introspection.get_table_description(
+            cursor, Transaccion._meta.db_table
+        )
+    return any(columna.name == 'es_demo' for columna in columnas)
+
+
+def _insertar_sin_es_demo(lote):
+    """
+    INSERT sin la columna es_demo, para sembrar antes de la migración 0007
+    (bulk_create siempre inserta todos los campos del modelo).
+    """
+    campos = [
+        campo for campo in Transaccion._meta.concrete_fields
+        if campo.name != 'es_demo' and not campo.primary_key
+    ]
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(Transaccion._meta.db_table),
+        ', '.join(quote(campo.column) for campo in campos),
+        ', '.join(['%s'] * len(campos)),
+    )
+    filas = [
+        [campo.get_db_prep_save(campo.pre_save(transaccion, True), connection)
+         for campo in campos]
+        for transaccion in lote
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, filas)
+
+
+def sembrar(filas, num_usuarios, es_demo=True, escribir=print):
+    """
+    Crea los usuarios de benchmark y completa hasta ``filas`` transacciones
+    aleatorias entre ellos; reutiliza las que ya existan.
+    """
+    usuarios = []
+    for indice in range(num_usuarios):
+        usuario, _ = User.objects.get_or_create(username=f'{BENCH_PREFIX}{indice}')
+        usuarios.append(usuario)
+
+    existentes = Transaccion.objects.filter(usuario__in=usuarios).count()
+    faltantes = filas - existentes
+    if faltantes <= 0:
+        escribir(f'Reusing {existentes} existing bench rows')
+        return usuarios
+
+    categorias = {
+        usuario.id: list(Categoria.objects.filter(usuario=usuario)) for usuario in usuarios
+    }
+    ahora = timezone.now()
+    escribir(f'Seeding {faltantes} rows for {num_usuarios} users...')
+    while faltantes > 0:
+        lote = []
+        for _ in range(min(LOTE, faltantes)):
+            usuario = random.choice(usuarios)
+            categoria = random.choice(categorias[usuario.id])
+            lote.append(Transaccion(
+                usuario=usuario,
+                fecha=ahora - timedelta(minutes=random.randint(0, 60 * 24 * 365 * 3)),
+                monto=Decimal(random.randint(100, 500000)) / 100,
+                tipo=categoria.tipo,
+                categoria=categoria,
+                descripcion=f'Bench {categoria.nombre}',
+            ))
+        if es_demo:
+            Transaccion.objects.bulk_create(lote, batch_size=1000)
+        else:
+            _insertar_sin_es_demo(lote)
+        Transaccion.ajustar_agregados_lote(lote)
+        faltantes -= len(lote)
+    return usuarios
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a synthetic dataset and reports query plans and latencies for the hot '
+        'Transaccion query shapes. Run it before and after migrating to compare.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=1_000_000,
+                            help='Total rows to seed across all bench users')
+        parser.add_argument('--usuarios', type=int, default=10, help='Number of bench users')
+        parser.add_argument('--repeticiones', type=int, default=20, help='Runs per query')
+        parser.add_argument('--sin-plan', action='store_true', help='Do not print EXPLAIN output')
+        parser.add_argument('--limpiar', action='store_true',
+                            help='Delete the bench users and their data, then exit')
+
+    def handle(self, *args, **options):
+        if options['limpiar']:
+            borrados, _ = User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {borrados} bench rows'))
+            return
+
+        es_demo = _tiene_es_demo()
+        if not es_demo:
+            self.stdout.write('es_demo column missing (before migration 0007): skipping its query')
+        usuarios = sembrar(options['filas'], options['usuarios'], es_demo, self.stdout.write)
+        usuario = usuarios[0]
+        # Antes de la 0007 el modelo tiene un campo que la tabla aún no.
+        transacciones = (
+            Transaccion.objects.all() if es_demo else Transaccion.objects.defer('es_demo')
+        )
+        categoria = Categoria.objects.filter(usuario=usuario, tipo='gasto').first()
+        hoy = timezone.now()
+        inicio_mes = hoy.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+        consultas = [
+            ('listado reciente', transacciones.filter(usuario=usuario).order_by('-fecha')[:50],
+             list),
+            ('listado por tipo',
+             transacciones.filter(usuario=usuario, tipo='gasto').order_by('-fecha')[:50], list),
+            ('listado por categoria',
+             transacciones.filter(usuario=usuario, categoria=categoria).order_by('-fecha')[:50],
+             list),
+            ('gasto mensual de categoria',
+             transacciones.filter(usuario=usuario, categoria=categoria, tipo='gasto',
+                                  fecha__gte=inicio_mes),
+             lambda qs: qs.aggregate(total=Sum('monto'))),
+            ('totales por tipo',
+             transacciones.filter(usuario=usuario).values('tipo').annotate(total=Sum('monto'))
+             .order_by('tipo'), list),
+            ('flag demo', transacciones.filter(usuario=usuario, es_demo=True).order_by(),
+             lambda qs: qs.exists()),
+            ('prefijo demo (legacy)',
+             transacciones.filter(usuario=usuario, descripcion__startswith='[DEMO]')
+             .order_by(), lambda qs: qs.exists()),
+        ]
+        if not es_demo:
+            consultas = [consulta for consulta in consultas if consulta[0] != 'flag demo']
+
+        for nombre, queryset, ejecutar in consultas:
+            tiempos = []
+            for _ in range(options['repeticiones']):
+                inicio = time.perf_counter()
+                ejecutar(queryset.all())
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            tiempos.sort()
+            p95 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+            self.stdout.write(self.style.MIGRATE_HEADING(nombre))
+            self.stdout.write(f'  mediana={statistics.median(tiempos):.2f}ms p95={p95:.2f}ms')
+            if not options['sin_plan']:
+                for linea in queryset.explain().splitlines():
+                    self.stdout.write(f'  | {linea}')
@@ -0,0 +1,72 @@
+import os
+import resource
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from finanzas.exportacion import exportar_csv, exportar_parquet
+from finanzas.management.commands.benchmark_consultas import BENCH_PREFIX, sembrar
+from finanzas.models import Transaccion
+
+EXPORTADORES = {'csv': exportar_csv, 'parquet': exportar_parquet}
+
+
+def _rss_mb():
+    """RSS actual del proceso (Linux); si no hay /proc, el pico de getrusage."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        'Streams an export of the synthetic bench dataset (seeded like benchmark_consultas) '
+        'and reports throughput and RSS while it is consumed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('formato', choices=sorted(EXPORTADORES), help='Export format')
+        parser.add_argument('--filas', type=int, default=1_000_000,
+                            help='Total rows to seed across all bench users')
+        parser.add_argument('--usuarios', type=int, default=1, help='Number of bench users')
+        parser.add_argument('--limpiar', action='store_true',
+                            help='Delete the bench users and their data, then exit')
+
+    def handle(self, *args, **options):
+        if options['limpiar']:
+            borrados, _ = User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {borrados} bench rows'))
+            return
+
+        formato = options['formato']
+        usuarios = sembrar(options['filas'], options['usuarios'], escribir=self.stdout.write)
+        if formato == 'parquet':
+            import pyarrow.parquet  # noqa: F401  (que la importación no cuente como crecimiento)
+
+        # Consume la exportación como lo haría el cliente y muestrea la memoria.
+        queryset = Transaccion.objects.filter(usuario__in=usuarios)
+        total = queryset.count()
+        rss_inicial = _rss_mb()
+        self.stdout.write(f'Exporting {total} rows as {formato}; RSS before: {rss_inicial:.1f}MB')
+
+        escritos = 0
+        siguiente_reporte = 0
+        muestras = []
+        inicio = time.perf_counter()
+        for trozo in EXPORTADORES[formato](queryset):
+            escritos += len(trozo)
+            muestras.append(_rss_mb())
+            if escritos >= siguiente_reporte:
+                self.stdout.write(f'  {escritos / 2**20:8.1f}MB written  RSS={muestras[-1]:.1f}MB')
+                siguiente_reporte += 10 * 2**20
+        duracion = time.perf_counter() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{escritos / 2**20:.1f}MB in {duracion:.1f}s '
+            f'({total / max(duracion, 1e-9):.0f} rows/s); '
+            f'RSS min={min(muestras):.1f}MB max={max(muestras):.1f}MB '
+            f'(+{max(muestras) - rss_inicial:.1f}MB over the start)'
+        ))
@@ -0,0 +1,113 @@
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from finanzas.importacion import importar
+from finanzas.models import ImportacionTransacciones
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports a bank statement (CSV or OFX) for a user with batched inserts, '
+        'or processes uploads still pending'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', nargs='?', help='Path to the CSV/OFX file')
+        parser.add_argument('--usuario', help='Username or ID that owns the transactions')
+        parser.add_argument(
+            '--formato',
+            choices=[clave for clave, _ in ImportacionTransacciones.FORMATO_CHOICES],
+            help='File format (default: deduced from the extension)',
+        )
+        parser.add_argument('--lote', type=int, help='Rows per bulk_create batch')
+        parser.add_argument(
+            '--pendientes',
+            action='store_true',
+            help=(
+                'Process uploaded imports still "pendiente", and resume "procesando" ones '
+                'with no progress for IMPORT_STALE_MINUTES (e.g. after a restart)'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options['pendientes']:
+            self._pendientes(options['lote'])
+            return
+
+        if not options['archivo'] or not options['usuario']:
+            raise CommandError('Indica el archivo y --usuario, o usa --pendientes')
+
+        ruta = Path(options['archivo'])
+        if not ruta.is_file():
+            raise CommandError(f'No existe el archivo {ruta}')
+        formato = options['formato'] or ruta.suffix.lstrip('.').lower()
+        if formato not in dict(ImportacionTransacciones.FORMATO_CHOICES):
+            raise CommandError('No se pudo deducir el formato; usa --formato csv|ofx')
+
+        usuario = self._usuario(options['usuario'])
+        importacion = ImportacionTransacciones.objects.create(
+            usuario=usuario,
+            nombre_archivo=ruta.name,
+            formato=formato,
+            bytes_totales=ruta.stat().st_size,
+        )
+        with ruta.open('rb') as archivo:
+            importar(
+                importacion,
+                archivo=archivo,
+                tamaño_lote=options['lote'],
+                progreso=lambda imp: self.stdout.write(
+                    f'  {imp.porcentaje}% - {imp.filas_importadas} filas importadas'
+                ),
+            )
+        self._resumen(importacion)
+        if importacion.estado == 'fallida':
+            raise CommandError(importacion.mensaje_error)
+
+    def _pendientes(self, tamaño_lote):
+        ahora = timezone.now()
+        limite = ahora - timedelta(minutes=settings.IMPORT_STALE_MINUTES)
+        pendientes = ImportacionTransacciones.objects.filter(
+            Q(estado='pendiente') | Q(estado='procesando', fecha_actualizacion__lt=limite)
+        ).select_related('usuario').order_by('fecha_creacion')
+        for importacion in pendientes:
+            # Otro proceso pudo tomarla entre la consulta y ahora.
+            tomada = ImportacionTransacciones.objects.filter(
+                pk=importacion.pk,
+                estado=importacion.estado,
+                fecha_actualizacion=importacion.fecha_actualizacion,
+            ).update(fecha_actualizacion=ahora)
+            if not tomada:
+                continue
+            if importacion.estado == 'procesando' and not importacion.archivo:
+                # Importada desde disco: el archivo no se guardó y no se puede retomar.
+                importacion.estado = 'fallida'
+                importacion.mensaje_error = 'Interrumpida sin archivo guardado para retomarla'
+                importacion.fecha_fin = ahora
+                importacion.save(update_fields=[
+                    'estado', 'mensaje_error', 'fecha_fin', 'fecha_actualizacion',
+                ])
+                self._resumen(importacion)
+                continue
+            self._resumen(importar(importacion, tamaño_lote=tamaño_lote))
+
+    def _usuario(self, valor):
+        filtro = {'id': int(valor)} if valor.isdigit() else {'username': valor}
+        try:
+            return User.objects.get(**filtro)
+        except User.DoesNotExist:
+            raise CommandError(f'No existe el usuario {valor}') from None
+
+    def _resumen(self, importacion):
+        self.stdout.write(self.style.SUCCESS(
+            f'{importacion}: {importacion.filas_importadas} importadas, '
+            f'{importacion.filas_con_error} con error de {importacion.filas_procesadas} filas'
+        ))
+        for error in importacion.errores[:10]:
+            self.stdout.write(f"  fila {error['fila']}: {error['error']}")
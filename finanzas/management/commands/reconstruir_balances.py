@@ -0,0 +1,89 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from finanzas.models import BalanceUsuario, ResumenMensualCategoria
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds (or verifies) the per-user balance ledger and monthly category '
+        'rollup from raw transactions'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int, help='Only process this user ID')
+        parser.add_argument(
+            '--verificar',
+            action='store_true',
+            help='Only compare the aggregates against raw transactions, without writing',
+        )
+
+    def handle(self, *args, **options):
+        usuarios = User.objects.order_by('id').values_list('id', 'username')
+        user_id = options.get('user_id')
+        if user_id:
+            usuarios = usuarios.filter(id=user_id)
+
+        solo_verificar = options['verificar']
+        revisados = 0
+        descuadres = 0
+
+        for usuario_id, username in usuarios.iterator():
+            revisados += 1
+            balance_ok = self._verificar_balance(usuario_id, username)
+            resumen_ok = self._verificar_resumen(usuario_id, username)
+            if balance_ok and resumen_ok:
+                continue
+
+            descuadres += 1
+            if solo_verificar:
+                continue
+            if not balance_ok:
+                BalanceUsuario.reconstruir(usuario_id)
+            if not resumen_ok:
+                ResumenMensualCategoria.reconstruir(usuario_id)
+
+        if solo_verificar:
+            mensaje = f'Verificados {revisados} usuarios, {descuadres} con descuadre'
+            if descuadres:
+                raise CommandError(mensaje)
+        else:
+            mensaje = f'Revisados {revisados} usuarios, {descuadres} reconstruidos'
+        self.stdout.write(self.style.SUCCESS(mensaje))
+
+    def _verificar_balance(self, usuario_id, username):
+        esperado = BalanceUsuario.calcular_totales(usuario_id)
+        actual = BalanceUsuario.objects.filter(usuario_id=usuario_id).first()
+        if actual is not None and all(
+            getattr(actual, campo) == valor for campo, valor in esperado.items()
+        ):
+            return True
+
+        resumen = 'inexistente' if actual is None else {
+            campo: getattr(actual, campo) for campo in esperado
+        }
+        self.stdout.write(self.style.WARNING(
+            f'Descuadre de balance para {username} (id={usuario_id}): '
+            f'ledger={resumen} esperado={esperado}'
+        ))
+        return False
+
+    def _verificar_resumen(self, usuario_id, username):
+        campos = ('año', 'mes', 'categoria_id', 'tipo', 'total', 'num_transacciones')
+        esperado = {
+            tuple(fila[campo] for campo in campos)
+            for fila in ResumenMensualCategoria.calcular_filas(usuario_id)
+        }
+        actual = set(
+            ResumenMensualCategoria.objects.filter(
+                usuario_id=usuario_id, num_transacciones__gt=0
+            ).values_list(*campos)
+        )
+        if actual == esperado:
+            return True
+
+        self.stdout.write(self.style.WARNING(
+            f'Descuadre de resumen mensual para {username} (id={usuario_id}): '
+            f'{len(actual ^ esperado)} filas distintas'
+        ))
+        return False
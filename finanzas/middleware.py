@@ -1,5 +1,7 @@
 ﻿import logging
 
+from django.middleware.gzip import GZipMiddleware as DjangoGZipMiddleware
+from django.utils.cache import patch_vary_headers
 from django.utils.deprecation import MiddlewareMixin
 
 logger = logging.getLogger(__name__)
@@ -20,6 +22,12 @@ class CachingMiddleware(MiddlewareMixin):
             return response
 
         if getattr(request, "user", None) and request.user.is_authenticated:
+            if response.has_header("ETag"):
+                # Revalidable only by this user's browser (If-None-Match -> 304);
+                # shared caches still never store it.
+                response["Cache-Control"] = "private, no-cache"
+                patch_vary_headers(response, ("Cookie", "Authorization"))
+                return response
             response["Cache-Control"] = "private, no-store"
             response["Pragma"] = "no-cache"
             response["Expires"] = "0"
@@ -35,6 +43,19 @@ class CachingMiddleware(MiddlewareMixin):
         return response
 
 
+class GZipMiddleware(DjangoGZipMiddleware):
+    """GZip that leaves server-sent event streams alone.
+
+    Async streams are compressed chunk by chunk into separate gzip members,
+    which some browsers stop decoding after the first event.
+    """
+
+    def process_response(self, request, response):
+        if response.get("Content-Type", "").startswith("text/event-stream"):
+            return response
+        return super().process_response(request, response)
+
+
 class AdminAutoLoginMiddleware(MiddlewareMixin):
     """
     Middleware to automatically log in a specific user if configured.
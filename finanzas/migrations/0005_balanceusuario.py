@@ -0,0 +1,86 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_balances(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    Transaccion = apps.get_model("finanzas", "Transaccion")
+    BalanceUsuario = apps.get_model("finanzas", "BalanceUsuario")
+
+    totales = {}
+    filas = (
+        Transaccion.objects.values("usuario_id", "tipo")
+        .annotate(total=Sum("monto"), cantidad=Count("id"))
+        .order_by()
+    )
+    for fila in filas:
+        actual = totales.setdefault(fila["usuario_id"], {"ingreso": 0, "gasto": 0, "cantidad": 0})
+        actual[fila["tipo"]] = fila["total"] or 0
+        actual["cantidad"] += fila["cantidad"]
+
+    BalanceUsuario.objects.bulk_create(
+        [
+            BalanceUsuario(
+                usuario_id=usuario_id,
+                ingresos=actual["ingreso"],
+                gastos=actual["gasto"],
+                balance=actual["ingreso"] - actual["gasto"],
+                num_transacciones=actual["cantidad"],
+            )
+            for usuario_id, actual in totales.items()
+        ],
+        batch_size=500,
+    )
+    sin_movimientos = User.objects.exclude(
+        id__in=Transaccion.objects.values("usuario_id")
+    ).values_list("id", flat=True)
+    BalanceUsuario.objects.bulk_create(
+        [BalanceUsuario(usuario_id=usuario_id) for usuario_id in sin_movimientos],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('finanzas', '0004_alter_perfilusuario_options'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceUsuario',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name='ID'
+                    ),
+                ),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('gastos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('num_transacciones', models.PositiveIntegerField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                (
+                    'usuario',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='balance',
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Balance de Usuario',
+                'verbose_name_plural': 'Balances de Usuario',
+            },
+        ),
+        migrations.RunPython(
+            code=backfill_balances,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
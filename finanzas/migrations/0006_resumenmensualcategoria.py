@@ -0,0 +1,81 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def backfill_resumenes(apps, schema_editor):
+    Transaccion = apps.get_model("finanzas", "Transaccion")
+    ResumenMensualCategoria = apps.get_model("finanzas", "ResumenMensualCategoria")
+
+    filas = (
+        Transaccion.objects.annotate(año=ExtractYear("fecha"), mes=ExtractMonth("fecha"))
+        .values("usuario_id", "año", "mes", "categoria_id", "tipo")
+        .annotate(total=Sum("monto"), num_transacciones=Count("id"))
+        .order_by()
+    )
+    ResumenMensualCategoria.objects.bulk_create(
+        (ResumenMensualCategoria(**fila) for fila in filas.iterator()),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('finanzas', '0005_balanceusuario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenMensualCategoria',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name='ID'
+                    ),
+                ),
+                ('año', models.IntegerField()),
+                ('mes', models.IntegerField()),
+                (
+                    'tipo',
+                    models.CharField(
+                        choices=[('ingreso', 'Ingreso'), ('gasto', 'Gasto')], max_length=10
+                    ),
+                ),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('num_transacciones', models.IntegerField(default=0)),
+                (
+                    'categoria',
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='resumenes_mensuales',
+                        to='finanzas.categoria',
+                    ),
+                ),
+                (
+                    'usuario',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='resumenes_mensuales',
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Resumen Mensual por Categoría',
+                'verbose_name_plural': 'Resúmenes Mensuales por Categoría',
+                'ordering': ['-año', '-mes', 'tipo', '-total'],
+                'unique_together': {('usuario', 'año', 'mes', 'categoria', 'tipo')},
+            },
+        ),
+        migrations.RunPython(
+            code=backfill_resumenes,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
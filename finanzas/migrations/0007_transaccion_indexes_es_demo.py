@@ -0,0 +1,67 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_demo_transactions(apps, schema_editor):
+    Transaccion = apps.get_model("finanzas", "Transaccion")
+    Transaccion.objects.filter(descripcion__startswith="[DEMO]").update(es_demo=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('finanzas', '0006_resumenmensualcategoria'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaccion',
+            name='es_demo',
+            field=models.BooleanField(
+                default=False, help_text='Transacción generada por la carga de datos demo'
+            ),
+        ),
+        migrations.RunPython(
+            code=mark_demo_transactions,
+            reverse_code=migrations.RunPython.noop,
+        ),
+        migrations.AddIndex(
+            model_name='transaccion',
+            index=models.Index(fields=['usuario', '-fecha'], name='transaccion_usr_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaccion',
+            index=models.Index(
+                fields=['usuario', 'tipo', '-fecha'], name='transaccion_usr_tipo_fecha_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='transaccion',
+            index=models.Index(
+                fields=['usuario', 'categoria', '-fecha'], name='transaccion_usr_cat_fecha_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='transaccion',
+            index=models.Index(
+                condition=models.Q(('es_demo', True)),
+                fields=['usuario'],
+                name='transaccion_usr_demo_idx',
+            ),
+        ),
+        # The single-column FK index is dropped only once the composite ones exist
+        # (MySQL requires an index that leads with the FK column).
+        migrations.AlterField(
+            model_name='transaccion',
+            name='usuario',
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='transacciones',
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
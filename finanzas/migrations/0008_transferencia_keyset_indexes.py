@@ -0,0 +1,48 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('finanzas', '0007_transaccion_indexes_es_demo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transferencia',
+            index=models.Index(
+                fields=['emisor', '-fecha_creacion', '-id'], name='transferencia_emisor_fecha_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='transferencia',
+            index=models.Index(
+                fields=['receptor', '-fecha_creacion', '-id'], name='transferencia_recep_fecha_idx'
+            ),
+        ),
+        # FK indexes are dropped only after the composite ones exist (MySQL).
+        migrations.AlterField(
+            model_name='transferencia',
+            name='emisor',
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='transferencias_enviadas',
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AlterField(
+            model_name='transferencia',
+            name='receptor',
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='transferencias_recibidas',
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.1.15 on 2026-10-18 08:01
+
+import uuid
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('finanzas', '0008_transferencia_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportacionTransacciones',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name='ID'
+                    ),
+                ),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('archivo', models.FileField(blank=True, upload_to='importaciones/')),
+                ('nombre_archivo', models.CharField(blank=True, max_length=255)),
+                (
+                    'formato',
+                    models.CharField(choices=[('csv', 'CSV'), ('ofx', 'OFX')], max_length=3),
+                ),
+                (
+                    'estado',
+                    models.CharField(
+                        choices=[
+                            ('pendiente', 'Pendiente'),
+                            ('procesando', 'Procesando'),
+                            ('completada', 'Completada'),
+                            ('fallida', 'Fallida'),
+                        ],
+                        default='pendiente',
+                        max_length=12,
+                    ),
+                ),
+                ('bytes_totales', models.PositiveBigIntegerField(default=0)),
+                ('bytes_procesados', models.PositiveBigIntegerField(default=0)),
+                ('filas_procesadas', models.PositiveIntegerField(default=0)),
+                ('filas_importadas', models.PositiveIntegerField(default=0)),
+                ('filas_con_error', models.PositiveIntegerField(default=0)),
+                ('errores', models.JSONField(blank=True, default=list)),
+                ('mensaje_error', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                (
+                    'usuario',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='importaciones',
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Importación de transacciones',
+                'verbose_name_plural': 'Importaciones de transacciones',
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+    ]
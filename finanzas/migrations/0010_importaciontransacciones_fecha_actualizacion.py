@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-18 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('finanzas', '0009_importaciontransacciones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importaciontransacciones',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 import uuid
@@ -71,20 +73,8 @@ class PerfilUsuario(models.Model):
         return f"Perfil de {self.usuario.username}"
 
     def get_balance_actual(self):
-        """Calcula el balance actual (ingresos - gastos)."""
-        from django.db.models import Sum
-
-        ingresos = Transaccion.objects.filter(
-            usuario=self.usuario,
-            tipo='ingreso'
-        ).aggregate(total=Sum('monto'))['total'] or 0
-
-        gastos = Transaccion.objects.filter(
-            usuario=self.usuario,
-            tipo='gasto'
-        ).aggregate(total=Sum('monto'))['total'] or 0
-
-        return ingresos - gastos
+        """Devuelve el balance actual (ingresos - gastos) desde el ledger del usuario."""
+        return BalanceUsuario.para_usuario(self.usuario_id).balance
 
 
 # ── Transaccion ─────────────────────────────────────────────────────────────
@@ -95,7 +85,10 @@ class Transaccion(models.Model):
         ('gasto', 'Gasto'),
     ]
 
-    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transacciones')
+    # Sin índice propio: lo cubren los índices compuestos que empiezan por usuario.
+    usuario = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='transacciones', db_index=False
+    )
     fecha = models.DateTimeField(default=timezone.now)
     monto = models.DecimalField(max_digits=10, decimal_places=2)
     tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
@@ -107,6 +100,10 @@ class Transaccion(models.Model):
         upload_to='comprobantes/', blank=True, null=True,
         help_text="Recibo o comprobante de la transacción"
     )
+    es_demo = models.BooleanField(
+        default=False,
+        help_text="Transacción generada por la carga de datos demo"
+    )
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
@@ -114,6 +111,24 @@ class Transaccion(models.Model):
         verbose_name = "Transacción"
         verbose_name_plural = "Transacciones"
         ordering = ['-fecha']
+        indexes = [
+            # Listados, últimas N transacciones y rangos de fecha por usuario.
+            models.Index(fields=['usuario', '-fecha'], name='transaccion_usr_fecha_idx'),
+            # Filtros por tipo (totales, listado filtrado) ordenados por fecha.
+            models.Index(
+                fields=['usuario', 'tipo', '-fecha'], name='transaccion_usr_tipo_fecha_idx'
+            ),
+            # Filtros por categoría (listado filtrado, presupuestos).
+            models.Index(
+                fields=['usuario', 'categoria', '-fecha'], name='transaccion_usr_cat_fecha_idx'
+            ),
+            # Índice parcial: solo las filas demo, para el chequeo del dashboard.
+            models.Index(
+                fields=['usuario'],
+                condition=models.Q(es_demo=True),
+                name='transaccion_usr_demo_idx',
+            ),
+        ]
         constraints = [
             models.CheckConstraint(
                 check=models.Q(monto__gt=0),
@@ -124,6 +139,48 @@ class Transaccion(models.Model):
     def __str__(self):
         return f"{self.tipo.capitalize()} - {self.monto} - {self.fecha.strftime('%d/%m/%Y')}"
 
+    def save(self, *args, **kwargs):
+        """Guarda la transacción y ajusta los agregados del usuario en la misma transacción."""
+        with transaction.atomic():
+            previo = None
+            if not self._state.adding and self.pk is not None:
+                # Bloqueada hasta el commit: una edición concurrente de la misma fila
+                # espera y lee el valor ya guardado, así no se resta dos veces lo mismo.
+                previo = (
+                    Transaccion.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .only('usuario', 'tipo', 'monto', 'fecha', 'categoria')
+                    .first()
+                )
+
+            super().save(*args, **kwargs)
+
+            if previo is not None:
+                previo.ajustar_agregados(signo=-1)
+            self.ajustar_agregados(signo=1)
+
+    def ajustar_agregados(self, signo):
+        """Suma (signo=1) o resta (signo=-1) esta transacción de los agregados materializados."""
+        monto = self._meta.get_field('monto').to_python(self.monto) * signo
+        año, mes = ResumenMensualCategoria.periodo(self.fecha)
+        BalanceUsuario.aplicar_delta(self.usuario_id, self.tipo, monto, filas=signo)
+        ResumenMensualCategoria.aplicar_delta(
+            self.usuario_id, self.categoria_id, año, mes, self.tipo, monto, filas=signo
+        )
+
+    @staticmethod
+    def ajustar_agregados_lote(transacciones):
+        """
+        Refleja en los agregados un lote de transacciones creadas con bulk_create
+        (que no emite signals) e invalida la caché de los usuarios afectados.
+        """
+        from finanzas.cache import incrementar_version
+
+        with transaction.atomic():
+            BalanceUsuario.registrar_lote(transacciones)
+            ResumenMensualCategoria.registrar_lote(transacciones)
+            incrementar_version(*{tx.usuario_id for tx in transacciones})
+
     def get_absolute_url(self):
         from django.urls import reverse
         return reverse('finanzas:detalle_transaccion', args=[str(self.id)])
@@ -137,6 +194,245 @@ class Transaccion(models.Model):
         return self.tipo == 'ingreso'
 
 
+# ── BalanceUsuario ──────────────────────────────────────────────────────────
+
+class BalanceUsuario(models.Model):
+    """
+    Ledger materializado por usuario: totales de ingresos, gastos y número de
+    transacciones. Se ajusta de forma incremental en cada alta, edición o baja
+    de una Transaccion, de modo que leer el balance no depende del historial.
+    """
+
+    usuario = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='balance'
+    )
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    gastos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    num_transacciones = models.PositiveIntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Balance de Usuario"
+        verbose_name_plural = "Balances de Usuario"
+
+    def __str__(self):
+        return f"Balance de {self.usuario_id}: {self.balance}"
+
+    @staticmethod
+    def calcular_totales(usuario_id):
+        """Recalcula los totales del usuario a partir de las filas de Transaccion."""
+        from django.db.models import Count, Sum
+
+        totales = {
+            'ingresos': Decimal('0'),
+            'gastos': Decimal('0'),
+            'num_transacciones': 0,
+        }
+        filas = (
+            Transaccion.objects.filter(usuario_id=usuario_id)
+            .values('tipo')
+            .annotate(total=Sum('monto'), cantidad=Count('id'))
+            .order_by('tipo')
+        )
+        for fila in filas:
+            if fila['tipo'] == 'ingreso':
+                totales['ingresos'] = fila['total'] or Decimal('0')
+            elif fila['tipo'] == 'gasto':
+                totales['gastos'] = fila['total'] or Decimal('0')
+            totales['num_transacciones'] += fila['cantidad']
+        totales['balance'] = totales['ingresos'] - totales['gastos']
+        return totales
+
+    @classmethod
+    def reconstruir(cls, usuario_id):
+        """Reconstruye el ledger del usuario desde las filas de Transaccion."""
+        with transaction.atomic():
+            ledger, _ = cls.objects.update_or_create(
+                usuario_id=usuario_id,
+                defaults=cls.calcular_totales(usuario_id),
+            )
+        return ledger
+
+    @classmethod
+    def para_usuario(cls, usuario_id):
+        """Devuelve el ledger del usuario, construyéndolo si todavía no existe."""
+        ledger = cls.objects.filter(usuario_id=usuario_id).first()
+        if ledger is None:
+            ledger = cls.reconstruir(usuario_id)
+        return ledger
+
+    @classmethod
+    def aplicar_delta(cls, usuario_id, tipo, monto, filas=0):
+        """
+        Suma ``monto`` (puede ser negativo) al total del ``tipo`` indicado.
+        Si el usuario aún no tiene ledger se reconstruye desde las filas, que
+        ya incluyen el cambio en curso.
+        """
+        from django.db.models import F
+
+        ingresos = monto if tipo == 'ingreso' else Decimal('0')
+        gastos = monto if tipo == 'gasto' else Decimal('0')
+
+        actualizados = cls.objects.filter(usuario_id=usuario_id).update(
+            ingresos=F('ingresos') + ingresos,
+            gastos=F('gastos') + gastos,
+            balance=F('balance') + ingresos - gastos,
+            num_transacciones=F('num_transacciones') + filas,
+            fecha_actualizacion=timezone.now(),
+        )
+        if not actualizados and filas >= 0:
+            cls.reconstruir(usuario_id)
+
+    @classmethod
+    def registrar_lote(cls, transacciones):
+        """Aplica de una sola vez el efecto de transacciones creadas con bulk_create."""
+        campo_monto = Transaccion._meta.get_field('monto')
+        deltas = {}
+        for tx in transacciones:
+            por_tipo = deltas.setdefault(tx.usuario_id, {})
+            monto, filas = por_tipo.get(tx.tipo, (Decimal('0'), 0))
+            por_tipo[tx.tipo] = (monto + campo_monto.to_python(tx.monto), filas + 1)
+
+        with transaction.atomic():
+            con_ledger = set(
+                cls.objects.filter(usuario_id__in=deltas).values_list('usuario_id', flat=True)
+            )
+            for usuario_id, por_tipo in deltas.items():
+                if usuario_id not in con_ledger:
+                    # Las filas ya están insertadas: reconstruir las incluye todas.
+                    cls.reconstruir(usuario_id)
+                    continue
+                for tipo, (monto, filas) in por_tipo.items():
+                    cls.aplicar_delta(usuario_id, tipo, monto, filas=filas)
+
+
+# ── ResumenMensualCategoria ─────────────────────────────────────────────────
+
+class ResumenMensualCategoria(models.Model):
+    """
+    Rollup de transacciones por (usuario, año, mes, categoría, tipo), mantenido
+    de forma incremental desde las escrituras de Transaccion. El mes se calcula
+    en la zona horaria local, igual que los filtros ``fecha__date``.
+    """
+
+    usuario = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='resumenes_mensuales'
+    )
+    año = models.IntegerField()
+    mes = models.IntegerField()
+    categoria = models.ForeignKey(
+        Categoria, on_delete=models.CASCADE, null=True, related_name='resumenes_mensuales'
+    )
+    tipo = models.CharField(max_length=10, choices=Transaccion.TIPO_CHOICES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    num_transacciones = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Resumen Mensual por Categoría"
+        verbose_name_plural = "Resúmenes Mensuales por Categoría"
+        unique_together = ('usuario', 'año', 'mes', 'categoria', 'tipo')
+        ordering = ['-año', '-mes', 'tipo', '-total']
+
+    def __str__(self):
+        return (
+            f"{self.usuario_id} {self.mes}/{self.año} {self.tipo} {self.categoria_id}: {self.total}"
+        )
+
+    @staticmethod
+    def periodo(fecha):
+        """Devuelve (año, mes) de ``fecha`` en la zona horaria local."""
+        if isinstance(fecha, str):
+            fecha = Transaccion._meta.get_field('fecha').to_python(fecha)
+        if timezone.is_naive(fecha):
+            fecha = timezone.make_aware(fecha)
+        local = timezone.localtime(fecha)
+        return local.year, local.month
+
+    @classmethod
+    def aplicar_delta(cls, usuario_id, categoria_id, año, mes, tipo, monto, filas=0):
+        """Suma ``monto`` y ``filas`` (pueden ser negativos) a la fila del periodo."""
+        from django.db import IntegrityError
+        from django.db.models import F
+
+        clave = {
+            'usuario_id': usuario_id,
+            'año': año,
+            'mes': mes,
+            'categoria_id': categoria_id,
+            'tipo': tipo,
+        }
+        cambios = {
+            'total': F('total') + monto,
+            'num_transacciones': F('num_transacciones') + filas,
+        }
+        if cls.objects.filter(**clave).update(**cambios) or filas <= 0:
+            return
+
+        try:
+            with transaction.atomic():
+                cls.objects.create(**clave, total=monto, num_transacciones=filas)
+        except IntegrityError:
+            # Otra petición creó la fila en paralelo.
+            cls.objects.filter(**clave).update(**cambios)
+
+    @classmethod
+    def registrar_lote(cls, transacciones):
+        """Aplica de una sola vez el efecto de transacciones creadas con bulk_create."""
+        campo_monto = Transaccion._meta.get_field('monto')
+        deltas = {}
+        for tx in transacciones:
+            año, mes = cls.periodo(tx.fecha)
+            clave = (tx.usuario_id, tx.categoria_id, año, mes, tx.tipo)
+            monto, filas = deltas.get(clave, (Decimal('0'), 0))
+            deltas[clave] = (monto + campo_monto.to_python(tx.monto), filas + 1)
+
+        with transaction.atomic():
+            for clave, (monto, filas) in deltas.items():
+                cls.aplicar_delta(*clave, monto, filas=filas)
+
+    @classmethod
+    def reasignar_a_sin_categoria(cls, categoria_id):
+        """
+        Mueve los totales de una categoría que se va a borrar a la fila sin
+        categoría, igual que Transaccion.categoria (SET_NULL).
+        """
+        with transaction.atomic():
+            filas = list(cls.objects.filter(categoria_id=categoria_id))
+            for fila in filas:
+                cls.aplicar_delta(
+                    fila.usuario_id, None, fila.año, fila.mes, fila.tipo,
+                    fila.total, filas=fila.num_transacciones,
+                )
+            cls.objects.filter(categoria_id=categoria_id).delete()
+
+    @staticmethod
+    def calcular_filas(usuario_id):
+        """Recalcula el rollup del usuario a partir de las filas de Transaccion."""
+        from django.db.models import Count, Sum
+        from django.db.models.functions import ExtractMonth, ExtractYear
+
+        return list(
+            Transaccion.objects.filter(usuario_id=usuario_id)
+            .annotate(año=ExtractYear('fecha'), mes=ExtractMonth('fecha'))
+            .values('año', 'mes', 'categoria_id', 'tipo')
+            .annotate(total=Sum('monto'), num_transacciones=Count('id'))
+            .order_by()
+        )
+
+    @classmethod
+    def reconstruir(cls, usuario_id):
+        """Reconstruye el rollup del usuario desde las filas de Transaccion."""
+        with transaction.atomic():
+            cls.objects.filter(usuario_id=usuario_id).delete()
+            cls.objects.bulk_create(
+                [cls(usuario_id=usuario_id, **fila) for fila in cls.calcular_filas(usuario_id)],
+                batch_size=500,
+            )
+
+
 # ── Transferencia ───────────────────────────────────────────────────────────
 
 class Transferencia(models.Model):
@@ -151,11 +447,12 @@ class Transferencia(models.Model):
         default=uuid.uuid4, editable=False, unique=True,
         help_text="Identificador único para tracking de la transferencia"
     )
+    # Sin índice propio: lo cubren los índices (usuario, -fecha_creacion) de Meta.
     emisor = models.ForeignKey(
-        User, on_delete=models.CASCADE, related_name='transferencias_enviadas'
+        User, on_delete=models.CASCADE, related_name='transferencias_enviadas', db_index=False
     )
     receptor = models.ForeignKey(
-        User, on_delete=models.CASCADE, related_name='transferencias_recibidas'
+        User, on_delete=models.CASCADE, related_name='transferencias_recibidas', db_index=False
     )
     monto = models.DecimalField(max_digits=10, decimal_places=2)
     concepto = models.CharField(max_length=255, blank=True)
@@ -179,6 +476,15 @@ class Transferencia(models.Model):
         verbose_name = "Transferencia"
         verbose_name_plural = "Transferencias"
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Listados paginados por keyset (fecha_creacion, id) de enviadas/recibidas.
+            models.Index(
+                fields=['emisor', '-fecha_creacion', '-id'], name='transferencia_emisor_fecha_idx'
+            ),
+            models.Index(
+                fields=['receptor', '-fecha_creacion', '-id'], name='transferencia_recep_fecha_idx'
+            ),
+        ]
         constraints = [
             models.CheckConstraint(
                 check=models.Q(monto__gt=0),
@@ -224,6 +530,26 @@ class Transferencia(models.Model):
 
 # ── Presupuesto ─────────────────────────────────────────────────────────────
 
+class PresupuestoQuerySet(models.QuerySet):
+    def con_gasto_actual(self):
+        """Anota ``gasto_mes`` leyendo el rollup mensual en la misma consulta."""
+        from django.db.models import OuterRef, Subquery, Value
+        from django.db.models.functions import Coalesce
+
+        gasto = ResumenMensualCategoria.objects.filter(
+            usuario_id=OuterRef('usuario_id'),
+            categoria_id=OuterRef('categoria_id'),
+            año=OuterRef('año'),
+            mes=OuterRef('mes'),
+            tipo='gasto',
+        ).values('total')[:1]
+        campo = models.DecimalField(max_digits=14, decimal_places=2)
+        return self.annotate(
+            gasto_mes=Coalesce(Subquery(gasto, output_field=campo), Value(Decimal('0')),
+                               output_field=campo)
+        )
+
+
 class Presupuesto(models.Model):
     usuario = models.ForeignKey(
         User, on_delete=models.CASCADE, related_name='presupuestos'
@@ -243,6 +569,8 @@ class Presupuesto(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
+    objects = PresupuestoQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Presupuesto"
         verbose_name_plural = "Presupuestos"
@@ -257,25 +585,23 @@ class Presupuesto(models.Model):
         return reverse('finanzas:detalle_presupuesto', args=[str(self.id)])
 
     def get_gasto_actual(self):
-        """Calcula el gasto actual para esta categoría en el mes/año especificado."""
-        import datetime
-        from django.db.models import Sum
-
-        primer_dia = datetime.date(self.año, self.mes, 1)
-        if self.mes == 12:
-            ultimo_dia = datetime.date(self.año + 1, 1, 1) - datetime.timedelta(days=1)
-        else:
-            ultimo_dia = datetime.date(self.año, self.mes + 1, 1) - datetime.timedelta(days=1)
-
-        gasto = Transaccion.objects.filter(
-            usuario=self.usuario,
-            categoria=self.categoria,
-            tipo='gasto',
-            fecha__date__gte=primer_dia,
-            fecha__date__lte=ultimo_dia
-        ).aggregate(total=Sum('monto'))['total'] or 0
-
-        return gasto
+        """
+        Devuelve el gasto de esta categoría en el mes/año del presupuesto.
+        Usa la anotación de ``con_gasto_actual()`` si está disponible; si no,
+        lee la fila correspondiente del rollup mensual.
+        """
+        if not hasattr(self, 'gasto_mes'):
+            self.gasto_mes = (
+                ResumenMensualCategoria.objects.filter(
+                    usuario_id=self.usuario_id,
+                    categoria_id=self.categoria_id,
+                    año=self.año,
+                    mes=self.mes,
+                    tipo='gasto',
+                ).values_list('total', flat=True).first()
+                or Decimal('0')
+            )
+        return self.gasto_mes
 
     def get_porcentaje_usado(self):
         """Devuelve el porcentaje del presupuesto que ya se ha gastado."""
@@ -288,3 +614,65 @@ class Presupuesto(models.Model):
     def esta_excedido(self):
         """Indica si el presupuesto se ha excedido."""
         return self.get_gasto_actual() > self.monto_maximo
+
+
+# ── ImportacionTransacciones ────────────────────────────────────────────────
+
+class ImportacionTransacciones(models.Model):
+    """Estado y progreso de una importación masiva de extractos bancarios."""
+
+    FORMATO_CHOICES = [
+        ('csv', 'CSV'),
+        ('ofx', 'OFX'),
+    ]
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completada', 'Completada'),
+        ('fallida', 'Fallida'),
+    ]
+    # Tope de errores por fila que se guardan; el resto solo se cuenta.
+    MAX_ERRORES = 100
+
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    usuario = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='importaciones'
+    )
+    archivo = models.FileField(upload_to='importaciones/', blank=True)
+    nombre_archivo = models.CharField(max_length=255, blank=True)
+    formato = models.CharField(max_length=3, choices=FORMATO_CHOICES)
+    estado = models.CharField(max_length=12, choices=ESTADO_CHOICES, default='pendiente')
+    bytes_totales = models.PositiveBigIntegerField(default=0)
+    bytes_procesados = models.PositiveBigIntegerField(default=0)
+    filas_procesadas = models.PositiveIntegerField(default=0)
+    filas_importadas = models.PositiveIntegerField(default=0)
+    filas_con_error = models.PositiveIntegerField(default=0)
+    errores = models.JSONField(default=list, blank=True)
+    mensaje_error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    # Se renueva con cada lote: una importación 'procesando' que no avanza se da por abandonada.
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Importación de transacciones"
+        verbose_name_plural = "Importaciones de transacciones"
+        ordering = ['-fecha_creacion']
+
+    def __str__(self):
+        return f"Importación {self.nombre_archivo or self.uuid} ({self.get_estado_display()})"
+
+    @property
+    def porcentaje(self):
+        """Avance estimado según los bytes del archivo ya leídos."""
+        if self.estado == 'completada':
+            return 100
+        if not self.bytes_totales:
+            return 0
+        return min(99, int(self.bytes_procesados * 100 / self.bytes_totales))
+
+    def registrar_error(self, fila, mensaje):
+        self.filas_con_error += 1
+        if len(self.errores) < self.MAX_ERRORES:
+            self.errores.append({'fila': fila, 'error': mensaje})
@@ -0,0 +1,86 @@
+"""Paginación keyset (cursor) sobre (fecha, id) descendente, sin COUNT(*)."""
+
+import base64
+import binascii
+import heapq
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class CursorInvalido(ValueError):
+    """El cursor recibido no se pudo decodificar."""
+
+
+def codificar_cursor(fecha, pk):
+    crudo = f"{fecha.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (fecha, pk) a partir de un cursor generado por ``codificar_cursor``."""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        crudo = base64.urlsafe_b64decode(cursor + relleno).decode()
+        fecha_txt, pk_txt = crudo.rsplit("|", 1)
+        fecha = parse_datetime(fecha_txt)
+        pk = int(pk_txt)
+    except (ValueError, UnicodeDecodeError, binascii.Error) as exc:
+        raise CursorInvalido(cursor) from exc
+
+    if fecha is None:
+        raise CursorInvalido(cursor)
+    return fecha, pk
+
+
+def _despues_del_cursor(queryset, cursor, campo_fecha):
+    queryset = queryset.order_by(f"-{campo_fecha}", "-id")
+    if not cursor:
+        return queryset
+    fecha, pk = decodificar_cursor(cursor)
+    return queryset.filter(
+        Q(**{f"{campo_fecha}__lt": fecha}) | Q(**{campo_fecha: fecha, "id__lt": pk})
+    )
+
+
+def _cortar(filas, tamaño, campo_fecha):
+    siguiente = None
+    if len(filas) > tamaño:
+        filas = filas[:tamaño]
+        ultima = filas[-1]
+        siguiente = codificar_cursor(getattr(ultima, campo_fecha), ultima.pk)
+    return filas, siguiente
+
+
+def paginar_keyset(queryset, cursor=None, tamaño=50, campo_fecha="fecha"):
+    """
+    Ordena por (campo_fecha, id) descendente y devuelve ``(filas, siguiente_cursor)``.
+
+    La página se obtiene con un rango sobre el índice en lugar de un OFFSET, así
+    que leer la página N cuesta lo mismo que la primera. Se pide una fila extra
+    para saber si hay más páginas; ``siguiente_cursor`` es None en la última.
+    """
+    queryset = _despues_del_cursor(queryset, cursor, campo_fecha)
+    return _cortar(list(queryset[: tamaño + 1]), tamaño, campo_fecha)
+
+
+def paginar_keyset_union(querysets, cursor=None, tamaño=50, campo_fecha="fecha"):
+    """
+    ``paginar_keyset`` para la unión de varios querysets (p. ej. transferencias
+    enviadas o recibidas), que un solo rango de índice no puede servir si se
+    filtra con un OR. Cada queryset se lee por separado, con su propio índice y
+    ``LIMIT tamaño + 1``, y las filas se mezclan ya ordenadas, sin duplicados.
+    """
+    partes = [
+        list(_despues_del_cursor(queryset, cursor, campo_fecha)[: tamaño + 1])
+        for queryset in querysets
+    ]
+    filas = []
+    vistas = set()
+    for fila in heapq.merge(
+        *partes, key=lambda fila: (getattr(fila, campo_fecha), fila.pk), reverse=True
+    ):
+        if fila.pk not in vistas:
+            vistas.add(fila.pk)
+            filas.append(fila)
+    return _cortar(filas, tamaño, campo_fecha)
@@ -1,9 +1,13 @@
 ﻿from django.conf import settings
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
 from django.utils import timezone
 
+# Enviada por finanzas.importacion tras cada lote de bulk_create (que no emite
+# post_save), con ``transacciones``: la lista de instancias ya guardadas.
+transacciones_importadas = Signal()
+
 
 @receiver(post_save, sender=User)
 def crear_categorias_por_defecto(sender, instance, created, **kwargs):
@@ -58,3 +62,45 @@ def agregar_monto_inicial(sender, instance, created, **kwargs):
         fecha=timezone.now(),
     )
 
+
+@receiver(post_delete, sender="finanzas.Transaccion")
+def descontar_transaccion_de_agregados(sender, instance, **kwargs):
+    """Revierte en el ledger y el rollup mensual el efecto de una transacción eliminada.
+
+    post_delete se emite dentro del atomic() del Collector, tanto para
+    instance.delete() como para QuerySet.delete().
+    """
+    instance.ajustar_agregados(signo=-1)
+
+
+@receiver(pre_delete, sender="finanzas.Categoria")
+def reasignar_resumenes_de_categoria(sender, instance, origin=None, **kwargs):
+    """Pasa el rollup de la categoría a 'sin categoría' antes de borrarla."""
+    from finanzas.models import Categoria, ResumenMensualCategoria
+
+    # Si se borra el usuario completo, el rollup se elimina en cascada.
+    if not (isinstance(origin, Categoria) or getattr(origin, "model", None) is Categoria):
+        return
+
+    ResumenMensualCategoria.reasignar_a_sin_categoria(instance.id)
+
+
+@receiver(post_save, sender="finanzas.Transaccion")
+@receiver(post_delete, sender="finanzas.Transaccion")
+@receiver(post_save, sender="finanzas.Categoria")
+@receiver(post_delete, sender="finanzas.Categoria")
+@receiver(post_save, sender="finanzas.Presupuesto")
+@receiver(post_delete, sender="finanzas.Presupuesto")
+def invalidar_cache_de_usuario(sender, instance, **kwargs):
+    """Cambia la versión de datos del usuario para invalidar sus cachés."""
+    from finanzas.cache import incrementar_version
+
+    incrementar_version(instance.usuario_id)
+
+
+@receiver(post_save, sender="finanzas.Transferencia")
+@receiver(post_delete, sender="finanzas.Transferencia")
+def invalidar_cache_de_transferencia(sender, instance, **kwargs):
+    from finanzas.cache import incrementar_version
+
+    incrementar_version(instance.emisor_id, instance.receptor_id)
@@ -1,11 +1,37 @@
+import csv
+import importlib
+import importlib.util
+import json
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db import IntegrityError
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 from finanzas.forms import TransferenciaForm
-from finanzas.models import Categoria, Transferencia, Transaccion
+from finanzas.models import (
+    BalanceUsuario,
+    Categoria,
+    ImportacionTransacciones,
+    PerfilUsuario,
+    Presupuesto,
+    ResumenMensualCategoria,
+    Transaccion,
+    Transferencia,
+)
 
 
 class SecurityAndTransferTests(TestCase):
@@ -185,3 +211,1479 @@ class TransaccionTests(TestCase):
         # Si el form valida, debería volver a mostrar el formulario con errores (status 200), no redirigir
         self.assertEqual(response.status_code, 200) 
         self.assertFalse(Transaccion.objects.filter(descripcion="Gasto invalido").exists())
+
+
+class BalanceUsuarioTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="carol", password="password123")
+        self.categoria_ingreso = Categoria.objects.get(
+            usuario=self.user, tipo="ingreso", nombre="Salario"
+        )
+        self.categoria_gasto = Categoria.objects.get(
+            usuario=self.user, tipo="gasto", nombre="Compras"
+        )
+
+    def _ledger(self):
+        return BalanceUsuario.objects.get(usuario=self.user)
+
+    def test_ledger_follows_create_edit_and_delete(self):
+        ingreso = Transaccion.objects.create(
+            usuario=self.user, tipo="ingreso", monto=1000, categoria=self.categoria_ingreso
+        )
+        gasto = Transaccion.objects.create(
+            usuario=self.user, tipo="gasto", monto="150.50", categoria=self.categoria_gasto
+        )
+        ledger = self._ledger()
+        self.assertEqual(ledger.ingresos, Decimal("1000.00"))
+        self.assertEqual(ledger.gastos, Decimal("150.50"))
+        self.assertEqual(ledger.balance, Decimal("849.50"))
+        self.assertEqual(ledger.num_transacciones, 2)
+
+        gasto.monto = Decimal("200.00")
+        gasto.save()
+        self.assertEqual(self._ledger().balance, Decimal("800.00"))
+
+        ingreso.delete()
+        ledger = self._ledger()
+        self.assertEqual(ledger.ingresos, Decimal("0.00"))
+        self.assertEqual(ledger.balance, Decimal("-200.00"))
+        self.assertEqual(ledger.num_transacciones, 1)
+        perfil = PerfilUsuario.objects.create(usuario=self.user)
+        self.assertEqual(perfil.get_balance_actual(), Decimal("-200.00"))
+
+    def test_bulk_created_demo_data_is_reflected_in_dashboard(self):
+        self.client.login(username="carol", password="password123")
+        self.client.post(reverse("finanzas:cargar_datos_demo"))
+
+        payload = self.client.get(reverse("finanzas:dashboard_data_api")).json()
+        self.assertTrue(payload["tiene_datos_demo"])
+        esperado = BalanceUsuario.calcular_totales(self.user.id)
+        self.assertEqual(payload["balance"], float(esperado["balance"]))
+        self.assertEqual(self._ledger().num_transacciones, esperado["num_transacciones"])
+
+    def test_demo_flag_ignores_description_prefix(self):
+        Transaccion.objects.create(
+            usuario=self.user, tipo="gasto", monto=5, descripcion="[DEMO] escrito a mano"
+        )
+        self.client.login(username="carol", password="password123")
+
+        payload = self.client.get(reverse("finanzas:dashboard_data_api")).json()
+        self.assertFalse(payload["tiene_datos_demo"])
+
+    def test_api_transfer_uses_ledger_balance(self):
+        receptor = User.objects.create_user(username="dave", password="password123")
+        Transaccion.objects.create(
+            usuario=self.user, tipo="ingreso", monto=100, categoria=self.categoria_ingreso
+        )
+        self.client.login(username="carol", password="password123")
+
+        response = self.client.post(
+            "/api/v1/transfers",
+            {"receptor_username": "dave", "monto": "150.00"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(
+            "/api/v1/transfers",
+            {"receptor_username": "dave", "monto": "60.00"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self._ledger().balance, Decimal("40.00"))
+        self.assertEqual(BalanceUsuario.objects.get(usuario=receptor).balance, Decimal("60.00"))
+
+    def test_reconstruir_balances_repairs_drift(self):
+        Transaccion.objects.create(
+            usuario=self.user, tipo="ingreso", monto=500, categoria=self.categoria_ingreso
+        )
+        BalanceUsuario.objects.filter(usuario=self.user).update(balance=0, ingresos=0)
+
+        with self.assertRaises(CommandError):
+            call_command("reconstruir_balances", "--verificar", stdout=StringIO())
+
+        call_command("reconstruir_balances", stdout=StringIO())
+        self.assertEqual(self._ledger().balance, Decimal("500.00"))
+        call_command("reconstruir_balances", "--verificar", stdout=StringIO())
+
+
+class ResumenMensualCategoriaTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="erin", password="password123")
+        self.comida = Categoria.objects.create(usuario=self.user, nombre="Comida", tipo="gasto")
+        self.ocio = Categoria.objects.create(usuario=self.user, nombre="Ocio", tipo="gasto")
+        hoy = timezone.localdate()
+        self.presupuestos = [
+            Presupuesto.objects.create(
+                usuario=self.user,
+                categoria=categoria,
+                mes=hoy.month,
+                año=hoy.year,
+                monto_maximo=100,
+            )
+            for categoria in (self.comida, self.ocio)
+        ]
+
+    def test_budget_spending_follows_writes(self):
+        gasto = Transaccion.objects.create(
+            usuario=self.user, tipo="gasto", monto=80, categoria=self.comida
+        )
+        Transaccion.objects.create(usuario=self.user, tipo="gasto", monto=30, categoria=self.comida)
+
+        presupuesto = Presupuesto.objects.get(pk=self.presupuestos[0].pk)
+        self.assertEqual(presupuesto.get_gasto_actual(), Decimal("110.00"))
+        self.assertTrue(presupuesto.esta_excedido)
+
+        gasto.categoria = self.ocio
+        gasto.save()
+        presupuestos = {
+            p.categoria_id: p
+            for p in Presupuesto.objects.filter(usuario=self.user).con_gasto_actual()
+        }
+        self.assertEqual(presupuestos[self.comida.id].get_gasto_actual(), Decimal("30.00"))
+        self.assertEqual(presupuestos[self.ocio.id].get_porcentaje_usado(), 80)
+
+    def test_budget_status_for_month_is_a_single_query(self):
+        for categoria in (self.comida, self.ocio):
+            Transaccion.objects.create(
+                usuario=self.user, tipo="gasto", monto=10, categoria=categoria
+            )
+
+        with self.assertNumQueries(1):
+            presupuestos = list(Presupuesto.objects.filter(usuario=self.user).con_gasto_actual())
+            for presupuesto in presupuestos:
+                presupuesto.get_gasto_actual()
+                presupuesto.get_porcentaje_usado()
+                self.assertFalse(presupuesto.esta_excedido)
+
+    def test_deleting_category_moves_rollup_to_uncategorized(self):
+        Transaccion.objects.create(usuario=self.user, tipo="gasto", monto=40, categoria=self.ocio)
+        self.ocio.delete()
+
+        call_command("reconstruir_balances", "--verificar", stdout=StringIO())
+        fila = ResumenMensualCategoria.objects.get(usuario=self.user, categoria=None, tipo="gasto")
+        self.assertEqual(fila.total, Decimal("40.00"))
+
+
+@override_settings(LIST_PAGE_SIZE=2)
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="frank", password="password123")
+        self.client.login(username="frank", password="password123")
+        self.categoria = Categoria.objects.get(usuario=self.user, tipo="gasto", nombre="Compras")
+        misma_fecha = timezone.now()
+        # Cinco filas con la misma fecha: el desempate por id debe mantener el orden estable.
+        self.ids = [
+            Transaccion.objects.create(
+                usuario=self.user,
+                tipo="gasto",
+                monto=10 + i,
+                categoria=self.categoria,
+                fecha=misma_fecha,
+            ).id
+            for i in range(5)
+        ]
+
+    def test_html_list_walks_all_pages_without_duplicates(self):
+        vistos = []
+        url = reverse("finanzas:lista_transacciones") + "?tipo=gasto"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            vistos.extend(t.id for t in response.context["transacciones"])
+            url = response.context["siguiente_url"]
+            if url:
+                self.assertIn("tipo=gasto", url)
+
+        self.assertEqual(vistos, sorted(self.ids, reverse=True))
+
+    def test_api_transactions_follow_next_links(self):
+        vistos = []
+        url = "/api/v1/transactions"
+        while url:
+            payload = self.client.get(url).json()
+            vistos.extend(row["id"] for row in payload["results"])
+            url = payload["next"]
+
+        self.assertEqual(vistos, sorted(self.ids, reverse=True))
+
+    def test_api_rejects_invalid_cursor(self):
+        response = self.client.get("/api/v1/transactions?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+    def test_api_transfers_are_paginated(self):
+        other = User.objects.create_user(username="gina", password="password123")
+        for _ in range(3):
+            Transferencia.objects.create(emisor=self.user, receptor=other, monto=1)
+
+        payload = self.client.get("/api/v1/transfers").json()
+        self.assertEqual(len(payload["results"]), 2)
+        self.assertIsNotNone(payload["next"])
+        payload = self.client.get(payload["next"]).json()
+        self.assertEqual(len(payload["results"]), 1)
+        self.assertIsNone(payload["next"])
+
+    def test_transferencias_enviadas_y_recibidas_se_mezclan_en_orden(self):
+        otro = User.objects.create_user(username="gina", password="password123")
+        misma_fecha = timezone.now()
+        for numero in range(5):
+            emisor, receptor = (self.user, otro) if numero % 2 else (otro, self.user)
+            transferencia = Transferencia.objects.create(emisor=emisor, receptor=receptor, monto=1)
+            # Dos con la misma fecha: el desempate por id también cruza las dos consultas.
+            fecha = misma_fecha if numero in (2, 3) else misma_fecha - timedelta(minutes=numero)
+            Transferencia.objects.filter(pk=transferencia.pk).update(fecha_creacion=fecha)
+        esperado = [
+            str(t.uuid) for t in Transferencia.objects.order_by("-fecha_creacion", "-id")
+        ]
+
+        vistos = []
+        url = "/api/v1/transfers"
+        while url:
+            payload = self.client.get(url).json()
+            vistos.extend(row["uuid"] for row in payload["results"])
+            url = payload["next"]
+        self.assertEqual(vistos, esperado)
+
+        # Sesión, usuario y una página por índice (enviadas, recibidas); ningún COUNT.
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("finanzas:lista_transferencias"))
+        self.assertEqual(len(response.context["transferencias"]), 2)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    SHARED_CACHE=True,
+)
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="hank", password="password123", is_staff=True)
+        self.client.login(username="hank", password="password123")
+        self.categoria = Categoria.objects.get(usuario=self.user, tipo="ingreso", nombre="Salario")
+
+    def test_unchanged_poll_skips_database(self):
+        url = reverse("finanzas:dashboard_data_api")
+        self.client.get(url)
+
+        # Solo sesión y usuario; el payload sale de la caché.
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_sin_cache_compartida_no_se_reutiliza_el_payload(self):
+        # Con LocMem por proceso otro worker no vería la nueva versión.
+        url = reverse("finanzas:dashboard_data_api")
+        self.client.get(url)
+        with self.assertNumQueries(5):
+            self.client.get(url)
+
+    def test_write_bumps_version_and_refreshes_payload(self):
+        url = reverse("finanzas:dashboard_data_api")
+        self.assertEqual(self.client.get(url).json()["balance"], 0.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaccion.objects.create(
+                usuario=self.user, tipo="ingreso", monto=75, categoria=self.categoria
+            )
+
+        self.assertEqual(self.client.get(url).json()["balance"], 75.0)
+
+    def test_hit_and_miss_counters_are_exposed_to_staff(self):
+        url = reverse("finanzas:dashboard_data_api")
+        self.client.get(url)
+        self.client.get(url)
+
+        metricas = self.client.get("/health/metrics/").json()["metrics"]
+        self.assertEqual(metricas["dashboard_cache.misses"], 1)
+        self.assertEqual(metricas["dashboard_cache.hits"], 1)
+
+        self.client.logout()
+        self.assertEqual(self.client.get("/health/metrics/").status_code, 403)
+
+    def test_dashboard_endpoints_answer_304_when_unchanged(self):
+        for url in (reverse("finanzas:dashboard_data_api"), "/api/v1/dashboard/summary"):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Cache-Control"], "private, no-cache")
+            etag = response["ETag"]
+
+            with self.assertNumQueries(2):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Transaccion.objects.create(
+                    usuario=self.user, tipo="ingreso", monto=5, categoria=self.categoria
+                )
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response["ETag"], etag)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_sin_cache_compartida_no_hay_etag(self):
+        for url in (reverse("finanzas:dashboard_data_api"), "/api/v1/dashboard/summary"):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH='"dash-1-1-1"')
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("ETag", response)
+
+    def test_demo_data_api_supports_etag(self):
+        self.client.logout()
+        etag = self.client.get(reverse("finanzas:demo_data_api"))["ETag"]
+        response = self.client.get(reverse("finanzas:demo_data_api"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_dashboard_stream_falls_back_to_polling_under_wsgi(self):
+        response = self.client.get(reverse("finanzas:dashboard_stream"))
+        self.assertEqual(response.status_code, 204)
+
+        self.client.logout()
+        response = self.client.get(reverse("finanzas:dashboard_stream"))
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(SHARED_CACHE=False)
+    async def test_sin_cache_compartida_el_stream_vuelve_al_polling(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse("finanzas:dashboard_stream"))
+        self.assertEqual(response.status_code, 204)
+
+    @override_settings(DASHBOARD_SSE_POLL_SECONDS=0, DASHBOARD_SSE_KEEPALIVE_SECONDS=0)
+    async def test_dashboard_stream_pushes_only_on_change(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse("finanzas:dashboard_stream"))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertNotIn("Content-Encoding", response)
+        eventos = aiter(response.streaming_content)
+
+        self.assertTrue((await anext(eventos)).startswith(b"retry: "))
+        primero = await anext(eventos)
+        self.assertIn(b"event: dashboard", primero)
+        self.assertIn(b'"balance": 0.0', primero)
+        # Sin cambios solo llegan keep-alives.
+        self.assertEqual(await anext(eventos), b": keep-alive\n\n")
+
+        await Transaccion.objects.acreate(
+            usuario=self.user, tipo="ingreso", monto=40, categoria=self.categoria
+        )
+        # TestCase nunca confirma la transacción: se aplica el on_commit a mano.
+        await cache.aincr(f"finanzas:data_version:{self.user.id}")
+        evento = await anext(eventos)
+        while evento == b": keep-alive\n\n":
+            evento = await anext(eventos)
+        self.assertIn(b'"balance": 40.0', evento)
+        await sync_to_async(response.close)()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImportacionTransaccionesTests(TestCase):
+    CSV = (
+        "Fecha;Concepto;Importe;Categoria\n"
+        "05/01/2024;Nomina enero;1.500,00;Salario\n"
+        "06/01/2024;Supermercado;-45,10;Comida\n"
+        "07/01/2024;Cine;-12,00;Comida\n"
+        "no-es-fecha;Roto;-1,00;\n"
+        "\n"
+        "08/01/2024;Farmacia;-3,50;\n"
+    )
+    OFX = (
+        "OFXHEADER:100\nDATA:OFXSGML\n\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>"
+        "<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240201120000.000[-3:ART]<TRNAMT>200.00"
+        "<NAME>Reintegro<MEMO>ref 1</STMTTRN>"
+        "<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240202<TRNAMT>-80.25<NAME>Luz</STMTTRN>"
+        "</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>"
+    )
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="ivan", password="password123")
+        self.client.login(username="ivan", password="password123")
+
+    def test_montos_ambiguos_se_rechazan(self):
+        from finanzas.importacion import FilaInvalida, parsear_monto
+
+        for valor, esperado in (
+            ("1.234,56", "1234.56"), ("1,234.56", "1234.56"), ("1.234.567", "1234567.00"),
+            ("-45,10", "-45.10"), ("$ 300", "300.00"),
+        ):
+            self.assertEqual(parsear_monto(valor), Decimal(esperado))
+        for valor in ("1.234", "1,234", "12,345.678", "1.2.3"):
+            with self.assertRaises(FilaInvalida):
+                parsear_monto(valor)
+
+    def test_command_imports_csv_in_batches(self):
+        ruta = Path(tempfile.mkdtemp()) / "extracto.csv"
+        ruta.write_text(self.CSV, encoding="utf-8")
+        out = StringIO()
+
+        call_command("importar_transacciones", str(ruta), usuario="ivan", lote=2, stdout=out)
+
+        importacion = ImportacionTransacciones.objects.get(usuario=self.user)
+        self.assertEqual(importacion.estado, "completada")
+        self.assertEqual(importacion.filas_importadas, 4)
+        self.assertEqual(importacion.filas_con_error, 1)
+        self.assertEqual(importacion.errores[0]["fila"], 4)
+        self.assertEqual(importacion.porcentaje, 100)
+        self.assertIn("fila 4", out.getvalue())
+
+        comida = Categoria.objects.get(usuario=self.user, nombre="Comida")
+        self.assertEqual(comida.tipo, "gasto")
+        self.assertEqual(
+            Transaccion.objects.filter(usuario=self.user, categoria=comida).count(), 2
+        )
+        balance = BalanceUsuario.objects.get(usuario=self.user)
+        self.assertEqual(balance.balance, Decimal("1439.40"))
+        self.assertEqual(balance.num_transacciones, 4)
+        call_command("reconstruir_balances", verificar=True, stdout=StringIO())
+
+    def test_api_imports_ofx_and_reports_status(self):
+        archivo = SimpleUploadedFile("extracto.ofx", self.OFX.encode())
+        response = self.client.post("/api/v1/imports", {"archivo": archivo})
+        self.assertEqual(response.status_code, 202)
+
+        estado = self.client.get(f"/api/v1/imports/{response.json()['uuid']}").json()
+        self.assertEqual(estado["estado"], "completada")
+        self.assertEqual(estado["filas_importadas"], 2)
+
+        luz = Transaccion.objects.get(usuario=self.user, descripcion="Luz")
+        self.assertEqual((luz.tipo, luz.monto), ("gasto", Decimal("80.25")))
+        self.assertTrue(
+            Transaccion.objects.filter(descripcion="Reintegro - ref 1", tipo="ingreso").exists()
+        )
+
+        otro = User.objects.create_user(username="judy", password="password123")
+        self.client.force_login(otro)
+        response = self.client.get(f"/api/v1/imports/{estado['uuid']}")
+        self.assertEqual(response.status_code, 404)
+
+    def test_pendientes_retoma_las_importaciones_abandonadas(self):
+        from django.core.files.base import ContentFile
+
+        abandonada = ImportacionTransacciones(
+            usuario=self.user, formato="csv", estado="procesando",
+            filas_procesadas=2, filas_importadas=2,
+        )
+        abandonada.archivo.save("extracto.csv", ContentFile(self.CSV.encode()))
+        desde_disco = ImportacionTransacciones.objects.create(
+            usuario=self.user, formato="csv", estado="procesando"
+        )
+        en_curso = ImportacionTransacciones.objects.create(
+            usuario=self.user, formato="csv", estado="procesando"
+        )
+        ImportacionTransacciones.objects.exclude(pk=en_curso.pk).update(
+            fecha_actualizacion=timezone.now() - timedelta(hours=1)
+        )
+
+        call_command("importar_transacciones", pendientes=True, stdout=StringIO())
+
+        abandonada.refresh_from_db()
+        self.assertEqual(abandonada.estado, "completada")
+        self.assertEqual((abandonada.filas_importadas, abandonada.filas_con_error), (4, 1))
+        descripciones = Transaccion.objects.filter(usuario=self.user).values_list(
+            "descripcion", flat=True
+        )
+        self.assertEqual(sorted(descripciones), ["Cine", "Farmacia"])
+        desde_disco.refresh_from_db()
+        self.assertEqual(desde_disco.estado, "fallida")
+        en_curso.refresh_from_db()
+        self.assertEqual(en_curso.estado, "procesando")
+
+
+class ExportacionTransaccionesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="kim", password="password123")
+        self.client.login(username="kim", password="password123")
+        self.categoria = Categoria.objects.get(usuario=self.user, nombre="Compras")
+        for monto in ("10.50", "20.00", "5.25"):
+            Transaccion.objects.create(
+                usuario=self.user, tipo="gasto", monto=Decimal(monto),
+                categoria=self.categoria, descripcion="Compra, con coma",
+            )
+        otro = User.objects.create_user(username="lee", password="password123")
+        Transaccion.objects.create(usuario=otro, tipo="ingreso", monto=99)
+
+    def test_api_streams_csv_of_own_transactions(self):
+        response = self.client.get("/api/v1/transactions/export")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn("attachment;", response["Content-Disposition"])
+
+        filas = list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(filas[0], ["id", "fecha", "tipo", "monto", "categoria", "descripcion"])
+        self.assertEqual([fila[3] for fila in filas[1:]], ["10.50", "20.00", "5.25"])
+        self.assertEqual(filas[1][4:], ["Compras", "Compra, con coma"])
+
+        response = self.client.get("/api/v1/transactions/export", {"export_format": "xls"})
+        self.assertEqual(response.status_code, 400)
+
+    @skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow no instalado")
+    @override_settings(EXPORT_BATCH_SIZE=2)
+    def test_api_streams_parquet_in_row_groups(self):
+        import pyarrow.parquet as pq
+
+        response = self.client.get("/api/v1/transactions/export", {"export_format": "parquet"})
+        self.assertEqual(response.status_code, 200)
+
+        archivo = pq.ParquetFile(BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(archivo.num_row_groups, 2)
+        tabla = archivo.read()
+        self.assertEqual(tabla.column("monto").to_pylist(), [
+            Decimal("10.50"), Decimal("20.00"), Decimal("5.25"),
+        ])
+
+    def test_admin_action_exports_selection(self):
+        admin = User.objects.create_superuser(username="root", password="password123")
+        self.client.force_login(admin)
+        ids = list(Transaccion.objects.filter(usuario=self.user).values_list("id", flat=True)[:2])
+
+        response = self.client.post(
+            reverse("admin:finanzas_transaccion_changelist"),
+            {"action": "exportar_csv", "_selected_action": ids},
+        )
+        self.assertEqual(response.status_code, 200)
+        filas = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(filas), 3)
+
+
+class EmbedAllTransactionsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="yago", password="password123")
+        self.ids = [
+            Transaccion.objects.create(usuario=self.user, tipo="gasto", monto=10 + i).id
+            for i in range(6)
+        ]
+        self.checkpoint = Path(tempfile.mkdtemp()) / "checkpoint.json"
+        self.guardadas = []
+        store = "chatbot.management.commands.embed_all_transactions.vector_store"
+        for nombre, valor in (("ensure_collection", True), ("flush", True)):
+            patcher = mock.patch(f"{store}.{nombre}", return_value=valor)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch(f"{store}.upsert_transactions", side_effect=self._guardar)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _guardar(self, pares, ensure=True):
+        self.guardadas.extend(tx.id for tx, _ in pares)
+        return True
+
+    def _ejecutar(self, embeddings):
+        with mock.patch(
+            "chatbot.management.commands.embed_all_transactions.get_embeddings",
+            side_effect=embeddings,
+        ):
+            call_command(
+                "embed_all_transactions", batch_size=2, upsert_size=2, workers=1, retries=0,
+                checkpoint=str(self.checkpoint), stdout=StringIO(),
+            )
+
+    def test_el_lote_fallido_se_reintenta_al_reanudar(self):
+        # El segundo lote falla en todos los intentos; los siguientes sí se guardan.
+        self._ejecutar(lambda textos: None if "12.0" in " ".join(textos) else [[1.0]] * 2)
+        self.assertEqual(self.guardadas, self.ids[:2] + self.ids[4:])
+        self.assertEqual(
+            json.loads(self.checkpoint.read_text()),
+            {"user_id": None, "last_id": self.ids[-1], "failed_ids": self.ids[2:4]},
+        )
+
+        self.guardadas.clear()
+        self._ejecutar(lambda textos: [[1.0]] * len(textos))
+        self.assertEqual(self.guardadas, self.ids[2:4])
+        self.assertEqual(json.loads(self.checkpoint.read_text())["failed_ids"], [])
+
+
+@override_settings(CHATBOT_EMBEDDINGS_ENABLED=True)
+class EmbeddingOutboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="mia", password="password123")
+        self.categoria = Categoria.objects.get(usuario=self.user, nombre="Compras")
+
+    def _drain(self, embeddings=None, upsert_ok=True):
+        from chatbot.services.embedding_outbox import drain_once
+
+        def fake_embeddings(texts):
+            return embeddings if embeddings is not None else [[0.1] * 384 for _ in texts]
+
+        with mock.patch(
+            "chatbot.services.embedding_service.get_embeddings", side_effect=fake_embeddings
+        ), mock.patch(
+            "chatbot.services.vector_store.upsert_transactions", return_value=upsert_ok
+        ) as upsert, mock.patch(
+            "chatbot.services.vector_store.delete_points", return_value=True
+        ) as delete:
+            drain_once(100)
+        return upsert, delete
+
+    def test_writes_are_queued_and_coalesced_without_network_calls(self):
+        from chatbot.models import EmbeddingOutbox
+
+        with mock.patch("chatbot.services.http_client.requests.Session.post") as post:
+            tx = Transaccion.objects.create(
+                usuario=self.user, tipo="gasto", monto=10, categoria=self.categoria
+            )
+            tx.monto = 12
+            tx.save()
+            tx.descripcion = "editada"
+            tx.save()
+        post.assert_not_called()
+
+        fila = EmbeddingOutbox.objects.get()
+        self.assertEqual((fila.transaction_id, fila.operation, fila.version), (tx.id, "upsert", 3))
+
+        upsert, _ = self._drain()
+        self.assertEqual(len(upsert.call_args.args[0]), 1)
+        self.assertFalse(EmbeddingOutbox.objects.exists())
+
+        tx_id = tx.id
+        tx.delete()
+        _, delete = self._drain()
+        delete.assert_called_once_with([tx_id])
+        self.assertFalse(EmbeddingOutbox.objects.exists())
+
+    def test_failures_are_retried_with_backoff(self):
+        from chatbot.models import EmbeddingOutbox
+
+        Transaccion.objects.create(usuario=self.user, tipo="gasto", monto=10)
+        self._drain(upsert_ok=False)
+
+        fila = EmbeddingOutbox.objects.get()
+        self.assertEqual(fila.attempts, 1)
+        self.assertEqual(fila.last_error, "vector upsert failed")
+        self.assertGreater(fila.available_at, timezone.now())
+
+        # Todavía en backoff: no se vuelve a reclamar.
+        upsert, _ = self._drain()
+        upsert.assert_not_called()
+
+    @override_settings(CHATBOT_EMBEDDING_OUTBOX_MAX_ATTEMPTS=2)
+    def test_agotados_los_intentos_la_fila_queda_fallida(self):
+        from chatbot.models import EmbeddingOutbox
+        from config.metrics import snapshot
+
+        tx = Transaccion.objects.create(usuario=self.user, tipo="gasto", monto=10)
+        self._drain(upsert_ok=False)
+        EmbeddingOutbox.objects.update(available_at=timezone.now())
+        self._drain(upsert_ok=False)
+
+        fila = EmbeddingOutbox.objects.get()
+        self.assertEqual(fila.attempts, 2)
+        self.assertIsNotNone(fila.failed_at)
+        EmbeddingOutbox.objects.update(available_at=timezone.now())
+        upsert, _ = self._drain()
+        upsert.assert_not_called()
+        metricas = snapshot()
+        self.assertEqual(metricas["embedding_outbox.dead"], 1)
+        self.assertEqual(metricas["embedding_outbox.depth"], 0)
+
+        # Un nuevo cambio de la transacción vuelve a encolarla.
+        tx.descripcion = "editada"
+        tx.save()
+        upsert, _ = self._drain()
+        upsert.assert_called_once()
+        self.assertFalse(EmbeddingOutbox.objects.exists())
+
+
+class EmbeddingCacheTests(TestCase):
+    def setUp(self):
+        from chatbot.services import embedding_cache
+
+        embedding_cache.clear_memory()
+        self.addCleanup(embedding_cache.clear_memory)
+
+    @override_settings(HF_API_TOKEN="token")
+    def test_repeated_texts_hit_memory_then_database(self):
+        from chatbot.models import EmbeddingCacheEntry
+        from chatbot.services import embedding_cache, embedding_service
+
+        respuesta = mock.Mock()
+        respuesta.json.return_value = [[0.5] * 384, [0.25] * 384]
+        with mock.patch(
+            "chatbot.services.http_client.requests.Session.post", return_value=respuesta
+        ) as post:
+            vectores = embedding_service.get_embeddings(["Gasto  en Cine", "gasto en cine", "Luz"])
+            self.assertEqual(post.call_count, 1)
+            self.assertEqual(len(post.call_args.kwargs["json"]["inputs"]), 2)
+            self.assertEqual(vectores[0], vectores[1])
+
+            self.assertEqual(embedding_service.get_embedding("GASTO EN CINE"), [0.5] * 384)
+            embedding_cache.clear_memory()
+            self.assertEqual(embedding_service.get_embedding("luz"), [0.25] * 384)
+            self.assertEqual(post.call_count, 1)
+
+        self.assertEqual(EmbeddingCacheEntry.objects.count(), 2)
+        self.assertEqual(EmbeddingCacheEntry.prune_stale("otro-modelo"), 2)
+
+
+class LocalVectorStoreTests(TestCase):
+    def setUp(self):
+        from chatbot.services.local_vector_store import LocalVectorStore
+
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.store = LocalVectorStore(self.directorio.name)
+        self.user = User.objects.create_user(username="vera", password="password123")
+        self.otro = User.objects.create_user(username="walt", password="password123")
+
+    def _vector(self, eje):
+        vector = [0.0] * 384
+        vector[eje] = 1.0
+        return vector
+
+    def test_busqueda_filtra_por_usuario_y_sobrevive_a_otro_proceso(self):
+        from chatbot.services.local_vector_store import LocalVectorStore
+
+        propias = [
+            Transaccion.objects.create(usuario=self.user, tipo="gasto", monto=10 + i)
+            for i in range(3)
+        ]
+        ajena = Transaccion.objects.create(usuario=self.otro, tipo="gasto", monto=99)
+        with self.store.deferred():
+            self.store.upsert_transactions(
+                [(tx, self._vector(i)) for i, tx in enumerate(propias)]
+                + [(ajena, self._vector(1))]
+            )
+
+        consulta = self._vector(1)
+        consulta[2] = 0.5
+        hits = self.store.search_similar(consulta, self.user.id, limit=2)
+        self.assertEqual([hit.id for hit in hits], [propias[1].id, propias[2].id])
+        self.assertEqual(hits[0].payload["monto"], 11.0)
+
+        # Otra instancia (otro proceso) ve el borrado en cuanto se escribe el archivo.
+        lector = LocalVectorStore(self.directorio.name)
+
+        def primero(usuario):
+            return lector.search_similar(consulta, usuario.id, limit=1)[0].id
+
+        self.assertEqual(primero(self.user), propias[1].id)
+        self.assertTrue(self.store.delete_points([propias[1].id]))
+        self.assertEqual(primero(self.user), propias[2].id)
+        ajenas = lector.search_similar(consulta, self.otro.id)
+        self.assertEqual([hit.id for hit in ajenas], [ajena.id])
+
+    def test_escritura_fallida_conserva_lo_pendiente(self):
+        from chatbot.services.local_vector_store import LocalVectorStore
+
+        tx = Transaccion.objects.create(usuario=self.user, tipo="gasto", monto=10)
+        with mock.patch.object(self.store, "_save", side_effect=OSError("disco lleno")):
+            self.assertFalse(self.store.upsert_transaction(tx, self._vector(0)))
+        self.assertEqual(self.store.search_similar(self._vector(0), self.user.id), [])
+
+        self.assertTrue(self.store.flush())
+        self.assertEqual(self.store.search_similar(self._vector(0), self.user.id)[0].id, tx.id)
+
+        # Borrar lo que ya está indexado no vuelve a leer los archivos de otros usuarios.
+        ajena = Transaccion.objects.create(usuario=self.otro, tipo="gasto", monto=99)
+        LocalVectorStore(self.directorio.name).upsert_transaction(ajena, self._vector(1))
+        otro_proceso = LocalVectorStore(self.directorio.name)
+        self.assertTrue(otro_proceso.delete_points([ajena.id]))
+        with mock.patch.object(otro_proceso, "_load", wraps=otro_proceso._load) as carga:
+            self.assertTrue(otro_proceso.delete_points([tx.id]))
+        carga.assert_called_once_with(self.user.id)  # solo al aplicar el borrado
+        self.assertEqual(self.store.search_similar(self._vector(0), self.user.id), [])
+
+
+class QdrantBootstrapTests(TestCase):
+    def setUp(self):
+        from chatbot.services import qdrant_service
+
+        qdrant_service._invalidate()
+        self.addCleanup(qdrant_service._invalidate)
+        self.client = mock.MagicMock()
+        self.client.get_collections.return_value.collections = []
+        modelos = mock.MagicMock()
+        for patcher in (
+            mock.patch.object(qdrant_service, "get_client", return_value=self.client),
+            mock.patch.dict(
+                "sys.modules", {"qdrant_client": modelos, "qdrant_client.models": modelos}
+            ),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_se_inicializa_una_vez_con_indices_y_se_revisa_tras_un_fallo(self):
+        from chatbot.services import qdrant_service
+
+        qdrant_service.search_similar([0.1] * 384, user_id=1)
+        qdrant_service.search_similar([0.1] * 384, user_id=1)
+        self.assertEqual(self.client.get_collections.call_count, 1)
+        self.client.create_collection.assert_called_once()
+        campos = {c.kwargs["field_name"] for c in self.client.create_payload_index.call_args_list}
+        self.assertEqual(campos, {"user_id", "tipo", "categoria", "fecha"})
+
+        self.client.search.side_effect = RuntimeError("Not found: Collection")
+        self.assertEqual(qdrant_service.search_similar([0.1] * 384, user_id=1), [])
+        self.client.search.side_effect = None
+        qdrant_service.search_similar([0.1] * 384, user_id=1)
+        self.assertEqual(self.client.get_collections.call_count, 2)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    HF_API_TOKEN="token",
+)
+class HttpClientPoolTests(TestCase):
+    def test_las_peticiones_reutilizan_la_conexion(self):
+        from chatbot.management.commands.benchmark_http_clients import start_stub_server
+        from chatbot.services import embedding_service, http_client
+        from config.metrics import snapshot
+
+        cache.clear()
+        servidor, url = start_stub_server()
+        self.addCleanup(servidor.shutdown)
+        self.addCleanup(http_client.reset)
+        http_client.reset()
+
+        with mock.patch.object(embedding_service, "HF_EMBEDDING_URL", url):
+            for texto in ("uno", "dos", "tres"):
+                self.assertEqual(len(embedding_service._request_embedding(texto)), 384)
+
+        metricas = snapshot()
+        self.assertEqual(metricas["http.requests"], 3)
+        self.assertEqual(metricas["http.connections_opened"], 1)
+        self.assertEqual(metricas["http.connection_reuse_ratio"], 0.667)
+
+
+class ChatStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="nora", password="password123")
+        self.client.force_login(self.user)
+
+    def _stream(self, tokens):
+        def fake_stream(messages, **kwargs):
+            yield from tokens
+
+        patcher = mock.patch("chatbot.services.chat_stream.stream_groq", side_effect=fake_stream)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        response = self.client.post(
+            reverse("chatbot:send_message_stream"),
+            {"message": "¿Me alcanza el saldo?", "session_id": "chat_stream"},
+            content_type="application/json",
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return response
+
+    def test_envia_tokens_y_guarda_la_respuesta_completa(self):
+        from chatbot.models import ConversationMessage
+
+        response = self._stream(["Tu saldo ", "es $0.00"])
+        eventos = b"".join(response.streaming_content).decode().strip().split("\n\n")
+
+        self.assertEqual(eventos[0], 'event: token\ndata: {"text": "Tu saldo "}')
+        self.assertTrue(eventos[2].startswith("event: done\n"))
+        self.assertIn('"response": "Tu saldo es $0.00"', eventos[2])
+        self.assertIn('"ttft_ms": ', eventos[2])
+        respuesta = ConversationMessage.objects.get(session_id="chat_stream", role="assistant")
+        self.assertEqual(respuesta.content, "Tu saldo es $0.00")
+
+    def test_la_desconexion_guarda_lo_ya_enviado(self):
+        from chatbot.models import ConversationMessage
+
+        response = self._stream(["Tu saldo ", "es ", "$0.00"])
+        contenido = iter(response.streaming_content)
+        next(contenido)
+        response.close()
+
+        respuesta = ConversationMessage.objects.get(session_id="chat_stream", role="assistant")
+        self.assertEqual(respuesta.content, "Tu saldo ")
+
+    async def test_bajo_asgi_se_transmite_con_un_generador_asincrono(self):
+        from chatbot.models import ConversationMessage
+
+        await self.async_client.aforce_login(self.user)
+        with mock.patch(
+            "chatbot.services.chat_stream.stream_groq", return_value=(t for t in ["Hola", "!"])
+        ):
+            response = await self.async_client.post(
+                reverse("chatbot:send_message_stream"),
+                {"message": "¿Me alcanza el saldo?", "session_id": "chat_asgi"},
+                content_type="application/json",
+            )
+            self.assertTrue(response.is_async)
+            eventos = [parte async for parte in response.streaming_content]
+
+        self.assertEqual(len(eventos), 3)
+        respuesta = await ConversationMessage.objects.aget(session_id="chat_asgi", role="assistant")
+        self.assertEqual(respuesta.content, "Hola!")
+
+    async def test_la_desconexion_durante_una_lectura_cierra_groq_en_el_worker(self):
+        import asyncio
+        import threading
+
+        from chatbot.models import ConversationMessage
+        from chatbot.services.chat_stream import astream_events
+
+        liberar, cerrado = threading.Event(), threading.Event()
+        generadores = []
+
+        def fake_stream(messages, **kwargs):
+            def deltas():
+                try:
+                    yield "Tu saldo "
+                    liberar.wait(5)
+                    yield "es "
+                finally:
+                    cerrado.set()
+
+            generadores.append(deltas())
+            return generadores[-1]
+
+        with mock.patch("chatbot.services.chat_stream.stream_groq", side_effect=fake_stream):
+            eventos = astream_events(self.user, "¿Me alcanza el saldo?", "chat_corte")
+            await anext(eventos)
+            lectura = asyncio.ensure_future(anext(eventos))
+            await asyncio.sleep(0.05)  # el worker queda bloqueado en next()
+            lectura.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await lectura
+
+        liberar.set()
+        self.assertTrue(await asyncio.to_thread(cerrado.wait, 5))
+        respuesta = await ConversationMessage.objects.aget(
+            session_id="chat_corte", role="assistant"
+        )
+        self.assertEqual(respuesta.content, "Tu saldo ")
+
+    @override_settings(GROQ_API_KEY="key")
+    def test_stream_groq_extrae_los_deltas(self):
+        from chatbot.services import llm_service
+
+        respuesta = mock.MagicMock()
+        respuesta.__enter__.return_value = respuesta
+        respuesta.iter_lines.return_value = [
+            'data: {"choices": [{"delta": {"role": "assistant"}}]}',
+            "",
+            'data: {"choices": [{"delta": {"content": "Ho"}}]}',
+            'data: {"choices": [{"delta": {"content": "la"}}]}',
+            "data: [DONE]",
+        ]
+        with mock.patch(
+            "chatbot.services.http_client.requests.Session.post", return_value=respuesta
+        ) as post:
+            self.assertEqual(list(llm_service.stream_groq([])), ["Ho", "la"])
+        self.assertTrue(post.call_args.kwargs["json"]["stream"])
+
+
+class RagPipelineConcurrencyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="olga", password="password123")
+
+    def _preparar(self, demora_contexto, demora_embedding):
+        import time
+
+        from chatbot.services import rag_pipeline
+
+        def contexto_lento(user, sections, **kwargs):
+            time.sleep(demora_contexto)
+            return "CONTEXTO"
+
+        def embedding_lento(texto):
+            time.sleep(demora_embedding)
+            return [0.1] * 384
+
+        with mock.patch.object(
+            rag_pipeline, "build_financial_context", side_effect=contexto_lento
+        ), mock.patch.object(
+            rag_pipeline, "get_embedding", side_effect=embedding_lento
+        ), mock.patch.object(rag_pipeline, "search_similar", return_value=[]):
+            inicio = time.monotonic()
+            _, mensajes, _ = rag_pipeline.prepare_message(self.user, "Hola, ¿cómo voy?", "chat_rag")
+            return time.monotonic() - inicio, mensajes[0]["content"]
+
+    def test_contexto_y_busqueda_corren_en_paralelo(self):
+        duracion, prompt = self._preparar(0.2, 0.2)
+        self.assertLess(duracion, 0.35)
+        self.assertIn("CONTEXTO", prompt)
+
+    @override_settings(CHATBOT_RAG_DEADLINE_SECONDS=0.05)
+    def test_una_busqueda_lenta_no_retrasa_la_respuesta(self):
+        duracion, prompt = self._preparar(0, 1)
+        self.assertLess(duracion, 0.5)
+        self.assertIn("No se encontraron transacciones relevantes.", prompt)
+
+    @override_settings(CHATBOT_CONTEXT_DEADLINE_SECONDS=0.05)
+    def test_el_limite_del_contexto_cubre_todas_las_secciones(self):
+        import time
+
+        from chatbot.services import financial_context, rag_pipeline
+
+        consulta = financial_context._category_rows
+
+        def consulta_lenta(*args):
+            time.sleep(0.1)
+            return consulta(*args)
+
+        BalanceUsuario.para_usuario(self.user.id)
+        with mock.patch.object(
+            financial_context, "_category_rows", side_effect=consulta_lenta
+        ), self.assertNumQueries(1):
+            contexto = rag_pipeline._build_context(self.user, financial_context.ALL_SECTIONS, {})
+
+        self.assertTrue(contexto.startswith("Balance actual: $0.00"))
+        self.assertTrue(contexto.endswith(financial_context.CONTEXT_UNAVAILABLE))
+
+
+class FinancialContextTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="pia", password="password123")
+        self.gastos = list(Categoria.objects.filter(usuario=self.user, tipo="gasto")[:3])
+        for categoria in self.gastos:
+            Transaccion.objects.create(
+                usuario=self.user, tipo="gasto", monto=Decimal("50"), categoria=categoria
+            )
+        Transaccion.objects.create(usuario=self.user, tipo="gasto", monto=Decimal("7"))
+
+    def test_numero_de_consultas_no_depende_de_los_presupuestos(self):
+        from chatbot.services.financial_context import build_financial_context
+
+        with self.assertNumQueries(2):
+            build_financial_context(self.user)
+
+        hoy = timezone.localdate()
+        for monto, categoria in zip((40, 100, 500), self.gastos, strict=True):
+            Presupuesto.objects.create(
+                usuario=self.user, categoria=categoria, monto_maximo=monto,
+                mes=hoy.month, año=hoy.year,
+            )
+        with self.assertNumQueries(2):
+            contexto = build_financial_context(self.user)
+
+        self.assertIn("Balance actual: $-157.00", contexto)
+        self.assertIn(f"  - {self.gastos[0].nombre}: $50.00 / $40.00 (EXCEDIDO)", contexto)
+        self.assertIn(f"  - {self.gastos[1].nombre}: $50.00 / $100.00 (50%)", contexto)
+        self.assertIn("  - Sin categoría: $7.00", contexto)
+
+    def test_cada_intencion_solo_consulta_sus_secciones(self):
+        from chatbot.services import rag_pipeline
+        from chatbot.services.financial_context import build_financial_context
+
+        with mock.patch.object(rag_pipeline, "get_embedding") as embedding:
+            with self.assertNumQueries(1):
+                contexto = build_financial_context(self.user, sections=("balance",))
+            _, mensajes, _ = rag_pipeline.prepare_message(
+                self.user, "¿Me alcanza el saldo para un viaje?", "chat_s"
+            )
+        embedding.assert_not_called()
+        self.assertEqual(
+            contexto,
+            "Balance actual: $-157.00 (Ingresos totales: $0.00, Gastos totales: $157.00)",
+        )
+        self.assertIn(contexto, mensajes[0]["content"])
+        self.assertNotIn("Estado de presupuestos", mensajes[0]["content"])
+        self.assertNotIn("RELEVANT TRANSACTIONS", mensajes[0]["content"])
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+class FastPathTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="quim", password="password123")
+        self.gasto = Categoria.objects.filter(usuario=self.user, tipo="gasto").first()
+        Transaccion.objects.create(
+            usuario=self.user, tipo="ingreso", monto=Decimal("1000"),
+            categoria=Categoria.objects.filter(usuario=self.user, tipo="ingreso").first(),
+        )
+        Transaccion.objects.create(
+            usuario=self.user, tipo="gasto", monto=Decimal("120.50"), categoria=self.gasto
+        )
+        Transaccion.objects.create(usuario=self.user, tipo="gasto", monto=Decimal("30"))
+        patcher = mock.patch("chatbot.services.rag_pipeline.call_groq", return_value="LLM")
+        self.call_groq = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _enviar(self, mensaje, session_id="chat_fp"):
+        from chatbot.services.rag_pipeline import process_message
+
+        return process_message(self.user, mensaje, session_id)["response"]
+
+    def test_responde_sin_llm_desde_los_agregados(self):
+        from chatbot.services.fast_path import MONTHS_EN
+        from config.metrics import snapshot
+
+        hoy = timezone.localdate()
+        with self.assertNumQueries(14):
+            # Sesión: 2 mensajes, cada uno con su ChatSession en un savepoint (la
+            # primera vez se crea), + historial; fast path: categorías + rollup.
+            gastos = self._enviar("¿Cuánto gasté este mes?")
+        self.assertTrue(gastos.startswith("En "))
+        self.assertIn("gastaste $150.50 (principales: ", gastos)
+        self.assertIn(f"{self.gasto.nombre} $120.50", gastos)
+        self.assertEqual(self._enviar("¿Cuál es mi saldo?"), (
+            "Tu balance actual es $849.50 (ingresos $1,000.00, gastos $150.50)."
+        ))
+        self.assertEqual(
+            self._enviar(f"¿Cuánto gasté en {self.gasto.nombre.lower()} este mes?"),
+            gastos.split(" (")[0].replace("$150.50", f"$120.50 en {self.gasto.nombre}") + ".",
+        )
+        self.assertEqual(self._enviar("What is my budget status?"), (
+            f"You have no budgets in {MONTHS_EN[hoy.month - 1].capitalize()} {hoy.year}."
+        ))
+        self.call_groq.assert_not_called()
+        self.assertEqual(snapshot()["chat.fast_path.answers"], 4)
+
+    def test_lo_que_no_entiende_va_al_llm(self):
+        from config.metrics import snapshot
+
+        for mensaje in (
+            "¿Por qué gasté tanto este mes?",
+            "¿Cuánto gasté el 15/02?",
+            "¿Cuánto gasté este mes y el mes pasado?",
+            "¿Me alcanza el saldo para un viaje?",
+        ):
+            self.assertEqual(self._enviar(mensaje), "LLM")
+        self.assertEqual(self.call_groq.call_count, 4)
+        metricas = snapshot()
+        self.assertEqual(metricas["chat.llm.answers"], 4)
+        self.assertEqual(metricas["chat.fast_path.fallbacks"], 4)
+
+    def test_la_respuesta_a_un_seguimiento_completa_la_pregunta(self):
+        from chatbot.services.rag_pipeline import process_message
+
+        pregunta = process_message(self.user, "¿Cuánto gasté?", "chat_seg")
+        self.assertTrue(pregunta["is_followup"])
+        self.assertIn("gastaste $150.50", self._enviar("Este mes", "chat_seg"))
+        self.call_groq.assert_not_called()
+
+    def test_interpreta_los_periodos(self):
+        from datetime import date
+
+        from chatbot.services.fast_path import _UNPARSED, parse_period
+
+        hoy = date(2026, 3, 18)
+        casos = {
+            "este mes": (date(2026, 3, 1), date(2026, 3, 31), True),
+            "last month": (date(2026, 2, 1), date(2026, 2, 28), True),
+            "últimos 6 meses": (date(2025, 10, 1), hoy, True),
+            "diciembre": (date(2025, 12, 1), date(2025, 12, 31), True),
+            "enero de 2024": (date(2024, 1, 1), date(2024, 1, 31), True),
+            "esta semana": (date(2026, 3, 16), hoy, False),
+            "ayer": (date(2026, 3, 17), date(2026, 3, 17), False),
+            "todo": (None, None, True),
+        }
+        for texto, esperado in casos.items():
+            periodo, _ = parse_period(texto, hoy)
+            self.assertEqual(periodo[:3], esperado, texto)
+        for texto in ("el trimestre", "el 15/02", "hoy y ayer", "2027"):
+            self.assertIs(parse_period(texto, hoy)[0], _UNPARSED, texto)
+        self.assertEqual(parse_period("nada", hoy), (None, "nada"))
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    SHARED_CACHE=True,
+)
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="rita", password="password123")
+        patcher = mock.patch(
+            "chatbot.services.rag_pipeline.call_groq", return_value="Gastaste en ocio."
+        )
+        self.call_groq = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _enviar(self, mensaje, vector=None):
+        from chatbot.services.rag_pipeline import process_message
+
+        with mock.patch(
+            "chatbot.services.rag_pipeline.get_embedding", return_value=vector
+        ) as embedding:
+            respuesta = process_message(self.user, mensaje, "chat_rc")["response"]
+        return respuesta, embedding
+
+    def test_reutiliza_la_respuesta_mientras_no_cambian_los_datos(self):
+        from config.metrics import snapshot
+
+        pregunta = "¿Por qué gasté tanto este mes?"
+        self._enviar(pregunta, [1.0, 0.0])
+        respuesta, embedding = self._enviar("¿por qué  gasté tanto este mes?")
+        self.assertEqual(respuesta, "Gastaste en ocio.")
+        embedding.assert_not_called()
+        self._enviar("¿Por qué gasté tanto dinero este mes?", [0.99, 0.05])
+        self.assertEqual(self.call_groq.call_count, 1)
+
+        # Una pregunta lejana, u otra intención, no reutiliza la respuesta.
+        self._enviar("¿Por qué gasté en comida este mes?", [0.5, 0.8])
+        self._enviar("¿Por qué bajó mi saldo?", [1.0, 0.0])
+        self.assertEqual(self.call_groq.call_count, 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaccion.objects.create(usuario=self.user, tipo="gasto", monto=Decimal("5"))
+        self._enviar(pregunta, [1.0, 0.0])
+        self.assertEqual(self.call_groq.call_count, 4)
+
+        metricas = snapshot()
+        self.assertEqual(metricas["chat.response_cache.exact_hits"], 1)
+        self.assertEqual(metricas["chat.response_cache.semantic_hits"], 1)
+        self.assertEqual(metricas["chat.response_cache.misses"], 4)
+        self.assertEqual(metricas["chat.response_cache.hit_rate"], 0.333)
+        self.assertGreater(metricas["chat.response_cache.saved_tokens"], 0)
+
+    def test_otra_categoria_o_una_conversacion_previa_no_reutilizan_la_respuesta(self):
+        for nombre in ("Comida", "Transporte"):
+            Categoria.objects.create(usuario=self.user, nombre=nombre, tipo="gasto")
+
+        self._enviar("¿Por qué gasté tanto en comida este mes?", [1.0, 0.0])
+        self._enviar("¿Por qué gasté tanto en transporte este mes?", [1.0, 0.0])
+        self.assertEqual(self.call_groq.call_count, 2)
+
+        # La segunda respuesta se dio con historial: no se guardó.
+        self._enviar("¿Por qué gasté tanto en transporte este mes?", [1.0, 0.0])
+        self.assertEqual(self.call_groq.call_count, 3)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_sin_cache_compartida_no_se_reutilizan_respuestas(self):
+        self._enviar("¿Por qué gasté tanto este mes?", [1.0, 0.0])
+        self._enviar("¿Por qué gasté tanto este mes?", [1.0, 0.0])
+        self.assertEqual(self.call_groq.call_count, 2)
+
+    def test_solo_se_embebe_con_candidatos_y_una_vez_por_pregunta(self):
+        # Sin preguntas previas comparables ni RAG (balance_check): ningún embedding.
+        _, embedding = self._enviar("¿Por qué bajó mi saldo?", [1.0, 0.0])
+        embedding.assert_not_called()
+
+        # Con RAG y sin candidatos, solo lo embebe la búsqueda semántica.
+        _, embedding = self._enviar("¿Por qué gasté tanto este mes?", [1.0, 0.0])
+        self.assertEqual(embedding.call_count, 1)
+
+        # Con candidatos, la caché lo embebe y la búsqueda reutiliza ese vector.
+        _, embedding = self._enviar("¿Por qué gasté tanto en el súper este mes?", [0.0, 1.0])
+        self.assertEqual(embedding.call_count, 1)
+        self.assertEqual(self.call_groq.call_count, 3)
+
+    @override_settings(CHATBOT_RAG_DEADLINE_SECONDS=0.05)
+    def test_un_embedding_lento_no_retrasa_la_busqueda_en_cache(self):
+        import threading
+
+        self._enviar("¿Por qué gasté tanto este mes?", [1.0, 0.0])
+        liberar = threading.Event()
+        self.addCleanup(liberar.set)
+
+        def embedding_lento(texto):
+            liberar.wait(5)
+            return [1.0, 0.0]
+
+        from chatbot.services.rag_pipeline import process_message
+
+        with mock.patch(
+            "chatbot.services.rag_pipeline.get_embedding", side_effect=embedding_lento
+        ):
+            inicio = timezone.now()
+            process_message(self.user, "¿Por qué gasté tanto dinero este mes?", "chat_rc")
+            duracion = (timezone.now() - inicio).total_seconds()
+            liberar.set()
+
+        # Ni la caché ni el RAG esperan más que su plazo: responde el LLM.
+        self.assertLess(duracion, 1)
+        self.assertEqual(self.call_groq.call_count, 2)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    CHATBOT_HISTORY_TOKEN_BUDGET=300,
+    CHATBOT_SUMMARY_TOKEN_BUDGET=120,
+)
+class ConversationHistoryTests(TestCase):
+    def setUp(self):
+        from chatbot.models import ConversationMessage
+
+        cache.clear()
+        self.user = User.objects.create_user(username="sara", password="password123")
+        for numero in range(30):
+            ConversationMessage.objects.create(
+                usuario=self.user,
+                session_id="chat_larga",
+                role="user" if numero % 2 == 0 else "assistant",
+                content=f"Turno {numero}: " + "texto largo " * 33,
+            )
+
+    def _preparar(self, mensaje):
+        from chatbot.services import rag_pipeline
+        from chatbot.services.llm_service import estimate_tokens
+
+        _, mensajes, _ = rag_pipeline.prepare_message(self.user, mensaje, "chat_larga")
+        historial = [m for m in mensajes[1:] if m["role"] != "system"]
+        return mensajes, sum(estimate_tokens(m["content"]) for m in historial)
+
+    def test_el_historial_respeta_el_presupuesto_y_resume_lo_anterior(self):
+        from chatbot.models import ConversationMessage, ConversationSummary
+        from config.metrics import snapshot
+
+        mensajes, tokens = self._preparar("Hola, ¿cómo voy?")
+        self.assertLessEqual(tokens, 300)
+        self.assertEqual(mensajes[-1]["content"], "Hola, ¿cómo voy?")
+        self.assertTrue(mensajes[1]["content"].startswith("EARLIER IN THIS CONVERSATION"))
+        resumen = ConversationSummary.objects.get(session_id="chat_larga")
+        primero_en_prompt = ConversationMessage.objects.get(
+            content=mensajes[2]["content"], session_id="chat_larga"
+        )
+        self.assertEqual(resumen.last_message_id, primero_en_prompt.id - 1)
+        ultimo_resumido = ConversationMessage.objects.get(pk=resumen.last_message_id)
+        self.assertTrue(
+            resumen.content.splitlines()[-1].startswith(f"Assistant: {ultimo_resumido.content[:8]}")
+        )
+
+        # Cada petición solo resume lo que sale de la ventana, y el resumen no crece.
+        for _ in range(5):
+            ConversationMessage.objects.create(
+                usuario=self.user, session_id="chat_larga", role="assistant",
+                content="Respuesta " + "larga " * 60,
+            )
+            mensajes, tokens = self._preparar("Sigue")
+            self.assertLessEqual(tokens, 300)
+        resumen.refresh_from_db()
+        self.assertLessEqual(len(resumen.content) // 4, 120)
+        self.assertIn("Respuesta larga", resumen.content)
+
+        metricas = snapshot()
+        self.assertEqual(metricas["chat.prompt.requests"], 6)
+        self.assertGreater(metricas["chat.prompt.mean_tokens"], 300)
+
+    @override_settings(CHATBOT_MAX_HISTORY=4)
+    def test_una_sesion_larga_sin_resumen_se_resume_desde_el_principio(self):
+        from chatbot.models import ConversationMessage, ConversationSummary
+        from chatbot.services import rag_pipeline
+
+        antiguos = [
+            ConversationMessage.objects.create(
+                usuario=self.user, session_id="chat_antigua", role="user", content=f"Turno {n}"
+            )
+            for n in range(60)
+        ]
+
+        _, mensajes, _ = rag_pipeline.prepare_message(self.user, "Hola", "chat_antigua")
+        self.assertEqual(len(mensajes[2:]), 4)  # resumen aparte; el mensaje actual cuenta
+        resumen = ConversationSummary.objects.get(session_id="chat_antigua")
+        self.assertEqual(resumen.last_message_id, antiguos[19].id)
+        self.assertTrue(resumen.content.startswith("User: Turno 0"))
+
+        rag_pipeline.prepare_message(self.user, "Sigue", "chat_antigua")
+        resumen.refresh_from_db()
+        self.assertEqual(resumen.last_message_id, antiguos[39].id)
+
+
+class ChatSessionTests(TestCase):
+    def setUp(self):
+        from chatbot.models import ConversationMessage
+
+        self.user = User.objects.create_user(username="tomas", password="password123")
+        self.client.login(username="tomas", password="password123")
+        for session_id, mensajes in (("chat_vieja", 3), ("chat_nueva", 2)):
+            for numero in range(mensajes):
+                ConversationMessage.objects.create(
+                    usuario=self.user, session_id=session_id, role="user", content=f"Hola {numero}"
+                )
+
+    def test_las_sesiones_se_mantienen_al_guardar_mensajes(self):
+        from chatbot.models import ConversationMessage
+
+        with self.assertNumQueries(3):
+            # Sesión de Django + usuario + una lectura de chatbot_chatsession.
+            payload = self.client.get("/api/v1/chat/sessions").json()
+        self.assertEqual(
+            [(s["session_id"], s["message_count"]) for s in payload],
+            [("chat_nueva", 2), ("chat_vieja", 3)],
+        )
+        ultimo = ConversationMessage.objects.filter(session_id="chat_nueva").latest("created_at")
+        self.assertEqual(parse_datetime(payload[0]["updated_at"]), ultimo.created_at)
+
+        ConversationMessage.objects.create(
+            usuario=self.user, session_id="chat_vieja", role="assistant", content="Respuesta"
+        )
+        payload = self.client.get("/api/v1/chat/sessions").json()
+        self.assertEqual(payload[0]["session_id"], "chat_vieja")
+        self.assertEqual(payload[0]["message_count"], 4)
+
+    def test_borrar_mensajes_descuenta_y_elimina_la_sesion_vacia(self):
+        from chatbot.models import ChatSession, ConversationMessage
+
+        primero, ultimo = ConversationMessage.objects.filter(session_id="chat_nueva")
+        ultimo.delete()
+        sesion = ChatSession.objects.get(session_id="chat_nueva")
+        self.assertEqual(sesion.message_count, 1)
+        self.assertEqual(sesion.last_activity, primero.created_at)
+
+        ConversationMessage.objects.filter(session_id="chat_vieja").delete()
+        self.assertEqual(
+            list(ChatSession.objects.values_list("session_id", "message_count")),
+            [("chat_nueva", 1)],
+        )
+
+    def test_la_migracion_reconstruye_las_sesiones(self):
+        from django.apps import apps
+
+        from chatbot.models import ChatSession
+
+        migracion = importlib.import_module("chatbot.migrations.0005_chatsession")
+        campos = ("session_id", "message_count", "last_activity")
+        esperado = list(ChatSession.objects.values_list(*campos))
+        ChatSession.objects.all().delete()
+        migracion.backfill_sessions(apps, None)
+        self.assertEqual(list(ChatSession.objects.values_list(*campos)), esperado)
+
+
+class ChatHistoryPaginationTests(TestCase):
+    def setUp(self):
+        from chatbot.models import ConversationMessage
+
+        self.user = User.objects.create_user(username="vera", password="password123")
+        self.client.login(username="vera", password="password123")
+        self.ids = [
+            ConversationMessage.objects.create(
+                usuario=self.user, session_id="chat_pag", role="user", content=f"Mensaje {numero}"
+            ).id
+            for numero in range(7)
+        ]
+        # Misma marca de tiempo en dos mensajes: el desempate por id mantiene el orden.
+        mismo = ConversationMessage.objects.get(pk=self.ids[3]).created_at
+        ConversationMessage.objects.filter(pk=self.ids[4]).update(created_at=mismo)
+
+    def test_recorre_el_historial_hacia_atras_sin_duplicados(self):
+        from chatbot.services import history
+
+        with self.assertNumQueries(1):
+            mensajes, hay_mas = history.page(self.user, "chat_pag", limit=3)
+        self.assertEqual([m.id for m in mensajes], self.ids[4:])
+        self.assertTrue(hay_mas)
+
+        vistos = [m.id for m in mensajes]
+        while hay_mas:
+            with self.assertNumQueries(1):
+                mensajes, hay_mas = history.page(self.user, "chat_pag", before=vistos[0], limit=3)
+            vistos = [m.id for m in mensajes] + vistos
+        self.assertEqual(vistos, self.ids)
+
+    def test_after_trae_solo_los_mensajes_nuevos(self):
+        response = self.client.get(
+            "/chatbot/api/chat/history/",
+            {"session_id": "chat_pag", "after": self.ids[2], "limit": 3},
+        )
+        payload = response.json()
+        self.assertEqual([m["id"] for m in payload["messages"]], self.ids[3:6])
+        self.assertTrue(payload["has_more"])
+
+        url = "/api/v1/chat/sessions/chat_pag/messages"
+        payload = self.client.get(url, {"after": self.ids[-1]}).json()
+        self.assertEqual((payload["messages"], payload["has_more"]), ([], False))
+        for consulta in ({"after": 1, "before": 2}, {"limit": "muchos"}, {"before": 0}):
+            self.assertEqual(self.client.get(url, consulta).status_code, 400)
+            consulta["session_id"] = "chat_pag"
+            self.assertEqual(
+                self.client.get("/chatbot/api/chat/history/", consulta).status_code, 400
+            )
+
+class IntentDetectorTests(TestCase):
+    def test_el_detector_compilado_clasifica_igual_que_el_escaneo(self):
+        from chatbot.management.commands.benchmark_intent_detector import (
+            CORPUS,
+            _legacy_detect_intent,
+        )
+        from chatbot.services.followup_detector import detect_intent
+
+        # Solo cambian las coincidencias en mitad de palabra ("subtotal" no es "total").
+        distintos = [m for m in CORPUS if detect_intent(m) != _legacy_detect_intent(m)]
+        self.assertEqual(distintos, ["subtotal de la compra de ayer"])
+        self.assertEqual(detect_intent("how much did i spend this month")[0], "balance_check")
+        self.assertEqual(detect_intent("mis pagos de $40")[0], "transaction_search")
+        self.assertEqual(detect_intent("lo presente ayer")[0], "general")
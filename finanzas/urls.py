@@ -1,7 +1,7 @@
 from django.urls import path
 from finanzas.views import (
     login_view, register_view, logout_view,
-    dashboard_view, dashboard_data_api, cargar_datos_demo,
+    dashboard_view, dashboard_data_api, dashboard_stream, cargar_datos_demo,
     demo_view, demo_data_api,
     lista_transacciones, nueva_transaccion, editar_transaccion,
     eliminar_transaccion, detalle_transaccion, filtrar_categorias,
@@ -21,6 +21,7 @@ urlpatterns = [
     path('', dashboard_view, name='dashboard'),
     path('demo/', demo_view, name='demo'),
     path('api/dashboard-data/', dashboard_data_api, name='dashboard_data_api'),
+    path('api/dashboard-stream/', dashboard_stream, name='dashboard_stream'),
     path('api/demo-data/', demo_data_api, name='demo_data_api'),
     path('dashboard/cargar-demo/', cargar_datos_demo, name='cargar_datos_demo'),
 
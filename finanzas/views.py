@@ -1,22 +1,38 @@
+import asyncio
+import hashlib
 import json
 import logging
 import random
+import time
 from datetime import timedelta
 from decimal import Decimal
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import transaction
 from django.db.models import Q, Sum
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
+from django.views.decorators.http import condition
 
+from finanzas.cache import etag_dashboard, obtener_version, payload_dashboard_cacheado
 from finanzas.forms import RegisterForm, TransaccionForm, TransferenciaForm
-from finanzas.models import Categoria, Transaccion, Transferencia
+from finanzas.models import (
+    BalanceUsuario,
+    Categoria,
+    ResumenMensualCategoria,
+    Transaccion,
+    Transferencia,
+)
+from finanzas.paginacion import CursorInvalido, paginar_keyset, paginar_keyset_union
 
 logger = logging.getLogger(__name__)
 
@@ -46,28 +62,25 @@ DEMO_PAYLOAD = {
     ],
     "tiene_datos_demo": True,
 }
+DEMO_PAYLOAD_ETAG = hashlib.sha256(
+    json.dumps(DEMO_PAYLOAD, sort_keys=True).encode()
+).hexdigest()[:32]
 
 
-def _build_dashboard_payload(user):
-    totales = (
-        Transaccion.objects.filter(usuario=user)
-        .values("tipo")
-        .annotate(total=Sum("monto"))
-        .order_by("tipo")
-    )
+def _get_dashboard_payload(user):
+    """Payload del dashboard servido desde la caché versionada del usuario."""
+    return payload_dashboard_cacheado(user, _build_dashboard_payload)
 
-    ingresos_totales = 0
-    gastos_totales = 0
-    for item in totales:
-        if item["tipo"] == "ingreso":
-            ingresos_totales = item["total"] or 0
-        elif item["tipo"] == "gasto":
-            gastos_totales = item["total"] or 0
+
+def _build_dashboard_payload(user):
+    ledger = BalanceUsuario.para_usuario(user.id)
+    ingresos_totales = ledger.ingresos
+    gastos_totales = ledger.gastos
 
     gastos_por_categoria_raw = (
-        Transaccion.objects.filter(usuario=user, tipo="gasto")
+        ResumenMensualCategoria.objects.filter(usuario=user, tipo="gasto", num_transacciones__gt=0)
         .values("categoria__id", "categoria__nombre")
-        .annotate(monto=Sum("monto"))
+        .annotate(monto=Sum("total"))
         .order_by("-monto")
     )
 
@@ -84,14 +97,12 @@ def _build_dashboard_payload(user):
             }
         )
 
-    tiene_datos_demo = Transaccion.objects.filter(
-        usuario=user, descripcion__startswith="[DEMO]"
-    ).exists()
+    tiene_datos_demo = Transaccion.objects.filter(usuario=user, es_demo=True).exists()
 
     return {
         "ingresos_totales": float(ingresos_totales),
         "gastos_totales": float(gastos_totales),
-        "balance": float(ingresos_totales - gastos_totales),
+        "balance": float(ledger.balance),
         "gastos_por_categoria": gastos_por_categoria,
         "tiene_datos_demo": tiene_datos_demo,
     }
@@ -121,8 +132,8 @@ def _crear_datos_demo(usuario):
         )
         categorias[nombre] = cat
 
-    # 2. Check if demo data already exists (by description tag)
-    if Transaccion.objects.filter(usuario=usuario, descripcion__startswith="[DEMO]").exists():
+    # 2. Check if demo data already exists
+    if Transaccion.objects.filter(usuario=usuario, es_demo=True).exists():
         return 0
 
     # 3. Create Transactions (Last 3 months)
@@ -164,15 +175,17 @@ def _crear_datos_demo(usuario):
             monto=monto,
             tipo=cat.tipo,
             categoria=cat,
-            descripcion=f"[DEMO] {desc}"
+            descripcion=f"[DEMO] {desc}",
+            es_demo=True,
         ))
     
     Transaccion.objects.bulk_create(transactions_to_create)
+    Transaccion.ajustar_agregados_lote(transactions_to_create)
     creadas = len(transactions_to_create)
 
     # 4. Create Budgets (optional, but requested in plan)
     # Check if budget exists, if not create
-    from finanzas.models import Presupuesto # Local import to avoid circular dependency if any
+    from finanzas.models import Presupuesto  # Local import to avoid circular dependency if any
     
     current_month = today.month
     current_year = today.year
@@ -269,7 +282,7 @@ def logout_view(request):
 
 @login_required
 def dashboard_view(request):
-    payload = _build_dashboard_payload(request.user)
+    payload = _get_dashboard_payload(request.user)
     transacciones = (
         Transaccion.objects.filter(usuario=request.user)
         .select_related("categoria")
@@ -304,17 +317,68 @@ def demo_view(request):
     return render(request, "finanzas/dashboard.html", context)
 
 
+@condition(etag_func=lambda request: DEMO_PAYLOAD_ETAG)
 def demo_data_api(request):
     """API con payload estático para el polling del dashboard demo."""
     return JsonResponse(DEMO_PAYLOAD)
 
 
 @login_required
+@condition(etag_func=etag_dashboard)
 def dashboard_data_api(request):
-    payload = _build_dashboard_payload(request.user)
+    payload = _get_dashboard_payload(request.user)
     return JsonResponse(payload)
 
 
+async def _eventos_dashboard(usuario, ultima_version):
+    """Genera eventos SSE con el payload del dashboard cada vez que cambian los datos.
+
+    Solo consulta la versión de datos del usuario en la caché; el payload se
+    reconstruye únicamente cuando la versión cambia. Envía comentarios de
+    keep-alive para que proxies y balanceadores no corten la conexión, y cierra
+    el stream tras ``DASHBOARD_SSE_MAX_SECONDS`` para que el navegador reconecte
+    (con ``Last-Event-ID``) y los workers se repartan.
+    """
+    inicio = ultimo_envio = time.monotonic()
+    yield f"retry: {settings.DASHBOARD_SSE_RETRY_MS}\n\n"
+    while time.monotonic() - inicio < settings.DASHBOARD_SSE_MAX_SECONDS:
+        # Fuera del hilo compartido de sync_to_async: si no, todos los streams
+        # abiertos harían cola tras él. Solo toca la caché, no la base de datos.
+        version = str(await sync_to_async(obtener_version, thread_sensitive=False)(usuario.id))
+        if version != ultima_version:
+            payload = await sync_to_async(_get_dashboard_payload)(usuario)
+            datos = json.dumps(payload, cls=DjangoJSONEncoder)
+            yield f"id: {version}\nevent: dashboard\ndata: {datos}\n\n"
+            ultima_version = version
+            ultimo_envio = time.monotonic()
+        elif time.monotonic() - ultimo_envio >= settings.DASHBOARD_SSE_KEEPALIVE_SECONDS:
+            yield ": keep-alive\n\n"
+            ultimo_envio = time.monotonic()
+        await asyncio.sleep(settings.DASHBOARD_SSE_POLL_SECONDS)
+
+
+async def dashboard_stream(request):
+    """Stream SSE del dashboard; reemplaza al polling cuando se sirve por ASGI.
+
+    Bajo WSGI una conexión abierta bloquearía un worker entero, así que se
+    responde 204: ``EventSource`` deja de reconectar y el cliente vuelve al
+    polling con ETag de ``dashboard_data_api``. Lo mismo sin caché compartida
+    (``SHARED_CACHE``): el stream solo vería las escrituras de su propio worker.
+    """
+    usuario = await request.auser()
+    if not usuario.is_authenticated:
+        return HttpResponse(status=403)
+    if not isinstance(request, ASGIRequest) or not settings.SHARED_CACHE:
+        return HttpResponse(status=204)
+
+    response = StreamingHttpResponse(
+        _eventos_dashboard(usuario, request.headers.get("Last-Event-ID")),
+        content_type="text/event-stream",
+    )
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 @login_required
 def cargar_datos_demo(request):
     if request.method != "POST":
@@ -344,13 +408,21 @@ def lista_transacciones(request):
     if categoria_id:
         transacciones = transacciones.filter(categoria_id=categoria_id)
 
-    transacciones = transacciones.order_by("-fecha")
+    cursor = request.GET.get("cursor")
+    try:
+        transacciones, siguiente_cursor = paginar_keyset(
+            transacciones, cursor=cursor, tamaño=settings.LIST_PAGE_SIZE
+        )
+    except CursorInvalido:
+        return redirect(_url_sin_cursor(request))
 
     categorias = list(Categoria.objects.filter(usuario=request.user))
-    payload = _build_dashboard_payload(request.user)
+    payload = _get_dashboard_payload(request.user)
 
     context = {
         "transacciones": transacciones,
+        "siguiente_url": _url_con_cursor(request, siguiente_cursor),
+        "primera_url": _url_sin_cursor(request) if cursor else None,
         "categorias": categorias,
         "tipo_seleccionado": tipo,
         "categoria_seleccionada": categoria_id,
@@ -468,11 +540,19 @@ def filtrar_categorias(request):
 
 @login_required
 def lista_transferencias(request):
-    transferencias = (
-        Transferencia.objects.filter(Q(emisor=request.user) | Q(receptor=request.user))
-        .select_related("emisor", "receptor")
-        .order_by("-fecha_creacion")
-    )
+    queryset = Transferencia.objects.select_related("emisor", "receptor")
+
+    cursor = request.GET.get("cursor")
+    try:
+        # Enviadas y recibidas por separado, cada una con su índice.
+        transferencias, siguiente_cursor = paginar_keyset_union(
+            (queryset.filter(emisor=request.user), queryset.filter(receptor=request.user)),
+            cursor=cursor,
+            tamaño=settings.LIST_PAGE_SIZE,
+            campo_fecha="fecha_creacion",
+        )
+    except CursorInvalido:
+        return redirect(_url_sin_cursor(request))
 
     enviadas = [t for t in transferencias if t.emisor_id == request.user.id]
     recibidas = [t for t in transferencias if t.receptor_id == request.user.id]
@@ -484,6 +564,8 @@ def lista_transferencias(request):
             "transferencias": transferencias,
             "enviadas": enviadas,
             "recibidas": recibidas,
+            "siguiente_url": _url_con_cursor(request, siguiente_cursor),
+            "primera_url": _url_sin_cursor(request) if cursor else None,
         },
     )
 
@@ -618,14 +700,21 @@ def cancelar_transferencia(request, uuid):
 
 # Helpers
 
+def _url_con_cursor(request, cursor):
+    """URL de la página actual apuntando a ``cursor``, conservando los filtros."""
+    if not cursor:
+        return None
+    params = request.GET.copy()
+    params["cursor"] = cursor
+    return f"{request.path}?{params.urlencode()}"
+
+
+def _url_sin_cursor(request):
+    params = request.GET.copy()
+    params.pop("cursor", None)
+    return f"{request.path}?{params.urlencode()}" if params else request.path
+
+
 def _calcular_saldo(user):
-    ingresos = (
-        Transaccion.objects.filter(usuario=user, tipo="ingreso").aggregate(total=Sum("monto"))["total"]
-        or 0
-    )
-    gastos = (
-        Transaccion.objects.filter(usuario=user, tipo="gasto").aggregate(total=Sum("monto"))["total"]
-        or 0
-    )
-    return ingresos - gastos
+    return BalanceUsuario.para_usuario(user.id).balance
 
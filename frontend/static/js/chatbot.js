@@ -2,10 +2,18 @@
     'use strict';
 
     // --- State ---
-    var sessionId = generateSessionId();
+    var SESSION_KEY = 'chatbotSessionId';
+    var sessionId = null;
     var isOpen = false;
     var isProcessing = false;
 
+    // History is loaded a page at a time: the newest on init, older ones
+    // when the user scrolls to the top.
+    var oldestNode = null;
+    var oldestId = null;
+    var hasOlder = false;
+    var loadingOlder = false;
+
     // --- DOM refs (set in init) ---
     var el = {};
 
@@ -25,6 +33,18 @@
 
         if (!el.toggle) return; // User not authenticated
 
+        sessionId = sessionStorage.getItem(SESSION_KEY);
+        if (sessionId) {
+            loadHistory('');
+        } else {
+            setSessionId(generateSessionId());
+        }
+        el.messages.addEventListener('scroll', function () {
+            if (el.messages.scrollTop < 40 && hasOlder && !loadingOlder) {
+                loadHistory('&before=' + oldestId);
+            }
+        });
+
         el.toggle.addEventListener('click', toggleChat);
         el.close.addEventListener('click', toggleChat);
         el.send.addEventListener('click', sendMessage);
@@ -78,8 +98,16 @@
         el.typing.classList.add('visible');
         scrollToBottom();
 
-        // Send to backend
-        fetch('/chatbot/api/chat/send/', {
+        // Stream the answer when the browser can read response bodies
+        if (window.ReadableStream && window.TextDecoder) {
+            streamMessage(message);
+        } else {
+            sendWithoutStreaming(message);
+        }
+    }
+
+    function requestOptions(message) {
+        return {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -89,28 +117,96 @@
                 message: message,
                 session_id: sessionId,
             }),
-        })
+        };
+    }
+
+    function finishMessage(data) {
+        if (data.is_followup && data.followup_options) {
+            showFollowupOptions(data.followup_options);
+        }
+        isProcessing = false;
+        el.send.disabled = false;
+    }
+
+    function failMessage() {
+        el.typing.classList.remove('visible');
+        appendMessage(
+            'assistant',
+            'Lo siento, hubo un error al procesar tu consulta. Intenta de nuevo.'
+        );
+        isProcessing = false;
+        el.send.disabled = false;
+    }
+
+    function sendWithoutStreaming(message) {
+        fetch('/chatbot/api/chat/send/', requestOptions(message))
         .then(function (res) { return res.json(); })
         .then(function (data) {
             el.typing.classList.remove('visible');
-
             appendMessage('assistant', data.response);
+            finishMessage(data);
+        })
+        .catch(failMessage);
+    }
 
-            if (data.is_followup && data.followup_options) {
-                showFollowupOptions(data.followup_options);
+    // Reads the SSE answer: "token" events grow the bubble, "done" renders
+    // the final Markdown (and follow-up options).
+    function streamMessage(message) {
+        var bubble = null;
+        var text = '';
+        var buffer = '';
+        var done = false;
+        var decoder = new TextDecoder();
+
+        function handleEvent(raw) {
+            var name = 'message';
+            var data = '';
+            raw.split('\n').forEach(function (line) {
+                if (line.indexOf('event:') === 0) name = line.slice(6).trim();
+                else if (line.indexOf('data:') === 0) data += line.slice(5).trim();
+            });
+            if (!data) return;
+            var payload = JSON.parse(data);
+
+            if (name === 'token') {
+                if (!bubble) {
+                    el.typing.classList.remove('visible');
+                    bubble = appendMessage('assistant', '');
+                }
+                text += payload.text;
+                bubble.innerHTML = renderMarkdown(text);
+                scrollToBottom();
+            } else if (name === 'done') {
+                done = true;
+                el.typing.classList.remove('visible');
+                if (bubble) bubble.innerHTML = renderMarkdown(payload.response);
+                else appendMessage('assistant', payload.response);
+                finishMessage(payload);
             }
+        }
 
-            isProcessing = false;
-            el.send.disabled = false;
+        fetch('/chatbot/api/chat/stream/', requestOptions(message))
+        .then(function (res) {
+            if (!res.ok || !res.body) throw new Error('stream unavailable');
+            var reader = res.body.getReader();
+
+            function pump() {
+                return reader.read().then(function (chunk) {
+                    if (chunk.done) {
+                        if (!done) throw new Error('stream ended early');
+                        return;
+                    }
+                    buffer += decoder.decode(chunk.value, { stream: true });
+                    var events = buffer.split('\n\n');
+                    buffer = events.pop();
+                    events.forEach(handleEvent);
+                    return pump();
+                });
+            }
+            return pump();
         })
         .catch(function () {
-            el.typing.classList.remove('visible');
-            appendMessage(
-                'assistant',
-                'Lo siento, hubo un error al procesar tu consulta. Intenta de nuevo.'
-            );
-            isProcessing = false;
-            el.send.disabled = false;
+            if (!done) failMessage();
         });
     }
 
@@ -126,7 +222,38 @@
             .replace(/\n/g, '<br>');
     }
 
-    function appendMessage(role, content) {
+    function loadHistory(query) {
+        loadingOlder = true;
+        fetch('/chatbot/api/chat/history/?session_id=' + encodeURIComponent(sessionId) + query)
+        .then(function (res) { return res.json(); })
+        .then(function (data) {
+            if (!data.messages || !data.messages.length) return;
+            var messages = data.messages.filter(function (m) {
+                return m.role !== 'system';
+            });
+            var anchor = oldestNode;
+            var height = el.messages.scrollHeight;
+            messages.forEach(function (m, i) {
+                var node = buildMessage(m.role, m.content);
+                if (anchor) el.messages.insertBefore(node, anchor);
+                else el.messages.appendChild(node);
+                if (i === 0) oldestNode = node;
+            });
+            oldestId = data.messages[0].id;
+            hasOlder = data.has_more;
+            el.suggestions.classList.add('hidden');
+            if (anchor) {
+                // Keep the message the user was reading in place.
+                el.messages.scrollTop += el.messages.scrollHeight - height;
+            } else {
+                scrollToBottom();
+            }
+        })
+        .catch(function () { hasOlder = false; })
+        .then(function () { loadingOlder = false; });
+    }
+
+    function buildMessage(role, content) {
         var msgDiv = document.createElement('div');
         msgDiv.className = 'chat-message ' + role;
 
@@ -147,9 +274,14 @@
 
         msgDiv.appendChild(avatarDiv);
         msgDiv.appendChild(bubbleDiv);
+        return msgDiv;
+    }
 
+    function appendMessage(role, content) {
+        var msgDiv = buildMessage(role, content);
         el.messages.appendChild(msgDiv);
         scrollToBottom();
+        return msgDiv.lastChild;
     }
 
     function showFollowupOptions(options) {
@@ -170,8 +302,11 @@
     }
 
     function startNewConversation() {
-        sessionId = generateSessionId();
+        setSessionId(generateSessionId());
         el.messages.innerHTML = '';
+        oldestNode = null;
+        oldestId = null;
+        hasOlder = false;
 
         // Re-add welcome message
         appendMessage(
@@ -187,6 +322,11 @@
         el.messages.scrollTop = el.messages.scrollHeight;
     }
 
+    function setSessionId(id) {
+        sessionId = id;
+        sessionStorage.setItem(SESSION_KEY, id);
+    }
+
     function generateSessionId() {
         return 'chat_' + Date.now() + '_' + Math.random().toString(36).substr(2, 9);
     }